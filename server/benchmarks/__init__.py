@@ -0,0 +1,7 @@
+"""
+Offline benchmarks for the answer API.
+
+The real FastAPI app runs in-process against local stand-ins: a fake
+OpenAI-compatible server (``fake_openai``) and an in-memory vector store
+(``memory_store``). Run ``python -m benchmarks.loadgen --help`` from ``server/``.
+"""
@@ -0,0 +1,82 @@
+import re
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "xe", "zu", "an", "el", "or", "is", "um", "pra", "sto", "qua"]
+QUESTION_TEMPLATES = (
+    "What does the video say about {} and {}?",
+    "How is {} related to {}?",
+    "Can you explain {} in the context of {}?",
+)
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words embeddings, the stand-in for text-embedding-3-large.
+
+    Every word maps to a fixed random unit-variance vector seeded by its hash;
+    a text is the normalized sum of its words, so texts sharing words stay
+    close and retrieval over the synthetic corpus behaves sensibly.
+    """
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self._words: Dict[str, np.ndarray] = {}
+
+    def _word(self, word: str) -> np.ndarray:
+        vector = self._words.get(word)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(word.encode()))
+            vector = self._words[word] = rng.standard_normal(self.dimensions, dtype=np.float32)
+        return vector
+
+    def embed(self, texts: List[str], dimensions: int | None = None) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in _TOKEN_RE.findall(text.lower()):
+                matrix[row] += self._word(word)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        if dimensions and dimensions < self.dimensions:
+            # Matryoshka-style: a shorter embedding is the renormalized prefix
+            matrix = matrix[:, :dimensions]
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return matrix
+
+
+@lru_cache(maxsize=None)
+def vocabulary(size: int = 1000, seed: int = 0) -> Tuple[str, ...]:
+    rng = np.random.default_rng(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES, size=rng.integers(2, 4))))
+    return tuple(sorted(words))
+
+
+def make_chunks(count: int, words_per_chunk: int = 120, seed: int = 0) -> List[str]:
+    """Synthetic transcript chunks with Zipf-distributed word frequencies."""
+    words = vocabulary(seed=seed)
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, len(words) + 1)
+    weights /= weights.sum()
+    return [" ".join(rng.choice(words, size=words_per_chunk, p=weights)) for _ in range(count)]
+
+
+def make_questions(chunks: List[str], count: int, seed: int = 1) -> List[str]:
+    """Questions built from words of randomly picked chunks, so each has a matching chunk."""
+    rng = np.random.default_rng(seed)
+    questions = []
+    for _ in range(count):
+        chunk_words = sorted(set(chunks[rng.integers(len(chunks))].split()))
+        template = QUESTION_TEMPLATES[rng.integers(len(QUESTION_TEMPLATES))]
+        picked = rng.choice(chunk_words, size=2, replace=False)
+        questions.append(template.format(*picked))
+    return questions
+
+
+def answer_words(count: int, seed: int) -> List[str]:
+    rng = np.random.default_rng(seed)
+    return list(rng.choice(vocabulary(), size=count))
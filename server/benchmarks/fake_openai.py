@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import base64
+import json
+import math
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks.corpus import HashingEmbedder, answer_words
+
+# z-score of the 99th percentile of a normal distribution
+_Z99 = 2.326
+
+
+@dataclass
+class LatencyDistribution:
+    """Log-normal latency described by its median and p99, in milliseconds."""
+
+    median_ms: float
+    p99_ms: float
+
+    def sample(self, rng: np.random.Generator) -> float:
+        """Draw one latency, in seconds."""
+        if self.median_ms <= 0:
+            return 0.0
+        sigma = math.log(self.p99_ms / self.median_ms) / _Z99 if self.p99_ms > self.median_ms else 0.0
+        return float(rng.lognormal(math.log(self.median_ms), sigma)) / 1000
+
+
+@dataclass
+class UpstreamProfile:
+    """How the fake Azure OpenAI deployment behaves."""
+
+    chat_ttft: LatencyDistribution = field(default_factory=lambda: LatencyDistribution(350, 1200))
+    tokens_per_second: float = 60.0
+    answer_tokens: int = 150
+    planner_tokens: int = 40
+    embedding_latency: LatencyDistribution = field(default_factory=lambda: LatencyDistribution(60, 250))
+    embedding_ms_per_input: float = 0.5
+    dimensions: int = 3072
+    error_rate: float = 0.0  # Share of calls answered with a 503
+    seed: int = 0
+
+
+def _count_tokens(messages: List[Dict[str, Any]]) -> int:
+    # Same rough ratio the app falls back to without tiktoken
+    return sum(len(str(message.get("content", ""))) for message in messages) // 4 + 3 * len(messages)
+
+
+def _planner_reply(messages: List[Dict[str, Any]]) -> str:
+    question = str(messages[-1].get("content", "")).rsplit("New message:", 1)[-1].strip()
+    return json.dumps({
+        "is_follow_up": False,
+        "standalone_query": question,
+        "expanded_queries": [f"Explain {question}", f"Details on {question}"],
+    })
+
+
+def create_app(profile: UpstreamProfile) -> FastAPI:
+    """
+    Build an OpenAI-compatible stand-in for the Azure chat and embeddings deployments.
+
+    JSON-mode chat calls (the query planner) get a plan that keeps the question;
+    other chat calls get ``answer_tokens`` words, streamed at ``tokens_per_second``
+    after the time-to-first-token. Embeddings come from ``HashingEmbedder``.
+    """
+    app = FastAPI()
+    rng = np.random.default_rng(profile.seed)
+    embedder = HashingEmbedder(profile.dimensions)
+    app.state.stats = {"chat": 0, "chat_stream": 0, "embeddings": 0, "embedded_texts": 0, "errors": 0}
+
+    def failed() -> JSONResponse | None:
+        if profile.error_rate and rng.random() < profile.error_rate:
+            app.state.stats["errors"] += 1
+            return JSONResponse({"error": {"message": "Injected failure", "code": "503"}}, status_code=503)
+        return None
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        prompt_tokens = _count_tokens(messages)
+        planner = (body.get("response_format") or {}).get("type") == "json_object"
+        words = answer_words(profile.answer_tokens, seed=int(rng.integers(1 << 31)))
+        created = int(time.time())
+
+        await asyncio.sleep(profile.chat_ttft.sample(rng))
+        if (error := failed()) is not None:
+            return error
+
+        if not body.get("stream"):
+            app.state.stats["chat"] += 1
+            content = _planner_reply(messages) if planner else " ".join(words)
+            completion_tokens = profile.planner_tokens if planner else len(words)
+            await asyncio.sleep(completion_tokens / profile.tokens_per_second)
+            return {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": created,
+                "model": deployment,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+
+        app.state.stats["chat_stream"] += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        # Group tokens so there are at most ~50 writes per second
+        per_chunk = max(1, math.ceil(profile.tokens_per_second / 50))
+
+        def frame(choices, usage=None) -> str:
+            chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": created,
+                     "model": deployment, "choices": choices, "usage": usage}
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        async def events():
+            for start in range(0, len(words), per_chunk):
+                group = words[start:start + per_chunk]
+                yield frame([{"index": 0, "delta": {"content": " " + " ".join(group)}, "finish_reason": None}])
+                await asyncio.sleep(len(group) / profile.tokens_per_second)
+            yield frame([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if include_usage:
+                yield frame([], {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(words),
+                    "total_tokens": prompt_tokens + len(words),
+                })
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/openai/deployments/{deployment}/embeddings")
+    async def embeddings(deployment: str, request: Request):
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        app.state.stats["embeddings"] += 1
+        app.state.stats["embedded_texts"] += len(texts)
+
+        await asyncio.sleep(profile.embedding_latency.sample(rng) + len(texts) * profile.embedding_ms_per_input / 1000)
+        if (error := failed()) is not None:
+            return error
+
+        matrix = embedder.embed(texts, body.get("dimensions"))
+        base64_output = body.get("encoding_format") == "base64"
+        return {
+            "object": "list",
+            "model": deployment,
+            "data": [
+                {
+                    "object": "embedding",
+                    "index": i,
+                    "embedding": base64.b64encode(row.tobytes()).decode() if base64_output else row.tolist(),
+                }
+                for i, row in enumerate(matrix)
+            ],
+            "usage": {"prompt_tokens": sum(len(text) // 4 for text in texts), "total_tokens": sum(len(text) // 4 for text in texts)},
+        }
+
+    @app.get("/openai/models")
+    async def models():
+        # Listed by the readiness probe
+        return {"object": "list", "data": [{"id": "chat", "object": "model"}, {"id": "embeddings", "object": "model"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return {"profile": asdict(profile), **app.state.stats}
+
+    return app
+
+
+if __name__ == "__main__":
+    # Serve the stand-in on its own, e.g. to point a deployed instance at it:
+    # AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9100 AZURE_EMBDEDDINGS_ENDPOINT=http://127.0.0.1:9100
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Azure OpenAI chat and embeddings server")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft-ms", type=float, default=350)
+    parser.add_argument("--ttft-p99-ms", type=float, default=1200)
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--embedding-ms", type=float, default=60)
+    parser.add_argument("--embedding-p99-ms", type=float, default=250)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(UpstreamProfile(
+        chat_ttft=LatencyDistribution(args.ttft_ms, args.ttft_p99_ms),
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        embedding_latency=LatencyDistribution(args.embedding_ms, args.embedding_p99_ms),
+        error_rate=args.error_rate,
+    )), host="127.0.0.1", port=args.port)
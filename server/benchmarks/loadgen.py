@@ -0,0 +1,293 @@
+"""
+Load-test the answer API offline and record latency percentiles as JSON.
+
+    python -m benchmarks.loadgen run --requests 300 --concurrency 16 --stream
+    python -m benchmarks.loadgen compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+FAKE_UPSTREAM_URL = "http://fake-openai.local"
+
+
+def _configure_environment(args: argparse.Namespace) -> None:
+    """Point the app at the stand-ins and switch off what needs MongoDB; must run before ``src`` is imported."""
+    os.environ.update({
+        "AZURE_OPENAI_ENDPOINT": FAKE_UPSTREAM_URL,
+        "AZURE_OPENAI_API_KEY": "benchmark",
+        "AZURE_EMBDEDDINGS_ENDPOINT": FAKE_UPSTREAM_URL,
+        "AZURE_EMBDEDDINGS_API_KEY": "benchmark",
+        "WARM_UP_ON_STARTUP": "false",
+        "CONVERSATION_STORE_ENABLED": "false",
+        "TOKEN_QUOTA_ENABLED": "false",
+        "HTTP2_ENABLED": "false",
+        "EMBEDDING_CACHE_ENABLED": str(args.embedding_cache).lower(),
+        "ANSWER_CACHE_ENABLED": str(args.answer_cache).lower(),
+    })
+    for assignment in args.env:
+        key, _, value = assignment.partition("=")
+        os.environ[key] = value
+
+    if not args.verbose:
+        import structlog
+
+        # Per-request info logs would dominate the output and the event loop
+        structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+
+def _percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    array = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 1),
+        "p95": round(float(p95), 1),
+        "p99": round(float(p99), 1),
+        "mean": round(float(array.mean()), 1),
+        "max": round(float(array.max()), 1),
+    }
+
+
+def _parse_server_timing(header: str) -> Dict[str, float]:
+    stages = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, params = entry.partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name != "total":
+                stages[name] = float(value)
+    return stages
+
+
+def _git_commit() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+async def _answer(client, body: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    response = await client.post("/api/answer", json=body)
+    return {
+        "status": response.status_code,
+        "latency_ms": (time.perf_counter() - started) * 1000,
+        "ttft_ms": None,
+        "stages": _parse_server_timing(response.headers.get("server-timing", "")),
+    }
+
+
+async def _answer_stream(client, body: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    result = {"status": None, "latency_ms": None, "ttft_ms": None, "stages": {}}
+    async with client.stream("POST", "/api/answer/stream", json=body) as response:
+        result["status"] = response.status_code
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                if event == "token" and result["ttft_ms"] is None:
+                    result["ttft_ms"] = (time.perf_counter() - started) * 1000
+                elif event == "end":
+                    result["stages"] = json.loads(line[len("data: "):])["timing"].get("stages_ms") or {}
+                elif event == "error":
+                    result["status"] = 500
+    result["latency_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+async def _drive(client, questions: List[str], args: argparse.Namespace, total: int) -> List[Dict[str, Any]]:
+    """Closed loop: ``concurrency`` workers each send their next request as soon as the last one finishes."""
+    results: List[Dict[str, Any]] = []
+    next_index = 0
+    call = _answer_stream if args.stream else _answer
+
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            index, next_index = next_index, next_index + 1
+            body = {"question": questions[index % len(questions)], "chunks": str(args.chunks), "token_limit": args.token_limit}
+            try:
+                results.append(await call(client, body))
+            except Exception as e:
+                results.append({"status": None, "error": repr(e), "latency_ms": None, "ttft_ms": None, "stages": {}})
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return results
+
+
+def _summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    ok = [result for result in results if result["status"] == 200]
+    stage_names = list(dict.fromkeys(stage for result in ok for stage in result["stages"]))
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "statuses": statuses,
+        "duration_s": round(elapsed, 2),
+        "rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": _percentiles([result["latency_ms"] for result in ok]),
+        "ttft_ms": _percentiles([result["ttft_ms"] for result in ok if result["ttft_ms"] is not None]),
+        "stages_ms": {
+            stage: _percentiles([result["stages"][stage] for result in ok if stage in result["stages"]])
+            for stage in stage_names
+        },
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    _configure_environment(args)
+
+    import httpx
+
+    from benchmarks.corpus import HashingEmbedder, make_chunks, make_questions
+    from benchmarks.fake_openai import LatencyDistribution, UpstreamProfile, create_app
+    from benchmarks.memory_store import InMemoryVectorStore
+    from benchmarks.transport import StreamingASGITransport
+    from src.core.clients import AZURE_EMBEDDINGS, AZURE_OPENAI, clients
+    from src.core.config import azure_embeddings_settings
+    from src.main import app
+    from src.vectorstore.factory import override_vector_store
+
+    dimensions = azure_embeddings_settings.EMBEDDING_DIMENSIONS
+    profile = UpstreamProfile(
+        chat_ttft=LatencyDistribution(args.ttft_ms, args.ttft_p99_ms),
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        embedding_latency=LatencyDistribution(args.embedding_ms, args.embedding_p99_ms),
+        dimensions=dimensions,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    upstream = create_app(profile)
+    upstream_transport = StreamingASGITransport(upstream)
+    clients.mount(AZURE_OPENAI, upstream_transport)
+    clients.mount(AZURE_EMBEDDINGS, upstream_transport)
+
+    chunks = make_chunks(args.corpus_size, seed=args.seed)
+    store = InMemoryVectorStore(chunks, HashingEmbedder(dimensions).embed(chunks), search_latency_ms=args.search_ms)
+    override_vector_store("youtube_data", store)
+    questions = make_questions(chunks, args.distinct_questions or args.requests, seed=args.seed + 1)
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=StreamingASGITransport(app), base_url="http://app.local", timeout=args.timeout
+        ) as client:
+            if args.warmup:
+                await _drive(client, questions[::-1], args, args.warmup)
+            started = time.perf_counter()
+            results = await _drive(client, questions, args, args.requests)
+            elapsed = time.perf_counter() - started
+            app_stats = (await client.get("/api/stats")).json()
+
+    return {
+        "meta": {
+            **_git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "args": vars(args),
+            "profile": asdict(profile),
+        },
+        "summary": _summarize(results, elapsed),
+        "upstream_calls": dict(upstream.state.stats),
+        "app_stats": app_stats,
+    }
+
+
+def _flatten(report: Dict[str, Any]) -> Dict[str, float]:
+    summary = report["summary"]
+    metrics = {"rps": summary["rps"], "errors": summary["errors"]}
+    for group in ("latency_ms", "ttft_ms"):
+        for key, value in (summary.get(group) or {}).items():
+            metrics[f"{group}.{key}"] = value
+    for stage, values in summary["stages_ms"].items():
+        for key in ("p50", "p95", "p99"):
+            metrics[f"stage.{stage}.{key}"] = (values or {}).get(key)
+    return metrics
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path) as file:
+        old = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    old_metrics, new_metrics = _flatten(old), _flatten(new)
+
+    print(f"{'metric':<36}{old['meta'].get('commit') or 'old':>12}{new['meta'].get('commit') or 'new':>12}{'change':>10}")
+    for name in dict.fromkeys([*old_metrics, *new_metrics]):
+        before, after = old_metrics.get(name), new_metrics.get(name)
+        change = f"{(after - before) / before * 100:+.1f}%" if before and after is not None else ""
+        print(f"{name:<36}{before if before is not None else '-':>12}{after if after is not None else '-':>12}{change:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load test of the answer API against local stand-ins")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run a load test and write the results as JSON")
+    run_parser.add_argument("--requests", type=int, default=200)
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--warmup", type=int, default=10, help="Unrecorded requests sent first")
+    run_parser.add_argument("--stream", action="store_true", help="Use /api/answer/stream and measure time to first token")
+    run_parser.add_argument("--chunks", type=int, default=3)
+    run_parser.add_argument("--token-limit", type=int, default=2000)
+    run_parser.add_argument("--distinct-questions", type=int, default=0, help="Cycle through this many questions, 0 makes each unique")
+    run_parser.add_argument("--corpus-size", type=int, default=2000)
+    run_parser.add_argument("--search-ms", type=float, default=5.0, help="Simulated vector store round trip")
+    run_parser.add_argument("--ttft-ms", type=float, default=350)
+    run_parser.add_argument("--ttft-p99-ms", type=float, default=1200)
+    run_parser.add_argument("--tokens-per-second", type=float, default=60)
+    run_parser.add_argument("--answer-tokens", type=int, default=150)
+    run_parser.add_argument("--embedding-ms", type=float, default=60)
+    run_parser.add_argument("--embedding-p99-ms", type=float, default=250)
+    run_parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream calls failing with 503")
+    run_parser.add_argument("--embedding-cache", action="store_true")
+    run_parser.add_argument("--answer-cache", action="store_true")
+    run_parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra app setting, repeatable")
+    run_parser.add_argument("--timeout", type=float, default=120)
+    run_parser.add_argument("--verbose", action="store_true", help="Keep the app's info logs")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="Defaults to benchmarks/results/<timestamp>-<commit>.json")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args.old, args.new)
+        return
+
+    report = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        RESULTS_DIR,
+        f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit'] or 'nogit'}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    summary = report["summary"]
+    print(json.dumps({key: summary[key] for key in ("requests", "errors", "rps", "latency_ms", "ttft_ms")}, indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
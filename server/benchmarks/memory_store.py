@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.vectorstore.base import BaseVectorStore, group_hits_by_id
+from src.utils.embeddings import aget_embedding_3_large_simple, get_embedding_3_large_simple
+from src.utils.tracing import span
+
+
+class InMemoryVectorStore(BaseVectorStore):
+    """
+    Exact cosine search over a float32 matrix held in memory.
+
+    Scores use Atlas's ``(1 + cosine) / 2`` scale and results have the same
+    shapes as ``MongoVectorRetriever``, so the pipeline runs unchanged.
+    """
+
+    def __init__(self, chunks: List[str], vectors: np.ndarray, search_latency_ms: float = 0.0):
+        super().__init__()
+        self.chunks = chunks
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        self.ids = [f"chunk-{i}" for i in range(len(chunks))]
+        self.search_latency = search_latency_ms / 1000  # Simulated network round trip
+
+    def search_vectors(self, query_vectors: np.ndarray, k: int) -> List[List[Dict[str, Any]]]:
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        scores = queries @ self.vectors.T
+        k = min(k, len(self.chunks))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([
+                {"_id": self.ids[i], "chunk_content": self.chunks[i], "score": float((1 + scores[row, i]) / 2)}
+                for i in ordered
+            ])
+        return results
+
+    def search(self, query: str, k: int, **kwargs) -> list:
+        return self.search_vectors(get_embedding_3_large_simple(query), k)[0]
+
+    async def asearch(self, query: str, k: int, query_vector: np.ndarray | None = None, **kwargs) -> list:
+        if query_vector is None:
+            query_vector = await aget_embedding_3_large_simple(query)
+        with span("vector_search", upstream="memory"):
+            await asyncio.sleep(self.search_latency)
+            return self.search_vectors(query_vector, k)[0]
+
+    async def asearch_many(self, query_vectors: np.ndarray, k: int, **kwargs) -> list:
+        """Search every query vector at once, grouped by document like ``MongoVectorRetriever.asearch_many``."""
+        with span("vector_search", upstream="memory"):
+            await asyncio.sleep(self.search_latency)
+            return group_hits_by_id(self.search_vectors(query_vectors, k))
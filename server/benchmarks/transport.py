@@ -0,0 +1,94 @@
+import asyncio
+from typing import AsyncIterator, Optional
+
+import httpx
+
+
+class _BodyStream(httpx.AsyncByteStream):
+    def __init__(self, queue: "asyncio.Queue[Optional[bytes]]", task: asyncio.Task):
+        self._queue = queue
+        self._task = task
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while (chunk := await self._queue.get()) is not None:
+            yield chunk
+        await self._task
+
+    async def aclose(self) -> None:
+        if not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+class StreamingASGITransport(httpx.AsyncBaseTransport):
+    """
+    Call an ASGI app in-process without buffering its response.
+
+    ``httpx.ASGITransport`` waits for the whole body before returning, which
+    hides time-to-first-token. This transport returns as soon as the headers
+    are sent and streams body chunks as the app produces them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": request.method,
+            "headers": [(key.lower(), value) for key, value in request.headers.raw],
+            "scheme": request.url.scheme,
+            "path": request.url.path,
+            "raw_path": request.url.raw_path.split(b"?")[0],
+            "query_string": request.url.query,
+            "server": (request.url.host, request.url.port or 80),
+            "client": ("127.0.0.1", 50000),
+            "root_path": "",
+        }
+        request_sent = False
+        disconnected = asyncio.Event()
+        started: asyncio.Future = asyncio.get_running_loop().create_future()
+        chunks: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue()
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                if started.done():  # the caller gave up before the response started
+                    return
+                started.set_result((message["status"], message.get("headers", [])))
+            elif message["type"] == "http.response.body":
+                if message.get("body"):
+                    await chunks.put(message["body"])
+                if not message.get("more_body", False):
+                    await chunks.put(None)
+
+        async def run():
+            try:
+                await self.app(scope, receive, send)
+            except Exception as e:
+                if not started.done():
+                    started.set_exception(e)
+                raise
+            finally:
+                disconnected.set()
+                await chunks.put(None)
+
+        task = asyncio.create_task(run())
+        try:
+            status, headers = await started
+        except asyncio.CancelledError:
+            # Cancelled callers (e.g. the losing side of a hedge) disconnect, like a closed socket
+            disconnected.set()
+            task.cancel()
+            raise
+        return httpx.Response(status, headers=headers, stream=_BodyStream(chunks, task), request=request)
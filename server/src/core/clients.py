@@ -0,0 +1,211 @@
+import importlib.util
+from typing import Dict, List
+
+import httpx
+from openai import AsyncAzureOpenAI, AzureOpenAI
+
+from src.core.config import azure_embeddings_settings, http_client_settings, llm_settings
+from src.utils.logging import get_logger
+from src.utils.tracing import render_samples
+
+logger = get_logger(__name__)
+
+AZURE_OPENAI = "azure_openai"
+AZURE_EMBEDDINGS = "azure_embeddings"
+
+
+class _ConnectionStats:
+    """Counts requests against newly opened connections, from httpcore trace events."""
+
+    def __init__(self):
+        self.counters = {"requests": 0, "http2_requests": 0, "connections_opened": 0, "tls_handshakes": 0}
+
+    def _record(self, event_name: str) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.counters["connections_opened"] += 1
+        elif event_name == "connection.start_tls.complete":
+            self.counters["tls_handshakes"] += 1
+
+    async def atrace(self, event_name: str, info: dict) -> None:
+        self._record(event_name)
+
+    def trace(self, event_name: str, info: dict) -> None:
+        self._record(event_name)
+
+    def on_response(self, response: httpx.Response) -> None:
+        self.counters["requests"] += 1
+        if response.http_version == "HTTP/2":
+            self.counters["http2_requests"] += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        stats = dict(self.counters)
+        requests = stats["requests"]
+        stats["reuse_rate"] = round(1 - min(stats["connections_opened"], requests) / requests, 4) if requests else 0.0
+        return stats
+
+
+class ClientRegistry:
+    """
+    Application-owned HTTP clients, one pooled client per upstream.
+
+    Each upstream gets a keep-alive ``httpx`` client (HTTP/2 when available)
+    with bounded pools, and the Azure OpenAI SDK clients are built once on
+    top of them, so every LLM and embedding call reuses warm connections.
+    Close it on shutdown with ``aclose``.
+    """
+
+    def __init__(self):
+        self._async_http: Dict[str, httpx.AsyncClient] = {}
+        self._sync_http: Dict[str, httpx.Client] = {}
+        self._sdk: Dict[str, object] = {}
+        self._stats: Dict[str, _ConnectionStats] = {}
+        self._transports: Dict[str, httpx.AsyncBaseTransport] = {}
+        self.http2 = http_client_settings.HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+        if http_client_settings.HTTP2_ENABLED and not self.http2:
+            logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+
+    @staticmethod
+    def _options() -> dict:
+        return {
+            "limits": httpx.Limits(
+                max_connections=http_client_settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=http_client_settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=http_client_settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            "timeout": httpx.Timeout(
+                http_client_settings.HTTP_READ_TIMEOUT_SECONDS,
+                connect=http_client_settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+            ),
+        }
+
+    def _stats_for(self, upstream: str) -> _ConnectionStats:
+        return self._stats.setdefault(upstream, _ConnectionStats())
+
+    def mount(self, upstream: str, transport: httpx.AsyncBaseTransport) -> None:
+        """Send the async traffic of ``upstream`` through ``transport``, e.g. a local stand-in for benchmarks."""
+        if upstream in self._async_http:
+            raise RuntimeError(f"The {upstream} client is already open")
+        self._transports[upstream] = transport
+
+    def http(self, upstream: str) -> httpx.AsyncClient:
+        """Return the pooled async client for ``upstream``."""
+        client = self._async_http.get(upstream)
+        if client is None:
+            stats = self._stats_for(upstream)
+
+            async def attach_trace(request: httpx.Request) -> None:
+                request.extensions["trace"] = stats.atrace
+
+            async def count_response(response: httpx.Response) -> None:
+                stats.on_response(response)
+
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                transport=self._transports.get(upstream),
+                event_hooks={"request": [attach_trace], "response": [count_response]},
+                **self._options(),
+            )
+            self._async_http[upstream] = client
+        return client
+
+    def sync_http(self, upstream: str) -> httpx.Client:
+        """Return the pooled sync client for ``upstream``, for scripts and the sync code paths."""
+        client = self._sync_http.get(upstream)
+        if client is None:
+            stats = self._stats_for(upstream)
+
+            def attach_trace(request: httpx.Request) -> None:
+                request.extensions["trace"] = stats.trace
+
+            client = httpx.Client(
+                http2=self.http2,
+                event_hooks={"request": [attach_trace], "response": [stats.on_response]},
+                **self._options(),
+            )
+            self._sync_http[upstream] = client
+        return client
+
+    def _sdk_client(self, key: str, factory):
+        client = self._sdk.get(key)
+        if client is None:
+            client = self._sdk[key] = factory()
+        return client
+
+    # The SDK's own retries are off: src.core.resilience times out, retries and hedges calls
+
+    def async_openai(self) -> AsyncAzureOpenAI:
+        return self._sdk_client("async_openai", lambda: AsyncAzureOpenAI(
+            api_version=llm_settings.AZURE_OPENAI_API_VERSION,
+            azure_endpoint=llm_settings.AZURE_OPENAI_ENDPOINT,
+            api_key=llm_settings.AZURE_OPENAI_API_KEY,
+            max_retries=0,
+            http_client=self.http(AZURE_OPENAI),
+        ))
+
+    def openai(self) -> AzureOpenAI:
+        return self._sdk_client("openai", lambda: AzureOpenAI(
+            api_version=llm_settings.AZURE_OPENAI_API_VERSION,
+            azure_endpoint=llm_settings.AZURE_OPENAI_ENDPOINT,
+            api_key=llm_settings.AZURE_OPENAI_API_KEY,
+            max_retries=0,
+            http_client=self.sync_http(AZURE_OPENAI),
+        ))
+
+    def async_embeddings(self, deployment: str | None = None) -> AsyncAzureOpenAI:
+        """Return the async embeddings client for ``deployment``, by default ``AZURE_EMBDEDDINGS_DEPLOYMENT``."""
+        deployment = deployment or azure_embeddings_settings.AZURE_EMBDEDDINGS_DEPLOYMENT
+        return self._sdk_client(f"async_embeddings:{deployment}", lambda: AsyncAzureOpenAI(
+            api_key=azure_embeddings_settings.AZURE_EMBDEDDINGS_API_KEY,
+            api_version=azure_embeddings_settings.AZURE_EMBDEDDINGS_API_VERSION,
+            azure_endpoint=azure_embeddings_settings.AZURE_EMBDEDDINGS_ENDPOINT,
+            azure_deployment=deployment,
+            max_retries=0,
+            http_client=self.http(AZURE_EMBEDDINGS),
+        ))
+
+    def embeddings(self, deployment: str | None = None) -> AzureOpenAI:
+        deployment = deployment or azure_embeddings_settings.AZURE_EMBDEDDINGS_DEPLOYMENT
+        return self._sdk_client(f"embeddings:{deployment}", lambda: AzureOpenAI(
+            api_key=azure_embeddings_settings.AZURE_EMBDEDDINGS_API_KEY,
+            api_version=azure_embeddings_settings.AZURE_EMBDEDDINGS_API_VERSION,
+            azure_endpoint=azure_embeddings_settings.AZURE_EMBDEDDINGS_ENDPOINT,
+            azure_deployment=deployment,
+            max_retries=0,
+            http_client=self.sync_http(AZURE_EMBEDDINGS),
+        ))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {upstream: stats.snapshot() for upstream, stats in self._stats.items()}
+
+    def metrics(self) -> List[str]:
+        """Connection reuse counters per upstream, in the Prometheus text format."""
+        stats = sorted(self.stats().items())
+        lines = []
+        for counter, help_text in (
+            ("requests", "Requests sent to each upstream."),
+            ("http2_requests", "Requests to each upstream answered over HTTP/2."),
+            ("connections_opened", "TCP connections opened to each upstream."),
+            ("tls_handshakes", "TLS handshakes completed with each upstream."),
+        ):
+            lines += render_samples(
+                f"http_client_{counter}_total", help_text, "counter",
+                [({"upstream": upstream}, snapshot[counter]) for upstream, snapshot in stats],
+            )
+        lines += render_samples(
+            "http_client_connection_reuse_ratio", "Share of requests to each upstream sent on a reused connection.", "gauge",
+            [({"upstream": upstream}, snapshot["reuse_rate"]) for upstream, snapshot in stats],
+        )
+        return lines
+
+    async def aclose(self) -> None:
+        for client in self._async_http.values():
+            await client.aclose()
+        for client in self._sync_http.values():
+            client.close()
+        self._async_http.clear()
+        self._sync_http.clear()
+        self._sdk.clear()
+        logger.info("HTTP clients closed")
+
+
+clients = ClientRegistry()
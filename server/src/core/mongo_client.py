@@ -1,9 +1,10 @@
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
 
 
 
-from src.core.config import mongodb_settings
+from src.core.config import mongodb_settings, token_settings
 from src.utils.logging import get_logger
 
 logger = get_logger(__file__)
@@ -39,4 +40,65 @@ class MongoDatabaseConnector:
             logger.info("Connected to database has been closed.")
 
 
-connection = MongoDatabaseConnector()
+class AsyncMongoDatabaseConnector:
+    """Singleton class holding the shared motor client for async database access."""
+
+    _instance: AsyncIOMotorClient | None = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            try:
+                cls._instance = AsyncIOMotorClient(mongodb_settings.MONGODB_URL)
+                logger.info(
+                    f"Async connection to database with uri: {mongodb_settings.MONGODB_URL} successful"
+                )
+            except ConnectionFailure:
+                logger.error(f"Couldn't connect to the database.")
+
+                raise
+
+        return cls._instance
+
+    def get_database(self, database_name: str | None = None):
+        assert self._instance, "Database connection not initialized"
+
+        return self._instance[database_name]
+
+    def close(self):
+        if self._instance:
+            self._instance.close()
+            logger.info("Async connection to database has been closed.")
+
+
+def get_connection() -> MongoClient:
+    """Return the shared MongoClient, connecting on first use rather than at import."""
+    return MongoDatabaseConnector()
+
+
+def get_async_connection() -> AsyncIOMotorClient:
+    """Return the shared motor client, connecting on first use rather than at import."""
+    return AsyncMongoDatabaseConnector()
+
+
+_users_client: AsyncIOMotorClient | None = None
+
+
+def get_users_connection() -> AsyncIOMotorClient:
+    """Return the motor client for the users database (``USER_URL``), connecting on first use."""
+    global _users_client
+    if _users_client is None:
+        _users_client = AsyncIOMotorClient(token_settings.USER_URL)
+    return _users_client
+
+
+def close_connections() -> None:
+    """Close whichever clients were opened; the next get_* call reconnects."""
+    global _users_client
+    for connector in (MongoDatabaseConnector, AsyncMongoDatabaseConnector):
+        if connector._instance is not None:
+            connector._instance.close()
+            connector._instance = None
+    if _users_client is not None:
+        _users_client.close()
+        _users_client = None
+    logger.info("Database connections closed.")
@@ -0,0 +1,462 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import numpy as np
+import openai
+
+from src.core.clients import AZURE_EMBEDDINGS, AZURE_OPENAI
+from src.core.config import resilience_settings
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# The upstream was slow, unreachable, throttling or failing: worth another attempt
+RETRYABLE_ERRORS = (TimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+
+class UpstreamUnavailable(Exception):
+    """Every allowed attempt at an upstream failed or its circuits are open; callers shed to a fallback."""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Raised without calling the upstream because its circuits are open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one upstream deployment.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    fail fast. Once ``reset_timeout`` has passed a single probe call is let
+    through (half-open): its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"opened": 0, "rejected": 0}
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self.state != self.CLOSED:
+                logger.info("Circuit closed", upstream=self.name)
+                self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._counters["opened"] += 1
+                    logger.warning("Circuit opened", upstream=self.name, failures=self._failures)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_cancelled(self) -> None:
+        # A cancelled probe proved nothing; let the next call probe instead
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic() - self.reset_timeout
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures, **self._counters}
+
+
+class LatencyTracker:
+    """Latencies of the most recent successful calls, with cached percentiles."""
+
+    def __init__(self, window: int = 512, refresh_every: int = 32):
+        self._samples: deque = deque(maxlen=window)
+        self._refresh_every = refresh_every
+        self._since_refresh = 0
+        self._cached: Dict[float, float] = {}
+        # Also fed from the worker threads of call_sync
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_refresh += 1
+            if self._since_refresh >= self._refresh_every:
+                self._cached.clear()
+                self._since_refresh = 0
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            if p not in self._cached:
+                self._cached[p] = float(np.percentile(np.fromiter(self._samples, dtype=np.float64), p))
+            return self._cached[p]
+
+
+class RetryBudget:
+    """Token bucket allowing retries and hedges for at most ``ratio`` of calls, plus ``min_tokens`` of headroom."""
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max(min_tokens, 1.0)
+        self._tokens = self.max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(upstream: str, target: str) -> CircuitBreaker:
+    key = (upstream, target)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(
+                f"{upstream}/{target}",
+                failure_threshold=resilience_settings.BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=resilience_settings.BREAKER_RESET_SECONDS,
+            )
+    return breaker
+
+
+class ResiliencePolicy:
+    """
+    Timeouts, retries, hedging and circuit breaking for one kind of upstream call.
+
+    An attempt is a callable taking the deployment to send it to. Attempts
+    time out after ``timeout`` seconds and failed ones are retried with
+    full-jitter backoff while the retry budget allows, preferring the
+    fallback deployment. With ``hedge``, an attempt still running after the
+    observed latency percentile is raced against a second one, so only use
+    it for idempotent calls. Deployments whose circuit is open are skipped;
+    with none left the call fails fast with ``CircuitOpenError``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        upstream: str,
+        timeout: float,
+        hedge: bool = False,
+        fallback_target: Optional[str] = None,
+    ):
+        self.name = name
+        self.upstream = upstream
+        self.timeout = timeout
+        self.hedge = hedge
+        self.fallback_target = fallback_target
+        self.max_attempts = max(resilience_settings.RETRY_MAX_ATTEMPTS, 1)
+        self.budget = RetryBudget(resilience_settings.RETRY_BUDGET_RATIO, resilience_settings.RETRY_BUDGET_MIN_TOKENS)
+        self.latency = LatencyTracker()
+        self._counters = {
+            "calls": 0, "retries": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0,
+            "budget_exhausted": 0, "circuit_rejections": 0, "unavailable": 0,
+        }
+        self._counters_lock = threading.Lock()
+
+    def _count(self, counter: str) -> None:
+        # call_sync runs in worker threads, so counters are shared across threads
+        with self._counters_lock:
+            self._counters[counter] += 1
+
+    def _pick(self, primary: str, avoid: Optional[str] = None) -> Tuple[str, CircuitBreaker]:
+        targets = [primary]
+        if self.fallback_target and self.fallback_target != primary:
+            targets.append(self.fallback_target)
+        if avoid is not None:
+            targets.sort(key=lambda target: target == avoid)
+        for target in targets:
+            breaker = breaker_for(self.upstream, target)
+            if breaker.allow():
+                return target, breaker
+        self._count("circuit_rejections")
+        raise CircuitOpenError(f"{self.name}: circuit open for {', '.join(targets)}")
+
+    @staticmethod
+    def _backoff(attempt_number: int) -> float:
+        ceiling = resilience_settings.RETRY_BASE_DELAY_SECONDS * 2 ** (attempt_number - 1)
+        return random.uniform(0, min(ceiling, resilience_settings.RETRY_MAX_DELAY_SECONDS))
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not (self.hedge and resilience_settings.HEDGING_ENABLED):
+            return None
+        if self.latency.count < resilience_settings.HEDGE_MIN_SAMPLES:
+            return None
+        return max(self.latency.percentile(resilience_settings.HEDGE_PERCENTILE), resilience_settings.HEDGE_MIN_DELAY_SECONDS)
+
+    def _may_retry(self, attempt_number: int) -> bool:
+        if attempt_number == 0:
+            return True
+        if not self.budget.withdraw():
+            self._count("budget_exhausted")
+            return False
+        self._count("retries")
+        return True
+
+    def _unavailable(self, error: Optional[BaseException]) -> UpstreamUnavailable:
+        self._count("unavailable")
+        if isinstance(error, UpstreamUnavailable):
+            return error
+        return UpstreamUnavailable(f"{self.name} failed after retries: {error!r}")
+
+    async def _attempt(
+        self, attempt: Callable[[str], Awaitable[T]], target: str, breaker: CircuitBreaker, failed: List[str]
+    ) -> T:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(attempt(target), self.timeout)
+        except RETRYABLE_ERRORS as e:
+            if isinstance(e, TimeoutError):
+                self._count("timeouts")
+            breaker.record_failure()
+            failed.append(target)
+            raise
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            raise
+        except Exception:
+            # The upstream answered, it just rejected this request (e.g. a 400)
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        self.latency.observe(time.perf_counter() - started)
+        return result
+
+    async def _hedged(
+        self, attempt: Callable[[str], Awaitable[T]], primary: str, avoid: Optional[str], failed: List[str]
+    ) -> T:
+        """Run one attempt, hedged when it is slow; deployments whose attempt failed are appended to ``failed``."""
+        target, breaker = self._pick(primary, avoid)
+        tasks = [asyncio.ensure_future(self._attempt(attempt, target, breaker, failed))]
+        try:
+            delay = self._hedge_delay()
+            if delay is None:
+                return await tasks[0]
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self.budget.withdraw():
+                return await tasks[0]
+            try:
+                hedge_target, hedge_breaker = self._pick(primary, avoid=target)
+            except CircuitOpenError:
+                return await tasks[0]
+
+            self._count("hedges")
+            tasks.append(asyncio.ensure_future(self._attempt(attempt, hedge_target, hedge_breaker, failed)))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, attempt: Callable[[str], Awaitable[T]], primary: str) -> T:
+        """
+        Run ``attempt`` against ``primary`` (or the fallback deployment) with the full policy.
+
+        :raises UpstreamUnavailable: When every allowed attempt failed or the circuits are open
+        """
+        self._count("calls")
+        self.budget.deposit()
+        last_error, failed = None, []
+        for attempt_number in range(self.max_attempts):
+            if not self._may_retry(attempt_number):
+                break
+            if attempt_number:
+                await asyncio.sleep(self._backoff(attempt_number))
+            try:
+                return await self._hedged(attempt, primary, avoid=failed[-1] if failed else None, failed=failed)
+            except CircuitOpenError as e:
+                last_error = e
+                break
+            except RETRYABLE_ERRORS as e:
+                # The next attempt prefers a deployment other than the one that failed last
+                last_error = e
+                logger.warning(f"{self.name} attempt {attempt_number + 1} failed: {e!r}")
+        raise self._unavailable(last_error) from last_error
+
+    def call_sync(self, attempt: Callable[[str], T], primary: str) -> T:
+        """Blocking variant of ``call`` for the sync code paths; ``attempt`` must apply ``self.timeout`` itself. No hedging."""
+        self._count("calls")
+        self.budget.deposit()
+        last_error, failed_target = None, None
+        for attempt_number in range(self.max_attempts):
+            if not self._may_retry(attempt_number):
+                break
+            if attempt_number:
+                time.sleep(self._backoff(attempt_number))
+            try:
+                target, breaker = self._pick(primary, avoid=failed_target)
+            except CircuitOpenError as e:
+                last_error = e
+                break
+            started = time.perf_counter()
+            try:
+                result = attempt(target)
+            except RETRYABLE_ERRORS as e:
+                breaker.record_failure()
+                last_error, failed_target = e, target
+                logger.warning(f"{self.name} attempt {attempt_number + 1} failed: {e!r}")
+                continue
+            except Exception:
+                breaker.record_success()
+                raise
+            breaker.record_success()
+            self.latency.observe(time.perf_counter() - started)
+            return result
+        raise self._unavailable(last_error) from last_error
+
+    async def stream(
+        self,
+        open_stream: Callable[[str], AsyncIterator[T]],
+        primary: str,
+        first_timeout: float,
+        idle_timeout: float,
+    ) -> AsyncIterator[T]:
+        """
+        Stream from ``open_stream`` with timeouts on the first and every following item.
+
+        Attempts are retried only until the first item arrives; after that a
+        broken stream raises ``UpstreamUnavailable``, since part of it was already passed on.
+        """
+        self._count("calls")
+        self.budget.deposit()
+        last_error, failed_target = None, None
+        for attempt_number in range(self.max_attempts):
+            if not self._may_retry(attempt_number):
+                break
+            if attempt_number:
+                await asyncio.sleep(self._backoff(attempt_number))
+            try:
+                target, breaker = self._pick(primary, avoid=failed_target)
+            except CircuitOpenError as e:
+                last_error = e
+                break
+
+            items = open_stream(target)
+            started = time.perf_counter()
+            try:
+                first = await asyncio.wait_for(items.__anext__(), first_timeout)
+            except StopAsyncIteration:
+                breaker.record_success()
+                return
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, TimeoutError):
+                    self._count("timeouts")
+                breaker.record_failure()
+                await items.aclose()
+                last_error, failed_target = e, target
+                logger.warning(f"{self.name} stream attempt {attempt_number + 1} failed: {e!r}")
+                continue
+            except asyncio.CancelledError:
+                breaker.record_cancelled()
+                await items.aclose()
+                raise
+            except Exception:
+                breaker.record_success()
+                await items.aclose()
+                raise
+
+            breaker.record_success()
+            self.latency.observe(time.perf_counter() - started)
+            try:
+                yield first
+                while True:
+                    try:
+                        item = await asyncio.wait_for(items.__anext__(), idle_timeout)
+                    except StopAsyncIteration:
+                        return
+                    yield item
+            except RETRYABLE_ERRORS as e:
+                breaker.record_failure()
+                raise self._unavailable(e) from e
+            finally:
+                await items.aclose()
+        raise self._unavailable(last_error) from last_error
+
+    def stats(self) -> Dict[str, object]:
+        with self._counters_lock:
+            stats: Dict[str, object] = dict(self._counters)
+        p50, p95 = self.latency.percentile(50), self.latency.percentile(95)
+        stats["latency_p50_ms"] = round(p50 * 1000, 1) if p50 is not None else None
+        stats["latency_p95_ms"] = round(p95 * 1000, 1) if p95 is not None else None
+        delay = self._hedge_delay()
+        stats["hedge_delay_ms"] = round(delay * 1000, 1) if delay is not None else None
+        return stats
+
+
+llm_answer_policy = ResiliencePolicy(
+    "llm_answer",
+    AZURE_OPENAI,
+    timeout=resilience_settings.LLM_TIMEOUT_SECONDS,
+    fallback_target=resilience_settings.AZURE_OPENAI_FALLBACK_DEPLOYMENT,
+)
+# Planner, follow-up classification and expansion: short, idempotent, safe to hedge
+llm_auxiliary_policy = ResiliencePolicy(
+    "llm_auxiliary",
+    AZURE_OPENAI,
+    timeout=resilience_settings.LLM_AUXILIARY_TIMEOUT_SECONDS,
+    hedge=True,
+    fallback_target=resilience_settings.AZURE_OPENAI_FALLBACK_DEPLOYMENT,
+)
+embeddings_policy = ResiliencePolicy(
+    "embeddings",
+    AZURE_EMBEDDINGS,
+    timeout=resilience_settings.EMBEDDING_TIMEOUT_SECONDS,
+    hedge=True,
+    fallback_target=resilience_settings.AZURE_EMBDEDDINGS_FALLBACK_DEPLOYMENT,
+)
+
+_policies: List[ResiliencePolicy] = [llm_answer_policy, llm_auxiliary_policy, embeddings_policy]
+
+
+def resilience_stats() -> Dict[str, Dict[str, object]]:
+    with _breakers_lock:
+        breakers = {breaker.name: breaker.snapshot() for breaker in _breakers.values()}
+    return {"policies": {policy.name: policy.stats() for policy in _policies}, "breakers": breakers}
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, Optional
+
+from src.core.clients import clients
+from src.core.config import startup_settings
+from src.core.mongo_client import close_connections, get_async_connection
+from src.utils.embedding_cache import embedding_cache
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class DependencyStatus:
+    ready: bool = False
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+    checked_at: Optional[float] = None  # Unix time of the last check
+
+
+async def _ping_mongo() -> None:
+    await get_async_connection().admin.command("ping")
+
+
+# The upstream pings list the models on the shared clients: nothing is generated or billed, and
+# they stay out of the resilience policies' latency trackers and breakers and out of usage accounting
+
+async def _ping_llm() -> None:
+    await clients.async_openai().models.list()
+
+
+async def _ping_embeddings() -> None:
+    await clients.async_embeddings().models.list()
+
+
+class ResourceManager:
+    """
+    Owns the shared upstream clients for the lifetime of the app.
+
+    Clients are created lazily on first use. ``warm_up`` checks every
+    dependency in parallel, which also opens the pooled connections before the
+    first request, and ``readiness`` reports the per-dependency status behind
+    ``/api/ready``. ``shutdown`` closes everything that was opened.
+    """
+
+    def __init__(self, checks: Dict[str, Callable[[], Awaitable[None]]]):
+        self.checks = checks
+        self.status: Dict[str, DependencyStatus] = {name: DependencyStatus() for name in checks}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    async def _run_check(self, name: str) -> DependencyStatus:
+        started = time.perf_counter()
+        status = DependencyStatus()
+        try:
+            await asyncio.wait_for(self.checks[name](), timeout=startup_settings.WARM_UP_TIMEOUT_SECONDS)
+            status.ready = True
+        except Exception as e:
+            status.error = f"{type(e).__name__}: {e}"
+            logger.warning("Dependency check failed", dependency=name, error=status.error)
+        status.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        status.checked_at = time.time()
+        self.status[name] = status
+        return status
+
+    async def check(self, name: str) -> DependencyStatus:
+        """Check one dependency, joining a check that is already running."""
+        task = self._in_flight.get(name)
+        if task is None:
+            task = self._in_flight[name] = asyncio.ensure_future(self._run_check(name))
+            task.add_done_callback(lambda _: self._in_flight.pop(name, None))
+        return await asyncio.shield(task)
+
+    async def warm_up(self) -> Dict[str, DependencyStatus]:
+        started = time.perf_counter()
+        await asyncio.gather(*(self.check(name) for name in self.checks))
+        logger.info(
+            "Warm-up finished",
+            total_ms=round((time.perf_counter() - started) * 1000, 1),
+            **{name: status.ready for name, status in self.status.items()},
+        )
+        return self.status
+
+    async def readiness(self) -> Dict[str, object]:
+        """
+        Per-dependency readiness, re-checking dependencies that failed, were
+        never checked, or were last checked more than READINESS_RECHECK_SECONDS ago.
+        """
+        now = time.time()
+        stale = [
+            name for name, status in self.status.items()
+            if not status.ready
+            or status.checked_at is None
+            or now - status.checked_at > startup_settings.READINESS_RECHECK_SECONDS
+        ]
+        if stale:
+            await asyncio.gather(*(self.check(name) for name in stale))
+        return {
+            "ready": all(status.ready for status in self.status.values()),
+            "dependencies": {name: asdict(status) for name, status in self.status.items()},
+        }
+
+    async def shutdown(self) -> None:
+        for task in list(self._in_flight.values()):
+            task.cancel()
+        await clients.aclose()
+        close_connections()
+        if embedding_cache is not None:
+            await embedding_cache.aclose()
+
+
+resources = ResourceManager({
+    "mongodb": _ping_mongo,
+    "llm": _ping_llm,
+    "embeddings": _ping_embeddings,
+})
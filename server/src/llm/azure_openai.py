@@ -1,32 +1,42 @@
 import sys
 sys.path.insert(0, "/home/mohamed-ayari/projects/youtube-chatbot/server")  # Adjust the path to import from app.llm.base
 
-from openai import AzureOpenAI
-from typing import Iterator
+from typing import AsyncIterator, Iterator
 
 from src.llm.base import BaseLLM
-from src.core.config import llm_settings
+from src.core.clients import clients
+from src.core.config import resilience_settings
+from src.core.resilience import llm_answer_policy, llm_auxiliary_policy
+
+
+def _policy(kwargs):
+    # Callers mark short, repeatable calls (planner, classification, expansion) as idempotent so they get hedged
+    return llm_auxiliary_policy if kwargs.pop("idempotent", False) else llm_answer_policy
 
 class OpenAILLM(BaseLLM):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
-        self.client = AzureOpenAI(
-            api_version=llm_settings.AZURE_OPENAI_API_VERSION,
-            azure_endpoint=llm_settings.AZURE_OPENAI_ENDPOINT,
-            api_key=llm_settings.AZURE_OPENAI_API_KEY
-        )
+        # Shared SDK clients: constructing an OpenAILLM no longer opens new connections
+        self.client = clients.openai()
+        self.async_client = clients.async_openai()
     
     def _raw_gen(
         self,
         messages,
         **kwargs
     ): 
-        response = self.client.chat.completions.create(
-            model=kwargs.get('model', "chat"),
-            messages=messages,
-            stream=kwargs.get('stream', False)
+        policy = _policy(kwargs)
+        response = policy.call_sync(
+            lambda deployment: self.client.chat.completions.create(
+                model=deployment,
+                messages=messages,
+                stream=kwargs.get('stream', False),
+                timeout=policy.timeout,
+            ),
+            primary=kwargs.get('model', "chat"),
         )
+        self._record_usage(self._usage_dict(response.usage))
         return response.choices[0].message.content
     
     def _stream_gen(
@@ -48,16 +58,91 @@ class OpenAILLM(BaseLLM):
             model=kwargs.get('model', "gpt-4o"),
             messages=messages,
             stream=True,
-            **{k: v for k, v in kwargs.items() if k not in ['model', 'stream']}
+            stream_options={"include_usage": True},
+            **{k: v for k, v in kwargs.items() if k not in ['model', 'stream', 'stream_options']}
         )
         
         for chunk in response:
+            if chunk.usage is not None:
+                self._record_usage(self._usage_dict(chunk.usage))
             # Check if chunk has choices and the first choice has content
             if (chunk.choices and 
                 len(chunk.choices) > 0 and 
                 chunk.choices[0].delta and 
                 chunk.choices[0].delta.content is not None):
                 yield chunk.choices[0].delta.content
+
+    @staticmethod
+    def _usage_dict(usage):
+        if usage is None:
+            return None
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+        }
+
+    async def _raw_agen(
+        self,
+        messages,
+        **kwargs
+    ):
+        policy = _policy(kwargs)
+        response = await policy.call(
+            lambda deployment: self.async_client.chat.completions.create(
+                model=deployment,
+                messages=messages,
+                **{k: v for k, v in kwargs.items() if k not in ['model', 'stream']}
+            ),
+            primary=kwargs.get('model', "chat"),
+        )
+        self._record_usage(self._usage_dict(response.usage))
+        return response.choices[0].message.content
+
+    async def _stream_agen(
+        self,
+        messages,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream response from Azure OpenAI without blocking the event loop
+        
+        Args:
+            messages: List of message dictionaries
+            **kwargs: Additional parameters
+            
+        Yields:
+            str: Chunks of the response as they arrive
+        """
+        policy = _policy(kwargs)
+
+        async def open_stream(deployment) -> AsyncIterator[str]:
+            response = await self.async_client.chat.completions.create(
+                model=deployment,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **{k: v for k, v in kwargs.items() if k not in ['model', 'stream', 'stream_options']}
+            )
+
+            async for chunk in response:
+                # The usage-only chunk arrives last, with an empty choices list
+                if chunk.usage is not None:
+                    self._record_usage(self._usage_dict(chunk.usage))
+                if (chunk.choices and
+                    len(chunk.choices) > 0 and
+                    chunk.choices[0].delta and
+                    chunk.choices[0].delta.content is not None):
+                    yield chunk.choices[0].delta.content
+
+        # Retried until the first chunk arrives, never after
+        async for content in policy.stream(
+            open_stream,
+            primary=kwargs.get('model', "gpt-4o"),
+            first_timeout=resilience_settings.LLM_FIRST_TOKEN_TIMEOUT_SECONDS,
+            idle_timeout=resilience_settings.LLM_STREAM_IDLE_TIMEOUT_SECONDS,
+        ):
+            yield content
    
     def answer_query(self, query: str):
         answer = self._raw_gen(
@@ -1,8 +1,23 @@
+import asyncio
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Optional
+
+from src.llm.usage import record_usage
 
 class BaseLLM(ABC):
     def __init__(self):
         self.token_usage = {"prompt_tokens": 0, "generated_tokens": 0}
+        # Usage reported by the provider for the most recent call, if any
+        self.last_usage = None
+
+    def _record_usage(self, usage: Optional[Dict[str, int]]) -> None:
+        """Account the usage reported for a completion on this instance and on the current request."""
+        self.last_usage = usage
+        if usage is None:
+            return
+        self.token_usage["prompt_tokens"] += usage["prompt_tokens"]
+        self.token_usage["generated_tokens"] += usage["completion_tokens"]
+        record_usage(usage["prompt_tokens"], usage["completion_tokens"])
 
     # def _apply_decorator(self, method, decorators, *args, **kwargs):
     #     for decorator in decorators:
@@ -15,7 +30,22 @@ class BaseLLM(ABC):
 
         pass
 
+    async def _raw_agen(self, messages, *args, **kwargs):
+        # Providers without a native async client run the blocking call
+        # in a worker thread so the event loop stays free.
+        return await asyncio.to_thread(self._raw_gen, messages, *args, **kwargs)
+
+    async def _stream_agen(self, messages, *args, **kwargs) -> AsyncIterator[str]:
+        yield await self._raw_agen(messages, *args, **kwargs)
+
     def gen(self, messages, stream=False, *args, **kwargs):
         # decorators = [gen_token_usage, gen_cache]
         # return self._apply_decorator(self._raw_gen, decorators=decorators, model=model, messages=messages, stream=stream, tools=tools, *args, **kwargs)
-        return self._raw_gen(messages, **kwargs)
\ No newline at end of file
+        return self._raw_gen(messages, **kwargs)
+
+    async def agen(self, messages, *args, **kwargs):
+        return await self._raw_agen(messages, **kwargs)
+
+    async def astream(self, messages, *args, **kwargs) -> AsyncIterator[str]:
+        async for chunk in self._stream_agen(messages, **kwargs):
+            yield chunk
@@ -0,0 +1,49 @@
+import contextvars
+from typing import Dict, Optional
+
+
+class RequestUsage:
+    """Chat completion tokens used while serving one request, summed over every LLM call."""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+
+    def add(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.calls += 1
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "llm_calls": self.calls,
+        }
+
+
+_current_usage: contextvars.ContextVar[Optional[RequestUsage]] = contextvars.ContextVar("current_usage", default=None)
+
+
+def start_request_usage() -> RequestUsage:
+    """
+    Start accounting LLM usage for the current request.
+
+    Tasks and threads started afterwards inherit the accumulator through the
+    context, so planner and answer calls made on their behalf are counted too.
+    """
+    usage = RequestUsage()
+    _current_usage.set(usage)
+    return usage
+
+
+def current_request_usage() -> Optional[RequestUsage]:
+    return _current_usage.get()
+
+
+def record_usage(prompt_tokens: int, completion_tokens: int) -> None:
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add(prompt_tokens, completion_tokens)
@@ -1,8 +1,21 @@
+import asyncio
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.routers.answer import answer_router
+from src.core.config import startup_settings, vector_store_settings
+from src.core.resources import resources
+from src.routers.answer import answer_router, chat_combine_prompt
+from src.routers.health import health_router
+from src.routers.metrics import metrics_router
+from src.services.conversation_store import conversation_store
+from src.services.token_quota import token_quota
+from src.utils.embeddings import embedding_batcher
+from src.utils.follow_up_classifier import label_log
+from src.utils.tracing import ServerTimingMiddleware
+from src.vectorstore.factory import get_local_index
+from src.vectorstore.local_index import run_sync_loop
 
 app = FastAPI()
 
@@ -11,6 +24,44 @@ async def root():
     return {"message": "Hello, World!"}
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop the resources and background work owned by the application."""
+    # Fail fast on a missing prompt instead of on the first request
+    chat_combine_prompt()
+
+    background_tasks = []
+    if startup_settings.WARM_UP_ON_STARTUP:
+        background_tasks.append(asyncio.create_task(resources.warm_up()))
+
+    if vector_store_settings.VECTOR_STORE_BACKEND == "local":
+        background_tasks.append(asyncio.create_task(run_sync_loop(get_local_index("youtube_data"))))
+    if conversation_store is not None:
+        background_tasks.append(asyncio.create_task(conversation_store.run_flush_loop()))
+    if token_quota is not None:
+        background_tasks.append(asyncio.create_task(token_quota.run_flush_loop()))
+    if label_log is not None:
+        background_tasks.append(asyncio.create_task(label_log.run_flush_loop()))
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+    # Let batched embedding calls in flight resolve their callers before the clients close
+    if embedding_batcher is not None:
+        await embedding_batcher.close()
+    # Persist conversation turns, token usage and labels still queued by the write-behind loops
+    if conversation_store is not None:
+        await conversation_store.flush()
+    if token_quota is not None:
+        await token_quota.flush()
+    if label_log is not None:
+        await label_log.flush()
+    await resources.shutdown()
+
+
 def create_app() -> FastAPI:
     """
     Create and configure the FastAPI application.
@@ -22,6 +73,7 @@ def create_app() -> FastAPI:
         title="LawGPT API",
         description="API for LawGPT - A Legal Question Answering System",
         version="1.0.0",
+        lifespan=lifespan,
     )
     # Configure CORS
     app.add_middleware(
@@ -30,9 +82,13 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["GET", "POST", "OPTIONS"],
         allow_headers=["*"],
+        expose_headers=["Server-Timing"],
     )
+    app.add_middleware(ServerTimingMiddleware)
 
     app.include_router(answer_router)
+    app.include_router(metrics_router)
+    app.include_router(health_router)
     
     return app
 
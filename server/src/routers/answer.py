@@ -1,26 +1,39 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 import traceback
 import time
+import json
 import os
+import ipaddress
+from functools import lru_cache
 
+from typing import Dict, List, Optional, Tuple
+
+from src.core.config import resilience_settings, token_settings
+from src.core.resilience import UpstreamUnavailable
+from src.llm.usage import start_request_usage
 from src.schemas.answer import AnswerRequest, AnswerResponse, Source
-from src.llm.azure_openai import OpenAILLM
+from src.utils.helpers import process_history
 from src.utils.logging import get_logger
+from src.services.conversation_store import conversation_store
 from src.services.naive_rag import NaiveRAG
+from src.services.single_flight import request_key, single_flight
+from src.services.token_quota import QuotaExceeded, token_quota
 
 
-llm = OpenAILLM()
-
-
-# Load prompt template
+# Prompt templates
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROMPTS_DIR = os.path.join(CURRENT_DIR, "../prompts")
 
-try:
-    with open(os.path.join(PROMPTS_DIR, "chat_combine_default.txt"), "r") as file:
-        CHAT_COMBINE = file.read()
-except FileNotFoundError as e:
-    raise FileNotFoundError("Prompt file is missing. Please ensure it is in the 'prompts' directory.")
+
+@lru_cache(maxsize=None)
+def chat_combine_prompt() -> str:
+    """Read the answer prompt template on first use (the lifespan warm-up loads it at startup)."""
+    try:
+        with open(os.path.join(PROMPTS_DIR, "chat_combine_default.txt"), "r") as file:
+            return file.read()
+    except FileNotFoundError as e:
+        raise FileNotFoundError("Prompt file is missing. Please ensure it is in the 'prompts' directory.")
 
 
 # Initialize logger
@@ -49,36 +62,204 @@ mock_sources = [
 logger.info("Answer router initialized successfully")
 logger.info(f"Mock sources count: {len(mock_sources)}")
 
+def _chunks(answer_request: AnswerRequest) -> int:
+    try:
+        return max(int(answer_request.chunks), 0)
+    except ValueError:
+        logger.warning(f"Invalid chunks value {answer_request.chunks!r}, using default")
+        return 3
+
+
+def _conversation_key(owner: str, conversation_id: str) -> str:
+    # Stored conversations are scoped to their owner, so a guessed or leaked id
+    # can't be used to read or extend someone else's conversation
+    return f"{owner}/{conversation_id}"
+
+
+async def _resolve_history(
+    answer_request: AnswerRequest, owner: Optional[str]
+) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+    """
+    Pick the conversation id and the history for a request.
+
+    A history sent by the client is parsed once here and wins; otherwise the
+    history ``owner`` stored for ``conversation_id`` is used, so clients only
+    need to send the new question. Requests without an id start a new conversation.
+
+    :param owner: The caller's id from ``_conversation_owner``
+    :return: ``(conversation_id, [(prompt, response), ...])``
+    """
+    conversation_id = answer_request.conversation_id
+    if conversation_id is None and conversation_store is not None:
+        conversation_id = conversation_store.new_conversation_id()
+
+    if answer_request.history is not None:
+        return conversation_id, process_history(answer_request.history)
+    if conversation_store is not None and answer_request.conversation_id:
+        return conversation_id, await conversation_store.get_history(_conversation_key(owner, conversation_id))
+    return conversation_id, []
+
+
+@lru_cache(maxsize=None)
+def _trusted_proxies() -> Tuple[ipaddress.IPv4Network | ipaddress.IPv6Network, ...]:
+    return tuple(ipaddress.ip_network(proxy.strip(), strict=False) for proxy in token_settings.TRUSTED_PROXIES if proxy.strip())
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_proxies())
+
+
+def _client_address(request: Request) -> str:
+    """
+    The caller's address, looking through the reverse proxies in ``TRUSTED_PROXIES``.
+
+    X-Forwarded-For is only read when the connection comes from a trusted
+    proxy, and walked from the right: the first hop that isn't a trusted
+    proxy is the client. Anything left of it could have been sent by the
+    client itself.
+    """
+    address = request.client.host if request.client else "unknown"
+    if not _is_trusted_proxy(address):
+        return address
+    hops = [hop.strip() for header in request.headers.getlist("x-forwarded-for") for hop in header.split(",")]
+    for hop in reversed([hop for hop in hops if hop]):
+        address = hop
+        if not _is_trusted_proxy(hop):
+            break
+    return address
+
+
+def _api_key(request: Request) -> Optional[str]:
+    scheme, _, credential = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credential.strip():
+        return credential.strip()
+    return request.headers.get("x-api-key") or None
+
+
+def _caller_id(request: Request) -> str:
+    """
+    The user a request comes from, derived from its credentials.
+
+    A request with an API key belongs to the user the key maps to in
+    ``TOKEN_QUOTA_API_KEYS`` and unknown keys are rejected with 401. Requests
+    without one are identified by their client address.
+    """
+    api_key = _api_key(request)
+    if api_key is None:
+        return f"ip:{_client_address(request)}"
+    user_id = token_settings.TOKEN_QUOTA_API_KEYS.get(api_key)
+    if user_id is None:
+        raise HTTPException(
+            status_code=401,
+            detail={"error": "Invalid API key"},
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_id
+
+
+def _quota_user(request: Request) -> Optional[str]:
+    """The user a request's quota is charged to, or None when quotas are off."""
+    if token_quota is None:
+        return None
+    return _caller_id(request)
+
+
+def _conversation_owner(request: Request) -> Optional[str]:
+    """The user whose stored conversations a request may read and extend, or None without a store."""
+    if conversation_store is None:
+        return None
+    return _caller_id(request)
+
+
+def _admit(user_id: Optional[str]) -> None:
+    """Count the request against the user's daily quota, answering 429 once it is used up."""
+    if token_quota is None:
+        return
+    try:
+        token_quota.admit(user_id)
+    except QuotaExceeded as e:
+        logger.info("Daily quota exceeded", user_id=user_id, counter=e.counter, used=e.used, limit=e.limit)
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "Daily quota exceeded",
+                "message": str(e),
+                "resets_at": e.resets_at.isoformat(),
+            },
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+def _charge(user_id: Optional[str], usage: Optional[Dict[str, int]]) -> None:
+    if token_quota is not None and usage:
+        token_quota.charge(user_id, usage["prompt_tokens"], usage["completion_tokens"])
+
+
+def _remember_turn(owner: Optional[str], conversation_id: Optional[str], question: str, answer: str) -> None:
+    if conversation_store is not None and conversation_id and answer:
+        conversation_store.append_turn(_conversation_key(owner, conversation_id), question, answer)
+
+
 @answer_router.post("/api/answer", response_model=AnswerResponse)
 async def answer_endpoint(
     request: Request,
     answer_request: AnswerRequest,
 ):
     question = answer_request.question
-            
+    user_id = _quota_user(request)
+    _admit(user_id)
+    owner = _conversation_owner(request)
+    conversation_id, history = await _resolve_history(answer_request, owner)
 
     retriever = NaiveRAG(
                 question=question,
-                chat_history=answer_request.history,
-                prompt=CHAT_COMBINE)
+                chat_history=history,
+                prompt=chat_combine_prompt(),
+                chunks=_chunks(answer_request),
+                token_limit=answer_request.token_limit)
     try:
    
    
    
    
         # answer = llm.answer_query(answer_request.question)
-        answer, docs = await retriever.gen()
+        async def run():
+            usage = start_request_usage()
+            answer, docs = await retriever.gen()
+            # Charged once, to the caller that started the run; coalesced callers share it for free
+            _charge(user_id, usage.as_dict())
+            return answer, docs, retriever.token_counts, usage.as_dict()
+
+        if single_flight is not None:
+            key = request_key(question, history, retriever.chunks, retriever.token_limit)
+            answer, docs, token_counts, usage = await single_flight.do(key, run)
+        else:
+            answer, docs, token_counts, usage = await run()
+        _remember_turn(owner, conversation_id, question, answer)
 
         # Create response
         response = AnswerResponse(
             answer=answer,
             sources=docs,
-            conversation_id=answer_request.conversation_id
+            conversation_id=conversation_id,
+            token_counts=token_counts,
+            usage=usage,
         )
         
 
         return response
-        
+
+    except UpstreamUnavailable as e:
+        logger.error(f"Answer upstream unavailable: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail={"error": "Service temporarily unavailable", "message": str(e)},
+            headers={"Retry-After": str(int(resilience_settings.BREAKER_RESET_SECONDS))},
+        )
     except Exception as e:
 
         raise HTTPException(
@@ -89,7 +270,89 @@ async def answer_endpoint(
             }
         )
 
-# Add a health check endpoint for debugging
+def _sse_event(event: str, data) -> str:
+    """Format a single Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@answer_router.post("/api/answer/stream")
+async def answer_stream_endpoint(
+    request: Request,
+    answer_request: AnswerRequest,
+):
+    """
+    Stream the answer as Server-Sent Events.
+
+    Emits a ``sources`` event once retrieval finishes, a ``token`` event per
+    completion chunk, and a final ``end`` event with usage and timings.
+    """
+    user_id = _quota_user(request)
+    _admit(user_id)
+    owner = _conversation_owner(request)
+    conversation_id, history = await _resolve_history(answer_request, owner)
+    retriever = NaiveRAG(
+                question=answer_request.question,
+                chat_history=history,
+                prompt=chat_combine_prompt(),
+                chunks=_chunks(answer_request),
+                token_limit=answer_request.token_limit)
+
+    # Started before the pipeline so its tasks inherit the accumulator
+    usage = start_request_usage()
+
+    async def run():
+        # Runs once per shared stream, so only the caller that started it is
+        # charged, for everything it used even if that caller leaves early
+        try:
+            async for event in retriever.astream():
+                yield event
+        finally:
+            _charge(user_id, usage.as_dict())
+
+    if single_flight is not None:
+        key = request_key(answer_request.question, history, retriever.chunks, retriever.token_limit)
+        events = single_flight.stream(key, run)
+    else:
+        events = run()
+
+    async def event_stream():
+        answer_chunks = []
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, stopping answer stream")
+                    break
+
+                if event["type"] == "sources":
+                    sources = [Source(**doc).model_dump() for doc in event["sources"]]
+                    yield _sse_event("sources", {"sources": sources})
+                elif event["type"] == "token":
+                    answer_chunks.append(event["content"])
+                    yield _sse_event("token", {"content": event["content"]})
+                elif event["type"] == "end":
+                    _remember_turn(owner, conversation_id, answer_request.question, "".join(answer_chunks))
+                    yield _sse_event("end", {
+                        "conversation_id": conversation_id,
+                        "usage": event["usage"],
+                        "request_usage": event["request_usage"],
+                        "token_counts": event["token_counts"],
+                        "cached": event["cached"],
+                        "timing": event["timing"],
+                    })
+        except Exception as e:
+            logger.error(f"Error while streaming answer: {e}")
+            yield _sse_event("error", {"error": "Internal server error", "message": str(e)})
+        finally:
+            # Unsubscribe right away so a shared upstream stops once nobody listens
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Liveness only; readiness of the upstreams is reported by /api/ready
 @answer_router.get("/api/health")
 async def health_check():
     logger.info("Health check endpoint called")
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from src.core.resources import resources
+from src.utils.logging import get_logger
+
+
+logger = get_logger("health-router")
+
+health_router = APIRouter()
+
+
+@health_router.get("/api/ready")
+async def ready_endpoint():
+    """Readiness probe: 200 once every upstream answered its check, 503 otherwise."""
+    report = await resources.readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
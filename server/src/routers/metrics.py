@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.core.clients import clients
+from src.core.resilience import resilience_stats
+from src.services.answer_cache import answer_cache
+from src.services.conversation_store import conversation_store
+from src.services.single_flight import single_flight
+from src.services.token_quota import token_quota
+from src.utils.embedding_cache import embedding_cache
+from src.utils.embeddings import embedding_batcher
+from src.utils.logging import get_logger
+from src.utils.tracing import render_histogram, stage_metrics
+
+
+logger = get_logger("metrics-router")
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/api/stats")
+async def stats_endpoint():
+    """Expose in-process cache counters for debugging and dashboards."""
+    return {
+        "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+        "embedding_batcher": embedding_batcher.stats() if embedding_batcher is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "conversation_store": conversation_store.stats() if conversation_store is not None else None,
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+        "token_quota": token_quota.stats() if token_quota is not None else None,
+        "http_clients": clients.stats(),
+        "resilience": resilience_stats(),
+    }
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_endpoint():
+    """Expose latency histograms and upstream connection reuse in the Prometheus text format."""
+    lines = stage_metrics() + clients.metrics()
+    if embedding_batcher is not None:
+        lines += render_histogram(
+            "embedding_batch_size", "Distinct texts per batched embeddings request.",
+            [({}, embedding_batcher.batch_sizes)],
+        )
+        lines += render_histogram(
+            "embedding_batch_wait_milliseconds", "Time a text waited in the embedding batcher queue.",
+            [({}, embedding_batcher.wait_ms)],
+        )
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
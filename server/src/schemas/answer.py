@@ -1,11 +1,14 @@
 # schemas/answer.py
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from pydantic import BaseModel, Field, validator
 import json
 
 class AnswerRequest(BaseModel):
     question: str = Field(..., description="The question to answer")
-    history: str = Field(..., description="Chat history as JSON string")
+    history: Optional[str] = Field(
+        default=None,
+        description="Chat history as JSON string; omit it to use the history stored for conversation_id",
+    )
     conversation_id: Optional[str] = None
     prompt_id: Optional[str] = None
     chunks: str = Field(..., description="Number of chunks as string")
@@ -20,6 +23,8 @@ class AnswerRequest(BaseModel):
 
     @validator('history')
     def validate_history(cls, v):
+        if v is None:
+            return v
         try:
             history_list = json.loads(v)
             # Validate each history item has at least a prompt field
@@ -54,6 +59,8 @@ class AnswerResponse(BaseModel):
     answer: str
     sources: List[Source]
     conversation_id: Optional[str]
+    token_counts: Optional[Dict[str, int]] = Field(default=None, description="Prompt token budget breakdown")
+    usage: Optional[Dict[str, int]] = Field(default=None, description="Tokens used by every LLM call of the request")
     
     class Config:
         schema_extra = {
@@ -0,0 +1,125 @@
+import copy
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.config import answer_cache_settings
+from src.utils.logging import get_logger
+
+logger = get_logger("answer_cache")
+
+
+class SemanticAnswerCache:
+    """
+    Cache of recent answers looked up by question embedding.
+
+    Cached question vectors are kept L2-normalized in one float32 matrix, so a
+    lookup is a single matrix-vector product followed by an argmax. Entries
+    expire after ``ttl_seconds``; when the cache is full the least recently
+    used slot is overwritten.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors: np.ndarray | None = None  # allocated on first store, once the dimension is known
+        self._created_at = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _expire(self, now: float) -> None:
+        expired = self._valid & (now - self._created_at > self.ttl_seconds)
+        count = int(expired.sum())
+        if count:
+            self._valid[expired] = False
+            for slot in np.flatnonzero(expired):
+                self._entries[slot] = None
+            self._counters["expirations"] += count
+
+    def lookup(self, vector: np.ndarray) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Find a cached answer for a question whose embedding is close enough to ``vector``.
+
+        :param vector: Embedding of the incoming question
+        :return: ``(answer, docs)`` on a hit, otherwise ``None``
+        """
+        query = self._normalize(vector)
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            if self._vectors is None or not self._valid.any() or self._vectors.shape[1] != query.shape[0]:
+                self._counters["misses"] += 1
+                return None
+
+            scores = self._vectors @ query
+            scores[~self._valid] = -np.inf
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                self._counters["misses"] += 1
+                return None
+
+            self._last_used[slot] = now
+            self._counters["hits"] += 1
+            entry = self._entries[slot]
+            logger.info(
+                "Semantic answer cache hit",
+                similarity=round(float(scores[slot]), 4),
+                cached_question=entry["question"],
+            )
+            return entry["answer"], copy.deepcopy(entry["docs"])
+
+    def store(self, vector: np.ndarray, question: str, answer: str, docs: List[Dict[str, Any]]) -> None:
+        vector = self._normalize(vector)
+        now = time.monotonic()
+
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+                self._entries = [None] * self.max_entries
+
+            self._expire(now)
+            free = np.flatnonzero(~self._valid)
+            if free.size:
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._counters["evictions"] += 1
+
+            self._vectors[slot] = vector
+            self._created_at[slot] = now
+            self._last_used[slot] = now
+            self._valid[slot] = True
+            self._entries[slot] = {"question": question, "answer": answer, "docs": copy.deepcopy(docs)}
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = int(self._valid.sum())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+answer_cache = (
+    SemanticAnswerCache(
+        max_entries=answer_cache_settings.ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds=answer_cache_settings.ANSWER_CACHE_TTL_SECONDS,
+        threshold=answer_cache_settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    )
+    if answer_cache_settings.ANSWER_CACHE_ENABLED
+    else None
+)
@@ -0,0 +1,183 @@
+import asyncio
+import datetime
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from src.core.config import conversation_store_settings, mongodb_settings
+from src.core.mongo_client import get_async_connection
+from src.utils.logging import get_logger
+
+logger = get_logger("conversation_store")
+
+Turn = Tuple[str, str]
+
+
+class ConversationStore:
+    """
+    Recent conversation turns keyed by ``conversation_id``.
+
+    Turns live in an in-memory LRU so a request only carries its new
+    question. New turns are queued and written to MongoDB in batches by a
+    background flush loop (write-behind); a conversation missing from memory
+    is loaded once from MongoDB, with any still-queued turns appended.
+    """
+
+    def __init__(
+        self,
+        max_conversations: int = 10000,
+        history_turns: int = 20,
+        max_stored_turns: int = 500,
+        flush_interval: float = 2.0,
+        flush_batch_size: int = 200,
+    ):
+        self.max_conversations = max_conversations
+        self.history_turns = history_turns
+        self.max_stored_turns = max_stored_turns
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._memory: "OrderedDict[str, List[Turn]]" = OrderedDict()
+        self._pending: Dict[str, List[Dict]] = {}
+        self._pending_count = 0
+        self._flush_requested: asyncio.Event | None = None
+        self._counters = {"memory_hits": 0, "loads": 0, "evictions": 0, "turns_written": 0, "flushes": 0, "flush_errors": 0}
+
+    @staticmethod
+    def new_conversation_id() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def _collection():
+        return get_async_connection().get_database(mongodb_settings.MONGODB_DB_NAME)[mongodb_settings.MONGODB_COLLECTION_NAME]
+
+    def _remember(self, conversation_id: str, turns: List[Turn]) -> None:
+        self._memory[conversation_id] = turns[-self.history_turns:]
+        self._memory.move_to_end(conversation_id)
+        while len(self._memory) > self.max_conversations:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    async def get_history(self, conversation_id: str) -> List[Turn]:
+        """
+        Return the most recent ``(prompt, response)`` turns of a conversation, oldest first.
+
+        :return: An empty list for unknown conversations
+        """
+        turns = self._memory.get(conversation_id)
+        if turns is not None:
+            self._memory.move_to_end(conversation_id)
+            self._counters["memory_hits"] += 1
+            return list(turns)
+
+        self._counters["loads"] += 1
+        turns = []
+        try:
+            doc = await self._collection().find_one(
+                {"_id": conversation_id}, {"turns": {"$slice": -self.history_turns}}
+            )
+            if doc:
+                turns = [(turn.get("prompt", ""), turn.get("response", "")) for turn in doc.get("turns", [])]
+        except PyMongoError as e:
+            logger.error(f"Couldn't load conversation {conversation_id}: {e}")
+
+        turns.extend((turn["prompt"], turn["response"]) for turn in self._pending.get(conversation_id, []))
+        # A concurrent load may have cached the conversation while we were loading
+        if conversation_id not in self._memory:
+            self._remember(conversation_id, turns)
+        return list(self._memory[conversation_id])
+
+    def append_turn(self, conversation_id: str, prompt: str, response: str) -> None:
+        """
+        Queue a finished turn for persistence, adding it to the cached history if there is one.
+
+        An uncached conversation is left out of memory: its earlier turns are
+        only in MongoDB, so the next ``get_history`` loads them together with
+        the queued turns.
+        """
+        turns = self._memory.get(conversation_id)
+        if turns is not None:
+            self._remember(conversation_id, [*turns, (prompt, response)])
+
+        self._pending.setdefault(conversation_id, []).append({
+            "prompt": prompt,
+            "response": response,
+            "created_at": datetime.datetime.now(datetime.timezone.utc),
+        })
+        self._pending_count += 1
+        if self._pending_count >= self.flush_batch_size and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    async def flush(self) -> int:
+        """
+        Write every queued turn to MongoDB in one unordered bulk write.
+
+        Turns are re-queued when the write fails.
+
+        :return: Number of turns written
+        """
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        count, self._pending_count = self._pending_count, 0
+        now = datetime.datetime.now(datetime.timezone.utc)
+        operations = [
+            UpdateOne(
+                {"_id": conversation_id},
+                {
+                    "$push": {"turns": {"$each": turns, "$slice": -self.max_stored_turns}},
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"created_at": turns[0]["created_at"]},
+                },
+                upsert=True,
+            )
+            for conversation_id, turns in pending.items()
+        ]
+
+        try:
+            await self._collection().bulk_write(operations, ordered=False)
+        except PyMongoError as e:
+            self._counters["flush_errors"] += 1
+            logger.error(f"Couldn't persist {count} conversation turns, will retry: {e}")
+            for conversation_id, turns in pending.items():
+                self._pending[conversation_id] = turns + self._pending.get(conversation_id, [])
+            self._pending_count += count
+            return 0
+
+        self._counters["flushes"] += 1
+        self._counters["turns_written"] += count
+        return count
+
+    async def run_flush_loop(self) -> None:
+        """Flush queued turns every ``flush_interval`` seconds, or sooner once a batch fills up."""
+        self._flush_requested = asyncio.Event()
+        logger.info("Conversation write-behind started", interval=self.flush_interval)
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self._counters)
+        stats["conversations"] = len(self._memory)
+        stats["pending_turns"] = self._pending_count
+        return stats
+
+
+conversation_store = (
+    ConversationStore(
+        max_conversations=conversation_store_settings.CONVERSATION_CACHE_SIZE,
+        history_turns=conversation_store_settings.CONVERSATION_HISTORY_TURNS,
+        max_stored_turns=conversation_store_settings.CONVERSATION_MAX_STORED_TURNS,
+        flush_interval=conversation_store_settings.CONVERSATION_FLUSH_INTERVAL_SECONDS,
+        flush_batch_size=conversation_store_settings.CONVERSATION_FLUSH_BATCH_SIZE,
+    )
+    if conversation_store_settings.CONVERSATION_STORE_ENABLED
+    else None
+)
@@ -3,15 +3,27 @@ sys.path.insert(0, "/home/mohamed-ayari/projects/youtube-chatbot/server")  # Adj
  
 
 
-from typing import List, Dict, Tuple, Any, Set
+from typing import AsyncIterator, List, Dict, Tuple, Any, Set
 
-from src.vectorstore.mongo_vectordb import MongoVectorRetriever
+from src.vectorstore.factory import get_vector_store
 
+from src.core.config import rag_settings
+from src.core.resilience import UpstreamUnavailable
 from src.llm.azure_openai import OpenAILLM
-from src.utils.helpers import process_history, get_last_n_questions_from_history, is_follow_up, query_expansion, deduplicate_docs
+from src.llm.usage import current_request_usage
+from src.services.answer_cache import answer_cache
+from src.utils.embeddings import aget_embeddings_3_large
+from src.utils.follow_up_classifier import log_label, predict_follow_up
+from src.utils.fusion import fuse_hits, remove_near_duplicates
+from src.utils.helpers import QueryPlan, process_history, get_last_n_questions_from_history, plan_query
 from src.utils.logging import get_logger
+from src.utils.prompt_budget import assemble_prompt
+from src.utils.tracing import current_trace, span
 
 import asyncio
+import time
+
+import numpy as np
 
 
 logger = get_logger("naive_rag")
@@ -29,7 +41,7 @@ class NaiveRAG:
         chat_history: List[Tuple[str, str]],
         prompt: str,
         chunks: int = 3,
-        token_limit: int = 150,
+        token_limit: int = 2000,
     ):
         """
         Initialize the ClassicRAG retriever.
@@ -39,123 +51,358 @@ class NaiveRAG:
         :param chat_history: Previous user-chatbot interactions
         :param prompt: The system prompt template
         :param chunks: Number of documents to retrieve
-        :param token_limit: Token limit for the model
+        :param token_limit: Prompt token budget shared by system prompt, chunks and history
         """
         self.question = question
         self.chat_history = chat_history
         self.prompt = prompt
         self.chunks = chunks
         self.token_limit = token_limit
-
-    async def _get_data(self, query: str) -> List[Dict[str, Any]]:
+        self.cache_hit = False
+        self.token_counts: Dict[str, int] | None = None
+        self._question_vector: np.ndarray | None = None
+        self._question_vector_task: asyncio.Future | None = None
+
+    @staticmethod
+    def _request_usage() -> Dict[str, int] | None:
+        usage = current_request_usage()
+        return usage.as_dict() if usage is not None else None
+
+    @staticmethod
+    def _to_doc(hit: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "_id": str(hit["_id"]),
+            "title": "Secrets of the Houses",
+            "text": hit.get("chunk_content", ""),
+            "source": "https://www.youtube.com/watch?v=743J50ACNHM&list=PLE-tFlushJYm8zMsDqHa8grfuFi63W0Sv",
+            "score": hit.get("score"),
+            "fused_score": hit.get("fused_score"),
+        }
+
+    async def _get_data(self, query: str, query_vector: np.ndarray | None = None) -> List[Dict[str, Any]]:
         """
-        Retrieve relevant documents from the vector store and MongoDB.
+        Retrieve relevant chunks from the vector store.
 
         :param query: The expanded query string
-        :return: A list of document dictionaries
+        :param query_vector: Precomputed embedding of ``query``, if available
+        :return: ``{_id, chunk_content, score}`` hits, best first
         """
         if self.chunks == 0:
             return []
 
-        retriever = MongoVectorRetriever(law_type="youtube_data")
+        retriever = get_vector_store(law_type="youtube_data")
         
-        youtube_docs = retriever.search(query, k=self.chunks)
-   
-        # Process retrieved documents based on selected language
-        docs = []
-        for doc in youtube_docs:
-            chunk = doc.get("chunk_content", "")
-            
+        hits = await retriever.asearch(query, k=self.chunks, query_vector=query_vector)
 
-            docs.append({
-                "title": "Secrets of the Houses",
-                "text": chunk,
-                "source": "https://www.youtube.com/watch?v=743J50ACNHM&list=PLE-tFlushJYm8zMsDqHa8grfuFi63W0Sv",
-            })
+        logger.info(f"Retrieved {len(hits)} documents for query")
+        return hits
 
-        logger.info(f"Retrieved {len(docs)} documents for query")
-        return docs
+    async def _get_data_many(self, queries: List[str], query_vectors: np.ndarray) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve chunks for several queries in one vector store round trip.
 
+        :param queries: The expanded query strings
+        :param query_vectors: One embedding per query
+        :return: One list of ``{_id, chunk_content, score}`` hits per query, best first
+        """
+        if self.chunks == 0 or not queries:
+            return []
 
-    async def gen(self) -> Tuple[str, List[Dict[str, Any]]]:
+        retriever = get_vector_store(law_type="youtube_data")
+        grouped = await retriever.asearch_many(query_vectors, k=self.chunks)
+
+        # Split the server-side grouping back into per-query rankings
+        per_query = [[] for _ in queries]
+        for doc in grouped:
+            for hit in doc["hits"]:
+                per_query[hit["query_index"]].append(
+                    {"_id": doc["_id"], "chunk_content": doc.get("chunk_content", ""), "score": hit["score"]}
+                )
+        for i, hits in enumerate(per_query):
+            hits.sort(key=lambda hit: hit["score"], reverse=True)
+            logger.info(f"Retrieved {len(hits)} documents for query {i}: {queries[i]}")
+        return per_query
+
+    async def _cached_answer(self) -> Tuple[str, List[Dict[str, Any]]] | None:
         """
-        Generate a response by:
-          1. Expanding the query
-          2. Retrieving and reranking documents (in parallel)
-          3. Combining them into a prompt for the LLM
-          4. Returning the completion and the documents
+        Look the question up in the semantic answer cache.
 
-        :return: A tuple of (completion text, list of doc dicts)
+        Only call this for standalone questions, since a follow-up's answer
+        depends on the conversation it belongs to.
+
+        :return: ``(answer, docs)`` on a cache hit, otherwise None
         """
-        # Expand query
-        if is_follow_up(self.question):
-            logger.info(f"*******Follow-up question detected; using original question for query expansion: \n: {self.question}")
-            last_questions = get_last_n_questions_from_history(self.chat_history, 5)
-            list_query_expansion = query_expansion(self.question, 2,  is_follow_up=True, questions_history=last_questions)
+        if answer_cache is None:
+            return None
+
+        try:
+            self._question_vector = await self._embed_question()
+        except UpstreamUnavailable as e:
+            # Skip the cache; retrieval sheds the same way
+            logger.warning(f"Embeddings unavailable, skipping the answer cache: {e}")
+            return None
+        cached = answer_cache.lookup(self._question_vector)
+        self.cache_hit = cached is not None
+        return cached
+
+    async def _embed_question(self) -> np.ndarray:
+        """Embed the raw question once, shared by the cache lookup and speculative retrieval."""
+        if self._question_vector_task is None:
+            self._question_vector_task = asyncio.ensure_future(aget_embeddings_3_large([self.question]))
+        # Shield so cancelling a speculative search never cancels the shared embedding
+        return (await asyncio.shield(self._question_vector_task))[0]
+
+    async def _speculative_search(self) -> List[List[Dict[str, Any]]]:
+        # Same per-query shape as _get_data_many, so the results fuse alike
+        return [await self._get_data(self.question, await self._embed_question())]
+
+    def _start_speculation(self) -> asyncio.Task | None:
+        if not rag_settings.SPECULATIVE_RETRIEVAL or self.chunks == 0:
+            return None
+        return asyncio.create_task(self._speculative_search())
+
+    @staticmethod
+    def _cancel_speculation(task: asyncio.Task | None) -> None:
+        if task is None:
+            return
+        if task.done():
+            # Retrieve the outcome so a failed search isn't reported as never retrieved
+            if not task.cancelled():
+                task.exception()
+            return
+        task.cancel()
+
+    async def _plan_with_speculation(
+        self,
+    ) -> Tuple[QueryPlan | None, Tuple[str, List[Dict[str, Any]]] | None, asyncio.Task | None]:
+        """
+        Plan the queries while the raw question is already being searched.
+
+        The speculative search is cancelled when its results turn out to be
+        unneeded: on a semantic cache hit, or when the question is a follow-up
+        whose raw wording doesn't stand on its own.
+
+        :return: ``(plan, cached, speculative_task)``
+        """
+        speculative = self._start_speculation()
+        try:
+            plan, cached = await self._plan()
+        except BaseException:
+            self._cancel_speculation(speculative)
+            raise
+
+        if cached is not None or plan.is_follow_up:
+            self._cancel_speculation(speculative)
+            speculative = None
+        return plan, cached, speculative
+
+    def _remember_answer(self, answer: str, docs: List[Dict[str, Any]]) -> None:
+        if answer_cache is not None and self._question_vector is not None and answer:
+            answer_cache.store(self._question_vector, self.question, answer, docs)
+
+    @span("plan")
+    async def _plan(self) -> Tuple[QueryPlan | None, Tuple[str, List[Dict[str, Any]]] | None]:
+        """
+        Classify the question and plan the retrieval queries.
+
+        The local classifier decides follow-up vs standalone when it is
+        confident; otherwise the planner's flag is used, or the local model's
+        best guess when the plan is degraded. Either way a single planner call
+        produces the standalone rewrite and the expansions.
+
+        :return: ``(plan, None)``, or ``(None, (answer, docs))`` on a semantic cache hit
+        """
+        last_questions = get_last_n_questions_from_history(self.chat_history, 5)
+        follow_up, probability = predict_follow_up(self.question, last_questions)
+
+        if follow_up is False:
+            cached = await self._cached_answer()
+            if cached is not None:
+                return None, cached
+
+        # A confidently standalone question doesn't need the history in the planner prompt
+        plan = await plan_query(self.question, 2, questions_history=[] if follow_up is False else last_questions)
+
+        if follow_up is None and plan.degraded:
+            # The planner gave no real answer: neither a label to learn from nor
+            # enough confidence to serve a cached answer, so go with the local guess
+            plan.is_follow_up = probability >= 0.5
+        elif follow_up is None:
+            log_label(self.question, last_questions, plan.is_follow_up, probability)
+            if not plan.is_follow_up:
+                cached = await self._cached_answer()
+                if cached is not None:
+                    return None, cached
         else:
-            list_query_expansion = query_expansion(self.question, 2)
+            plan.is_follow_up = follow_up
+
+        if plan.is_follow_up:
+            logger.info(f"*******Follow-up question detected; rewritten as: {plan.standalone_query}")
+        return plan, None
+
+    @span("retrieve")
+    async def _retrieve(self, plan: QueryPlan, speculative: asyncio.Task | None = None) -> List[Dict[str, Any]]:
+        """
+        Retrieve, fuse and deduplicate documents for the planned queries.
 
-        # Retrieve documents for all expanded queries in parallel
-        logger.info(f"Retrieving data for {len(list_query_expansion)} queries in parallel")
+        :param plan: Output of the query planner
+        :param speculative: In-flight search for the raw question, joined with the planned searches
+        :return: A list of doc dicts
+        """
+        list_query_expansion = plan.queries
+        if speculative is not None:
+            # The raw question is already being searched
+            raw = self.question.strip().casefold()
+            list_query_expansion = [q for q in list_query_expansion if q.strip().casefold() != raw]
+
+        logger.info(f"Retrieving data for {len(list_query_expansion)} queries in one batch")
         
-        # Create tasks for parallel execution
-        retrieval_tasks = [
-            self._get_data(expanded_query) 
-            for expanded_query in list_query_expansion
-        ]
+        # Embed every expanded query in a single request, then search them all in a single round trip
+        retrieval_tasks = []
+        try:
+            query_vectors = await aget_embeddings_3_large(list_query_expansion) if list_query_expansion else []
+            retrieval_tasks.append(self._get_data_many(list_query_expansion, query_vectors))
+        except UpstreamUnavailable as e:
+            # Answer from whatever the speculative search found, or without context
+            logger.warning(f"Embeddings unavailable, skipping the planned searches: {e}")
+        if speculative is not None:
+            retrieval_tasks.insert(0, speculative)
         
-        # Execute all retrieval tasks concurrently
         retrieval_results = await asyncio.gather(*retrieval_tasks, return_exceptions=True)
         
         # Process results and handle any exceptions
-        all_docs = []
-        for i, result in enumerate(retrieval_results):
+        per_query_hits = []
+        for result in retrieval_results:
             if isinstance(result, Exception):
-                logger.error(f"Error retrieving data for query {i}: {result}")
+                logger.error(f"Error retrieving data: {result}")
                 continue
-            
-            logger.info(f"Retrieved {len(result)} documents for query {i}: {list_query_expansion[i]}")
-            all_docs.extend(result)
-        
-        # Deduplicate the results from all queries
-        deduplicated_docs = deduplicate_docs(all_docs)
-        logger.info(f"Original docs count: {len(all_docs)}, after deduplication: {len(deduplicated_docs)}")
+            per_query_hits.extend(result)
+
+        # Fuse the rankings by _id, then drop near-duplicate chunks and cut to top-k
+        fused = fuse_hits(per_query_hits, method=rag_settings.FUSION_METHOD, rrf_k=rag_settings.RRF_K)
+        top_k = max(rag_settings.RETRIEVAL_TOP_K, self.chunks) if rag_settings.RETRIEVAL_TOP_K else None
+        deduplicated_docs = remove_near_duplicates(
+            [self._to_doc(hit) for hit in fused],
+            threshold=rag_settings.NEAR_DUPLICATE_THRESHOLD,
+            top_k=top_k,
+        )
+        logger.info(f"Fused docs count: {len(fused)}, after near-duplicate removal and top-k: {len(deduplicated_docs)}")
+
+        return deduplicated_docs
+
+    @span("prompt")
+    def _build_messages(self, docs: List[Dict[str, Any]]) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
+        """
+        Combine the retrieved docs, the chat history and the question into chat
+        messages that fit within ``token_limit`` prompt tokens.
 
-        # Extract text for reranking
-        docs_text = [doc["text"] for doc in deduplicated_docs]
-        
+        :param docs: Deduplicated doc dicts, best first
+        :return: The message list for the LLM and the docs that made it into the prompt
+        """
+        messages_combine, docs_used, budget = assemble_prompt(
+            self.prompt,
+            docs,
+            process_history(self.chat_history),
+            self.question,
+            self.token_limit,
+            context_share=rag_settings.PROMPT_CONTEXT_SHARE,
+            min_chunk_tokens=rag_settings.PROMPT_MIN_CHUNK_TOKENS,
+        )
+        self.token_counts = budget.as_dict()
+        return messages_combine, docs_used
 
-        # Combine docs for the prompt
-        docs_together = "\n\n\n".join(docs_text)
-        
-        final_prompt = self.prompt.replace("{summaries}", docs_together)  
-        
-        messages_combine = [{"role": "system", "content": final_prompt}]
-
-        # Process history
-        processed_history = process_history(self.chat_history)
-        if processed_history:
-            for user_msg, bot_msg in processed_history:
-                messages_combine.extend([
-                    {"role": "user", "content": user_msg},
-                    {"role": "system", "content": bot_msg},
-                ])
-
-        # Add the current question
-        messages_combine.append({"role": "user", "content": self.question})
-        
+    async def gen(self) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Generate a response by:
+          0. Answering from the semantic cache when a standalone question was seen recently
+          1. Planning the queries (follow-up detection, rewrite and expansion in one call)
+             while the raw question is searched speculatively
+          2. Retrieving and reranking documents (in parallel)
+          3. Combining them into a prompt for the LLM
+          4. Returning the completion and the documents
+
+        :return: A tuple of (completion text, list of doc dicts)
+        """
+        plan, cached, speculative = await self._plan_with_speculation()
+        if cached is not None:
+            return cached
+
+        deduplicated_docs = await self._retrieve(plan, speculative)
+        messages_combine, deduplicated_docs = self._build_messages(deduplicated_docs)
 
         # Generate final response
         llm = OpenAILLM()
 
         
-        completion = llm.gen(model="chat", messages=messages_combine)
+        with span("llm", upstream="azure_openai"):
+            completion = await llm.agen(model="chat", messages=messages_combine)
         logger.info(f"LLM response: {completion}")
 
+        self._remember_answer(completion, deduplicated_docs)
+        return completion, deduplicated_docs
 
+    async def astream(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the response as a sequence of events:
+          1. ``sources`` with the retrieved documents, as soon as retrieval finishes
+          2. ``token`` for every chunk of the completion as it arrives
+          3. ``end`` with the answer's and the whole request's token usage and stage
+             timings in milliseconds (the Server-Timing breakdown, which a streamed
+             response's headers can't carry)
+
+        :return: An async iterator of event dicts with a ``type`` key
+        """
+        started = time.perf_counter()
+
+        plan, cached, speculative = await self._plan_with_speculation()
+        if cached is not None:
+            answer, docs = cached
+            yield {"type": "sources", "sources": docs}
+            yield {"type": "token", "content": answer}
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            yield {
+                "type": "end",
+                "usage": None,
+                "request_usage": self._request_usage(),
+                "token_counts": None,
+                "cached": True,
+                "timing": {"retrieval_ms": elapsed_ms, "ttft_ms": elapsed_ms, "total_ms": elapsed_ms},
+            }
+            return
+
+        deduplicated_docs = await self._retrieve(plan, speculative)
+        messages_combine, deduplicated_docs = self._build_messages(deduplicated_docs)
+        retrieval_done = time.perf_counter()
+        yield {"type": "sources", "sources": deduplicated_docs}
 
+        llm = OpenAILLM()
 
-        return completion, deduplicated_docs
+        first_token_at = None
+        chunks = []
+        with span("llm", upstream="azure_openai"):
+            async for chunk in llm.astream(model="chat", messages=messages_combine):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                chunks.append(chunk)
+                yield {"type": "token", "content": chunk}
+
+        self._remember_answer("".join(chunks), deduplicated_docs)
+
+        finished = time.perf_counter()
+        trace = current_trace()
+        yield {
+            "type": "end",
+            "usage": llm.last_usage,
+            "request_usage": self._request_usage(),
+            "token_counts": self.token_counts,
+            "cached": False,
+            "timing": {
+                "retrieval_ms": round((retrieval_done - started) * 1000, 1),
+                "ttft_ms": round(((first_token_at or finished) - started) * 1000, 1),
+                "total_ms": round((finished - started) * 1000, 1),
+                "stages_ms": trace.summary() if trace is not None else None,
+            },
+        }
 
 
 if __name__ == "__main__":
@@ -167,7 +414,7 @@ if __name__ == "__main__":
     ]
     prompt = "You are a legal expert. Answer the question based on the provided summaries:\n\n{summaries}"
 
-    rag = NaiveRAG(question, chat_history, prompt, chunks=3, token_limit=150)
+    rag = NaiveRAG(question, chat_history, prompt, chunks=3, token_limit=2000)
     
     # Run the generator
     asyncio.run(rag.gen())
\ No newline at end of file
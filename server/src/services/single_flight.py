@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.core.config import rag_settings
+from src.utils.embedding_cache import normalize_text
+from src.utils.logging import get_logger
+
+logger = get_logger("single_flight")
+
+
+def request_key(question: str, history: Sequence[Tuple[str, str]], *params: Any) -> str:
+    """
+    Key identical requests: the normalized question, a fingerprint of the
+    history it will be answered against and any parameters that change the answer.
+    """
+    fingerprint = hashlib.sha256(json.dumps([list(turn) for turn in history], ensure_ascii=False).encode("utf-8"))
+    raw = "\x1f".join([normalize_text(question), fingerprint.hexdigest(), *map(str, params)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Broadcast:
+    """One upstream event stream replayed to every subscriber, late joiners included."""
+
+    def __init__(self, source: AsyncIterator[Dict[str, Any]]):
+        self.events: List[Dict[str, Any]] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._updated = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(source))
+
+    def _publish(self) -> None:
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def _pump(self, source: AsyncIterator[Dict[str, Any]]) -> None:
+        try:
+            async for event in source:
+                self.events.append(event)
+                self._publish()
+        except asyncio.CancelledError:
+            self.error = ConnectionAbortedError("Shared answer stream was cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._publish()
+
+    async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self.events):
+                    yield self.events[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._updated.wait()
+        finally:
+            self.subscribers -= 1
+            # Nobody is listening any more: stop paying for the upstream call
+            if self.subscribers == 0 and not self.done:
+                self.task.cancel()
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight requests.
+
+    The first request for a key runs the pipeline; requests arriving while it
+    is in flight await the same result, or subscribe to the same event stream.
+    Keys are released as soon as the run finishes, so nothing is cached here.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._counters = {"requests": 0, "coalesced": 0, "stream_requests": 0, "stream_coalesced": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn`` once for all concurrent callers with the same ``key``."""
+        self._counters["requests"] += 1
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._release(self._calls, key, done))
+        else:
+            self._counters["coalesced"] += 1
+            logger.info("Coalesced request onto in-flight answer", key=key[:12])
+        # One caller going away must not cancel the run the others are waiting on
+        return await asyncio.shield(future)
+
+    def stream(self, key: str, source: Callable[[], AsyncIterator[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+        """Fan one upstream event stream per ``key`` out to every concurrent subscriber."""
+        self._counters["stream_requests"] += 1
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast(source())
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._release(self._streams, key, broadcast))
+        else:
+            self._counters["stream_coalesced"] += 1
+            logger.info("Coalesced request onto in-flight answer stream", key=key[:12])
+        return broadcast.subscribe()
+
+    @staticmethod
+    def _release(registry: Dict[str, Any], key: str, value: Any) -> None:
+        if registry.get(key) is value:
+            del registry[key]
+
+    def stats(self) -> Dict[str, float]:
+        stats = dict(self._counters)
+        stats["in_flight"] = len(self._calls) + len(self._streams)
+        requests = stats["requests"] + stats["stream_requests"]
+        coalesced = stats["coalesced"] + stats["stream_coalesced"]
+        stats["coalescing_rate"] = round(coalesced / requests, 4) if requests else 0.0
+        return stats
+
+
+single_flight = SingleFlight() if rag_settings.SINGLE_FLIGHT else None
@@ -0,0 +1,240 @@
+import asyncio
+import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from src.core.config import token_settings
+from src.core.mongo_client import get_users_connection
+from src.utils.logging import get_logger
+
+logger = get_logger("token_quota")
+
+COUNTERS = ("input_tokens", "output_tokens", "messages")
+
+Key = Tuple[str, str]  # (user_id, UTC day)
+
+
+def _today() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+
+def _next_reset() -> datetime.datetime:
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    return datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time(), datetime.timezone.utc)
+
+
+def _zero() -> Dict[str, int]:
+    return dict.fromkeys(COUNTERS, 0)
+
+
+class QuotaExceeded(Exception):
+    """Raised when a user has used up one of their daily limits."""
+
+    def __init__(self, user_id: str, counter: str, used: int, limit: int):
+        self.user_id = user_id
+        self.counter = counter
+        self.used = used
+        self.limit = limit
+        self.resets_at = _next_reset()
+        super().__init__(f"Daily {counter} limit of {limit} reached")
+
+    @property
+    def retry_after(self) -> int:
+        return max(int((self.resets_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()), 1)
+
+
+class TokenQuota:
+    """
+    Daily input token, output token and message limits per user.
+
+    Checks and charges only touch in-memory counters. A user's counts from
+    earlier processes are loaded in the background the first time they are
+    seen each day, and new usage is written to the users collection in
+    batched ``$inc`` upserts by a flush loop (write-behind), so the request
+    path never waits on MongoDB. Until that first load completes, usage from
+    other processes is not counted.
+    """
+
+    def __init__(
+        self,
+        input_limit: int,
+        output_limit: int,
+        message_limit: int,
+        flush_interval: float = 5.0,
+        flush_batch_size: int = 500,
+    ):
+        self.limits = {"input_tokens": input_limit, "output_tokens": output_limit, "messages": message_limit}
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._local: Dict[Key, Dict[str, int]] = {}  # counted by this process
+        self._baseline: Dict[Key, Dict[str, int]] = {}  # counted elsewhere, from the first load
+        self._flushed: Dict[Key, Dict[str, int]] = {}  # part of _local already written
+        self._pending: Dict[Key, Dict[str, int]] = {}  # part of _local not yet written
+        self._loading: Set[Key] = set()
+        self._tasks: Set[asyncio.Task] = set()  # strong references, the loop only keeps weak ones
+        self._flush_requested: asyncio.Event | None = None
+        self._day = _today()
+        self._counters = {"admitted": 0, "rejected": 0, "loads": 0, "load_errors": 0, "flushes": 0, "flush_errors": 0}
+
+    @staticmethod
+    def _collection():
+        return get_users_connection().get_database(token_settings.USER_DB_NAME)[token_settings.USER_COLLECTION_NAME]
+
+    def _key(self, user_id: str) -> Key:
+        day = _today()
+        if day != self._day:
+            self._roll_over(day)
+        return user_id, day
+
+    def _roll_over(self, day: str) -> None:
+        # Yesterday's counters are no longer checked; keep only what still has to be written
+        self._day = day
+        for counters in (self._local, self._baseline, self._flushed):
+            for key in [key for key in counters if key[1] != day and key not in self._pending]:
+                del counters[key]
+
+    def _ensure_loaded(self, key: Key) -> None:
+        if key in self._local:
+            return
+        self._local[key] = _zero()
+        self._flushed[key] = _zero()
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._loading.add(key)
+        task = asyncio.create_task(self._load(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, key: Key) -> None:
+        user_id, day = key
+        self._counters["loads"] += 1
+        try:
+            doc = await self._collection().find_one({"user_id": user_id}, {f"usage.{day}": 1})
+            stored = ((doc or {}).get("usage") or {}).get(day) or {}
+            # Our own flushes are already in the stored counts; they are skipped while loading
+            self._baseline[key] = {
+                counter: max(int(stored.get(counter, 0)) - self._flushed[key][counter], 0)
+                for counter in COUNTERS
+            }
+        except PyMongoError as e:
+            self._counters["load_errors"] += 1
+            logger.error(f"Couldn't load token usage for {user_id}, counting from zero: {e}")
+        finally:
+            self._loading.discard(key)
+
+    def usage(self, user_id: str) -> Dict[str, int]:
+        """Today's counts for ``user_id`` as known to this process."""
+        key = self._key(user_id)
+        local = self._local.get(key) or _zero()
+        baseline = self._baseline.get(key) or _zero()
+        return {counter: local[counter] + baseline[counter] for counter in COUNTERS}
+
+    def admit(self, user_id: str) -> None:
+        """
+        Count one message for ``user_id`` if every daily limit still has room.
+
+        :raises QuotaExceeded: When a limit is used up; nothing is counted then
+        """
+        self._ensure_loaded(self._key(user_id))
+        used = self.usage(user_id)
+        for counter in COUNTERS:
+            if self.limits[counter] and used[counter] >= self.limits[counter]:
+                self._counters["rejected"] += 1
+                raise QuotaExceeded(user_id, counter, used[counter], self.limits[counter])
+        self._counters["admitted"] += 1
+        self._add(user_id, messages=1)
+
+    def charge(self, user_id: str, input_tokens: int, output_tokens: int) -> None:
+        """Count the tokens an admitted request used."""
+        if input_tokens or output_tokens:
+            self._add(user_id, input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def _add(self, user_id: str, **amounts: int) -> None:
+        key = self._key(user_id)
+        self._ensure_loaded(key)
+        pending = self._pending.setdefault(key, _zero())
+        for counter, amount in amounts.items():
+            self._local[key][counter] += amount
+            pending[counter] += amount
+        if len(self._pending) >= self.flush_batch_size and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    async def flush(self) -> int:
+        """
+        Write the pending usage of every user in one unordered bulk write.
+
+        Users whose stored counts are still loading are left for the next flush,
+        and the usage is re-queued when the write fails.
+
+        :return: Number of users written
+        """
+        keys = [key for key in self._pending if key not in self._loading]
+        if not keys:
+            return 0
+
+        pending = {key: self._pending.pop(key) for key in keys}
+        now = datetime.datetime.now(datetime.timezone.utc)
+        operations = [
+            UpdateOne(
+                {"user_id": user_id},
+                {
+                    "$inc": {f"usage.{day}.{counter}": amount for counter, amount in amounts.items() if amount},
+                    "$set": {"last_active_at": now},
+                },
+                upsert=True,
+            )
+            for (user_id, day), amounts in pending.items()
+        ]
+
+        try:
+            await self._collection().bulk_write(operations, ordered=False)
+        except PyMongoError as e:
+            self._counters["flush_errors"] += 1
+            logger.error(f"Couldn't persist token usage for {len(pending)} users, will retry: {e}")
+            for key, amounts in pending.items():
+                merged = self._pending.setdefault(key, _zero())
+                for counter, amount in amounts.items():
+                    merged[counter] += amount
+            return 0
+
+        for key, amounts in pending.items():
+            flushed = self._flushed.setdefault(key, _zero())
+            for counter, amount in amounts.items():
+                flushed[counter] += amount
+        self._counters["flushes"] += 1
+        return len(pending)
+
+    async def run_flush_loop(self) -> None:
+        """Flush pending usage every ``flush_interval`` seconds, or sooner once a batch fills up."""
+        self._flush_requested = asyncio.Event()
+        logger.info("Token usage write-behind started", interval=self.flush_interval)
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self._counters)
+        stats["users_today"] = sum(1 for _, day in self._local if day == self._day)
+        stats["pending_users"] = len(self._pending)
+        return stats
+
+
+token_quota = (
+    TokenQuota(
+        input_limit=token_settings.DAILY_INPUT_LIMIT,
+        output_limit=token_settings.DAILY_OUTPUT_LIMIT,
+        message_limit=token_settings.DAILY_MESSAGE_LIMIT,
+        flush_interval=token_settings.TOKEN_QUOTA_FLUSH_INTERVAL_SECONDS,
+        flush_batch_size=token_settings.TOKEN_QUOTA_FLUSH_BATCH_SIZE,
+    )
+    if token_settings.TOKEN_QUOTA_ENABLED
+    else None
+)
@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.core.config import embedding_cache_settings
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different spellings of a query share a cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def make_key(text: str, model: str, dimensions: Optional[int] = None) -> str:
+    raw = f"{model}\x1f{dimensions or 'full'}\x1f{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embedding vectors.
+
+    The first tier is a bounded in-process LRU, the second a SQLite table of
+    float32 blobs that survives restarts. Disk hits are promoted into memory.
+    Keys combine the normalized text with the embedding model and dimension.
+
+    The SQLite file is opened on first use. From the event loop use
+    ``aget_many``/``aput_many``: disk reads run in a worker thread and disk
+    writes are written behind, so only the in-memory tier runs on the loop.
+    """
+
+    def __init__(self, max_memory_items: int = 4096, path: Optional[str] = None):
+        self.max_memory_items = max_memory_items
+        self.path = path
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()  # memory tier and counters, never held during disk I/O
+        self._db_lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._db_opened = False
+        self._writes: Set[asyncio.Task] = set()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "writes": 0,
+        }
+
+    def _disk(self) -> sqlite3.Connection | None:
+        """The disk tier's connection, opened on first use; call with ``_db_lock`` held."""
+        if not self._db_opened and self.path:
+            self._db_opened = True
+            self._db = self._open_disk_tier(self.path)
+        return self._db
+
+    @staticmethod
+    def _open_disk_tier(path: str) -> sqlite3.Connection | None:
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, dimensions INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+            logger.info("Embedding disk cache opened", path=path)
+            return db
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Couldn't open embedding disk cache at {path}: {e}")
+            return None
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _lookup_memory(self, keys: List[str]) -> Tuple[Dict[str, np.ndarray], List[str]]:
+        found: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self._counters["memory_hits"] += 1
+                elif key not in missing:
+                    missing.append(key)
+        return found, missing
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if not keys or not self.path:
+            return {}
+        with self._db_lock:
+            db = self._disk()
+            if db is None:
+                return {}
+            placeholders = ",".join("?" * len(keys))
+            try:
+                rows = db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", keys).fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"Couldn't read embeddings from disk cache: {e}")
+                return {}
+        return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows}
+
+    def _finish_lookup(
+        self, keys: List[str], found: Dict[str, np.ndarray], from_disk: Dict[str, np.ndarray]
+    ) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            for key, vector in from_disk.items():
+                found[key] = vector
+                self._remember(key, vector)
+                self._counters["disk_hits"] += 1
+            self._counters["misses"] += sum(1 for key in keys if key not in found)
+        return [found.get(key) for key in keys]
+
+    def get_many(
+        self, texts: List[str], model: str, dimensions: Optional[int] = None
+    ) -> List[Optional[np.ndarray]]:
+        """
+        Look up vectors for ``texts``, reading the disk tier in the calling thread.
+
+        :return: One entry per text, ``None`` where neither tier has the vector
+        """
+        keys = [make_key(text, model, dimensions) for text in texts]
+        found, missing = self._lookup_memory(keys)
+        return self._finish_lookup(keys, found, self._read_disk(missing))
+
+    async def aget_many(
+        self, texts: List[str], model: str, dimensions: Optional[int] = None
+    ) -> List[Optional[np.ndarray]]:
+        """Async counterpart of ``get_many``; memory misses are read from disk in a worker thread."""
+        keys = [make_key(text, model, dimensions) for text in texts]
+        found, missing = self._lookup_memory(keys)
+        from_disk = await asyncio.to_thread(self._read_disk, missing) if missing and self.path else {}
+        return self._finish_lookup(keys, found, from_disk)
+
+    def _store_memory(self, texts: List[str], model: str, dimensions: Optional[int], vectors: np.ndarray) -> List[tuple]:
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = make_key(text, model, dimensions)
+                vector = np.array(vector, dtype=np.float32)
+                vector.setflags(write=False)
+                self._remember(key, vector)
+                rows.append((key, model, int(vector.shape[0]), vector.tobytes()))
+        return rows
+
+    def _write_disk(self, rows: List[tuple]) -> None:
+        if not rows or not self.path:
+            return
+        with self._db_lock:
+            db = self._disk()
+            if db is None:
+                return
+            try:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+            except sqlite3.Error as e:
+                logger.error(f"Couldn't persist embeddings to disk cache: {e}")
+                return
+        with self._lock:
+            self._counters["writes"] += len(rows)
+
+    def put_many(
+        self, texts: List[str], model: str, dimensions: Optional[int], vectors: np.ndarray
+    ) -> None:
+        """Store vectors in both tiers, writing the disk tier in the calling thread."""
+        self._write_disk(self._store_memory(texts, model, dimensions, vectors))
+
+    def aput_many(
+        self, texts: List[str], model: str, dimensions: Optional[int], vectors: np.ndarray
+    ) -> None:
+        """Store vectors in memory now and write them to disk behind, in a worker thread."""
+        rows = self._store_memory(texts, model, dimensions, vectors)
+        if rows and self.path:
+            task = asyncio.ensure_future(asyncio.to_thread(self._write_disk, rows))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_size"] = len(self._memory)
+        stats["pending_writes"] = len(self._writes)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            # Reopened on next use, e.g. when the app's lifespan starts again
+            self._db_opened = False
+
+    async def aclose(self) -> None:
+        """Finish the writes still in flight, then close the database."""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+        await asyncio.to_thread(self.close)
+
+
+embedding_cache = (
+    EmbeddingCache(
+        max_memory_items=embedding_cache_settings.EMBEDDING_CACHE_MEMORY_SIZE,
+        path=embedding_cache_settings.EMBEDDING_CACHE_PATH,
+    )
+    if embedding_cache_settings.EMBEDDING_CACHE_ENABLED
+    else None
+)
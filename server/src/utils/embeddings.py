@@ -1,11 +1,255 @@
+import asyncio
+import base64
+import time
 from typing import List
 import numpy as np
 
 
 
-from src.core.config import azure_embeddings_settings
-from openai import AzureOpenAI
-from typing import List, Union
+from src.core.clients import clients
+from src.core.config import azure_embeddings_settings, embedding_batcher_settings
+from src.core.resilience import embeddings_policy
+from src.utils.embedding_cache import embedding_cache, normalize_text
+from src.utils.logging import get_logger
+from src.utils.metrics import Gauge, Histogram
+from src.utils.tracing import span
+from openai import AsyncAzureOpenAI, AzureOpenAI
+
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+
+logger = get_logger(__name__)
+
+
+def _get_client(deployment: str | None = None) -> AzureOpenAI:
+    """Return the process-wide embeddings client from the shared client registry."""
+    return clients.embeddings(deployment)
+
+
+def _get_async_client(deployment: str | None = None) -> AsyncAzureOpenAI:
+    """Return the process-wide async embeddings client from the shared client registry."""
+    return clients.async_embeddings(deployment)
+
+
+def _to_matrix(response) -> np.ndarray:
+    """
+    Decode a base64 embeddings response into a contiguous float32 matrix.
+
+    Rows follow the order of the inputs sent with the request.
+    """
+    data = sorted(response.data, key=lambda item: item.index)
+    if not data:
+        return np.empty((0, 0), dtype=np.float32)
+
+    rows = [np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32) for item in data]
+    return np.ascontiguousarray(np.vstack(rows), dtype=np.float32)
+
+
+@span("embedding_api", upstream="azure_embeddings")
+def _embed_batch(texts: List[str]) -> np.ndarray:
+    response = embeddings_policy.call_sync(
+        lambda deployment: _get_client(deployment).embeddings.create(
+            input=list(texts),
+            model=EMBEDDING_MODEL,
+            dimensions=azure_embeddings_settings.EMBEDDING_DIMENSIONS,
+            encoding_format="base64",
+            timeout=embeddings_policy.timeout,
+        ),
+        primary=azure_embeddings_settings.AZURE_EMBDEDDINGS_DEPLOYMENT,
+    )
+    return _to_matrix(response)
+
+
+@span("embedding_api", upstream="azure_embeddings")
+async def _aembed_batch(texts: List[str]) -> np.ndarray:
+    """Embed ``texts`` in one request; timed out, retried and hedged by ``embeddings_policy``."""
+    response = await embeddings_policy.call(
+        lambda deployment: _get_async_client(deployment).embeddings.create(
+            input=list(texts),
+            model=EMBEDDING_MODEL,
+            dimensions=azure_embeddings_settings.EMBEDDING_DIMENSIONS,
+            encoding_format="base64"
+        ),
+        primary=azure_embeddings_settings.AZURE_EMBDEDDINGS_DEPLOYMENT,
+    )
+    return _to_matrix(response)
+
+
+class EmbeddingBatcher:
+    """
+    Merge embedding calls from concurrent requests into batched requests.
+
+    Texts are queued with a future each. The queue is sent as one
+    ``embeddings.create`` call once it holds ``max_batch_size`` texts or
+    ``max_wait_ms`` after its first text arrived, whichever comes first, and
+    every caller's future is resolved with its row of the result.
+    """
+
+    def __init__(self, max_batch_size: int = 256, max_wait_ms: float = 5.0):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: List[tuple] = []  # (text, future, enqueued_at)
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()  # batches in flight; the loop only holds tasks weakly
+        self.queue_depth = Gauge()
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512])
+        self.wait_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50])
+        self._counters = {"calls": 0, "texts": 0, "batches": 0, "errors": 0}
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed ``texts`` as part of the next batch; rows follow the order of ``texts``."""
+        loop = asyncio.get_running_loop()
+        now = time.perf_counter()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.append((text, future, now))
+            futures.append(future)
+        self._counters["calls"] += 1
+        self._counters["texts"] += len(texts)
+        self.queue_depth.set(len(self._queue))
+
+        if len(self._queue) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        rows = await asyncio.gather(*futures)
+        return np.ascontiguousarray(np.vstack(rows), dtype=np.float32)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            batch, self._queue = self._queue[:self.max_batch_size], self._queue[self.max_batch_size:]
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self.queue_depth.set(0)
+
+    async def _send(self, batch: List[tuple]) -> None:
+        # Every outcome ends up in the callers' futures, so nothing is left for the task to report
+        try:
+            sent_at = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.wait_ms.observe((sent_at - enqueued_at) * 1000)
+
+            # The same text queued by several requests is only sent once
+            unique = list(dict.fromkeys(text for text, _, _ in batch))
+            self.batch_sizes.observe(len(unique))
+            self._counters["batches"] += 1
+            matrix = await _aembed_batch(unique)
+
+            row_by_text = dict(zip(unique, matrix))
+            for text, future, _ in batch:
+                if not future.done():
+                    future.set_result(row_by_text[text])
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            self._counters["errors"] += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def close(self) -> None:
+        """Send whatever is still queued and wait for every batch in flight."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        stats = dict(self._counters)
+        stats["queue_depth"] = self.queue_depth.snapshot()
+        stats["batch_size"] = self.batch_sizes.snapshot()
+        stats["wait_ms"] = self.wait_ms.snapshot()
+        return stats
+
+
+embedding_batcher = (
+    EmbeddingBatcher(
+        max_batch_size=embedding_batcher_settings.EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms=embedding_batcher_settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+    )
+    if embedding_batcher_settings.EMBEDDING_BATCHER_ENABLED
+    else None
+)
+
+
+def _missing(texts: List[str], cached: list) -> List[str]:
+    """The unique texts without a cached vector; texts that normalize to the same key are only embedded once."""
+    missing = {}
+    for text, vector in zip(texts, cached):
+        if vector is None:
+            missing.setdefault(normalize_text(text), text)
+    return list(missing.values())
+
+
+def _merge_cached(texts: List[str], cached: list, missing: List[str], fresh: np.ndarray) -> np.ndarray:
+    fresh_by_text = {normalize_text(text): vector for text, vector in zip(missing, fresh)} if missing else {}
+    rows = [
+        vector if vector is not None else fresh_by_text[normalize_text(text)]
+        for text, vector in zip(texts, cached)
+    ]
+    return np.ascontiguousarray(np.vstack(rows), dtype=np.float32)
+
+
+@span("embed")
+def get_embeddings_3_large(texts: List[str]) -> np.ndarray:
+    """
+    Embed a batch of texts with a single text-embedding-3-large request.
+
+    Vectors already present in the embedding cache are not requested again.
+    
+    Args:
+        texts (List[str]): Input texts to generate embeddings for
+        
+    Returns:
+        np.ndarray: A contiguous float32 matrix of shape (len(texts), dim)
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    cached = [None] * len(texts)
+    if embedding_cache is not None:
+        cached = embedding_cache.get_many(texts, EMBEDDING_MODEL, azure_embeddings_settings.EMBEDDING_DIMENSIONS)
+    missing = _missing(texts, cached)
+    fresh = _embed_batch(missing) if missing else None
+    if missing and embedding_cache is not None:
+        embedding_cache.put_many(missing, EMBEDDING_MODEL, azure_embeddings_settings.EMBEDDING_DIMENSIONS, fresh)
+    return _merge_cached(texts, cached, missing, fresh)
+
+
+@span("embed")
+async def aget_embeddings_3_large(texts: List[str]) -> np.ndarray:
+    """
+    Async counterpart of get_embeddings_3_large.
+
+    Uncached texts go through the embedding micro-batcher, so concurrent
+    requests share ``embeddings.create`` calls.
+    
+    Args:
+        texts (List[str]): Input texts to generate embeddings for
+        
+    Returns:
+        np.ndarray: A contiguous float32 matrix of shape (len(texts), dim)
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    cached = [None] * len(texts)
+    if embedding_cache is not None:
+        cached = await embedding_cache.aget_many(texts, EMBEDDING_MODEL, azure_embeddings_settings.EMBEDDING_DIMENSIONS)
+    missing = _missing(texts, cached)
+    fresh = None
+    if missing:
+        fresh = await (embedding_batcher.embed(missing) if embedding_batcher is not None else _aembed_batch(missing))
+        if embedding_cache is not None:
+            embedding_cache.aput_many(missing, EMBEDDING_MODEL, azure_embeddings_settings.EMBEDDING_DIMENSIONS, fresh)
+    return _merge_cached(texts, cached, missing, fresh)
 
 
 def get_embedding_3_large_simple(text: str) -> np.ndarray:
@@ -16,21 +260,19 @@ def get_embedding_3_large_simple(text: str) -> np.ndarray:
         text (str): Input text to generate embedding for
         
     Returns:
-        np.ndarray: The embedding vector for the input text as a numpy array
+        np.ndarray: The float32 embedding vector for the input text
     """
-    client = AzureOpenAI(
-        api_key=azure_embeddings_settings.AZURE_EMBDEDDINGS_API_KEY,
-        api_version=azure_embeddings_settings.AZURE_EMBDEDDINGS_API_VERSION,
-        azure_endpoint=azure_embeddings_settings.AZURE_EMBDEDDINGS_ENDPOINT,
-        azure_deployment=azure_embeddings_settings.AZURE_EMBDEDDINGS_DEPLOYMENT
-    )
-    
-    response = client.embeddings.create(
-        input=[text],
-        model="text-embedding-3-large"
-    )
-    embedding = np.array(response.data[0].embedding)
-    return embedding.tolist() 
-    
+    return get_embeddings_3_large([text])[0]
+
 
-      
\ No newline at end of file
+async def aget_embedding_3_large_simple(text: str) -> np.ndarray:
+    """
+    Async counterpart of get_embedding_3_large_simple that does not block the event loop.
+    
+    Args:
+        text (str): Input text to generate embedding for
+        
+    Returns:
+        np.ndarray: The float32 embedding vector for the input text
+    """
+    return (await aget_embeddings_3_large([text]))[0]
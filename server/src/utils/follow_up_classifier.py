@@ -0,0 +1,256 @@
+import asyncio
+import json
+import math
+import re
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.core.config import follow_up_classifier_settings
+from src.utils.logging import get_logger
+
+logger = get_logger("follow_up_classifier")
+
+
+_TOKEN_RE = re.compile(r"[A-Za-zÀ-ÿ0-9']+")
+
+ANAPHORA = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their",
+    "he", "him", "his", "she", "her", "there", "one", "ones",
+}
+CONTINUATIONS = {"and", "but", "so", "also", "or", "then", "plus", "what's", "how's"}
+CONTINUATION_PHRASES = ("what about", "how about", "what else", "why not", "and what", "and how")
+REFERENCES = {
+    "more", "else", "again", "another", "previous", "earlier", "above", "same", "further",
+    "elaborate", "explain", "example", "examples", "instead", "too", "other", "mentioned",
+}
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "can", "could",
+    "would", "should", "will", "what", "which", "who", "whom", "how", "why", "when", "where",
+    "of", "in", "on", "at", "to", "for", "with", "about", "from", "by", "as", "and", "or",
+    "but", "so", "you", "me", "my", "i", "we", "your", "please", "tell", "than", "then",
+} | ANAPHORA | CONTINUATIONS
+
+FEATURES = [
+    "bias",
+    "anaphora",
+    "continuation",
+    "short",
+    "very_short",
+    "reference",
+    "history_overlap",
+    "stopword_ratio",
+    "named_entity",
+    "length",
+]
+
+# Hand-tuned starting point, replaced by weights trained from logged labels when available
+DEFAULT_WEIGHTS = np.array([-1.5, 2.0, 2.5, 1.0, 1.0, 1.5, 1.0, 1.0, -1.0, -1.5], dtype=np.float64)
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text)
+
+
+class FollowUpClassifier:
+    """
+    Logistic model over lexical and anaphora features of a question.
+
+    It flags questions that lean on earlier turns: pronouns, continuations
+    such as "what about ...", very short or stopword-only messages and
+    overlap with the previous question.
+    """
+
+    def __init__(self, weights: Optional[Sequence[float]] = None):
+        self.weights = np.asarray(weights if weights is not None else DEFAULT_WEIGHTS, dtype=np.float64)
+        if self.weights.shape != (len(FEATURES),):
+            raise ValueError(f"Expected {len(FEATURES)} weights, got {self.weights.shape}")
+
+    @staticmethod
+    def features(question: str, history_questions: Sequence[str]) -> np.ndarray:
+        raw_tokens = _tokens(question)
+        tokens = [token.lower() for token in raw_tokens]
+        n_tokens = max(len(tokens), 1)
+        text = " ".join(tokens)
+
+        content = {token for token in tokens if token not in STOPWORDS}
+        last_content = set()
+        if history_questions:
+            last_content = {token.lower() for token in _tokens(history_questions[-1])} - STOPWORDS
+        overlap = len(content & last_content) / len(content | last_content) if content and last_content else 0.0
+
+        return np.array([
+            1.0,
+            float(any(token in ANAPHORA for token in tokens)),
+            float(bool(tokens) and (tokens[0] in CONTINUATIONS or text.startswith(CONTINUATION_PHRASES))),
+            float(len(tokens) <= 4),
+            float(len(tokens) <= 2),
+            float(any(token in REFERENCES for token in tokens)),
+            overlap,
+            1.0 - len(content) / n_tokens if tokens else 1.0,
+            float(any(token[:1].isupper() for token in raw_tokens[1:])),
+            min(math.log1p(len(tokens)) / math.log(30), 1.0),
+        ], dtype=np.float64)
+
+    def predict_proba(self, question: str, history_questions: Sequence[str]) -> float:
+        """Probability that ``question`` is a follow-up to ``history_questions``."""
+        score = float(self.features(question, history_questions) @ self.weights)
+        return 1.0 / (1.0 + math.exp(-score))
+
+    @classmethod
+    def fit(
+        cls,
+        samples: List[Dict],
+        epochs: int = 500,
+        learning_rate: float = 0.5,
+        l2: float = 1e-3,
+    ) -> "FollowUpClassifier":
+        """
+        Train weights with batch gradient descent on logged labels.
+
+        :param samples: Dicts with ``question``, ``history`` (list of previous questions) and boolean ``label``
+        """
+        X = np.vstack([cls.features(s["question"], s.get("history") or []) for s in samples])
+        y = np.array([float(s["label"]) for s in samples])
+        weights = DEFAULT_WEIGHTS.copy()
+
+        for _ in range(epochs):
+            p = 1.0 / (1.0 + np.exp(-(X @ weights)))
+            gradient = X.T @ (p - y) / len(y) + l2 * weights
+            weights -= learning_rate * gradient
+
+        return cls(weights)
+
+    @classmethod
+    def load(cls, path: str) -> "FollowUpClassifier":
+        with open(path, "r") as file:
+            data = json.load(file)
+        if data.get("features") != FEATURES:
+            raise ValueError(f"Weights in {path} were trained for a different feature set")
+        return cls(data["weights"])
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump({"features": FEATURES, "weights": self.weights.tolist()}, file, indent=2)
+
+
+def _load_default() -> FollowUpClassifier:
+    path = follow_up_classifier_settings.FOLLOW_UP_WEIGHTS_PATH
+    if path:
+        try:
+            return FollowUpClassifier.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Couldn't load follow-up weights from {path}, using defaults: {e}")
+    return FollowUpClassifier()
+
+
+classifier = _load_default()
+
+
+class LabelLog:
+    """
+    Planner labels collected for retraining, appended to a JSONL file.
+
+    Labels are buffered in memory and written by a background flush loop, so
+    the answer path never does file I/O on the event loop.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0, flush_batch_size: int = 100):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._pending: List[str] = []
+        self._flush_requested: asyncio.Event | None = None
+
+    def record(self, question: str, history_questions: Sequence[str], label: bool, probability: float) -> None:
+        self._pending.append(json.dumps({
+            "question": question,
+            "history": list(history_questions),
+            "label": label,
+            "local_probability": round(probability, 4),
+        }) + "\n")
+        if len(self._pending) >= self.flush_batch_size and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    def _append(self, lines: List[str]) -> None:
+        with open(self.path, "a") as file:
+            file.writelines(lines)
+
+    async def flush(self) -> int:
+        """
+        Append every buffered label in a worker thread; they are kept for the next flush if it fails.
+
+        :return: Number of labels written
+        """
+        if not self._pending:
+            return 0
+        lines, self._pending = self._pending, []
+        try:
+            await asyncio.to_thread(self._append, lines)
+        except OSError as e:
+            logger.error(f"Couldn't append {len(lines)} follow-up labels to {self.path}, will retry: {e}")
+            self._pending = lines + self._pending
+            return 0
+        return len(lines)
+
+    async def run_flush_loop(self) -> None:
+        """Flush buffered labels every ``flush_interval`` seconds, or sooner once a batch fills up."""
+        self._flush_requested = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+
+label_log = (
+    LabelLog(
+        follow_up_classifier_settings.FOLLOW_UP_LABEL_LOG_PATH,
+        flush_interval=follow_up_classifier_settings.FOLLOW_UP_LABEL_FLUSH_INTERVAL_SECONDS,
+    )
+    if follow_up_classifier_settings.FOLLOW_UP_LABEL_LOG_PATH
+    else None
+)
+
+
+def log_label(question: str, history_questions: Sequence[str], label: bool, probability: float) -> None:
+    """Queue a planner label for ``label_log``; a no-op unless FOLLOW_UP_LABEL_LOG_PATH is set."""
+    if label_log is not None:
+        label_log.record(question, history_questions, label, probability)
+
+
+def predict_follow_up(question: str, history_questions: Sequence[str]) -> Tuple[Optional[bool], float]:
+    """
+    Classify a question locally, without any network call.
+
+    :return: ``(decision, probability)``. The decision is True or False when
+        the local model is confident (empty history is always standalone) and
+        None when an LLM should decide; the probability is the model's, to
+        reuse instead of predicting again
+    """
+    if not history_questions:
+        return False, 0.0
+
+    probability = classifier.predict_proba(question, history_questions)
+    if max(probability, 1.0 - probability) >= follow_up_classifier_settings.FOLLOW_UP_CONFIDENCE:
+        return probability >= 0.5, probability
+    return None, probability
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.utils.follow_up_classifier train <labels.jsonl> <weights.json>
+    if len(sys.argv) != 4 or sys.argv[1] != "train":
+        print("Usage: python -m src.utils.follow_up_classifier train <labels.jsonl> <weights.json>")
+        sys.exit(1)
+
+    with open(sys.argv[2], "r") as file:
+        samples = [json.loads(line) for line in file if line.strip()]
+
+    model = FollowUpClassifier.fit(samples)
+    predictions = [model.predict_proba(s["question"], s.get("history") or []) >= 0.5 for s in samples]
+    accuracy = sum(p == bool(s["label"]) for p, s in zip(predictions, samples)) / len(samples)
+    model.save(sys.argv[3])
+    print(f"Trained on {len(samples)} samples, training accuracy {accuracy:.3f}, weights written to {sys.argv[3]}")
@@ -0,0 +1,114 @@
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.embedding_cache import normalize_text
+
+
+SIMHASH_BITS = 64
+
+
+def fuse_hits(
+    per_query_hits: Iterable[List[Dict[str, Any]]],
+    method: str = "rrf",
+    rrf_k: int = 60,
+) -> List[Dict[str, Any]]:
+    """
+    Merge the hit lists of several queries into one ranking, keyed by ``_id``.
+
+    :param per_query_hits: One list of ``{_id, chunk_content, score}`` dicts per query, best first
+    :param method: "rrf" sums ``1 / (rrf_k + rank)`` over the queries that found a chunk,
+        "max" keeps its best vector score
+    :return: One dict per chunk with its best ``score`` and ``fused_score``, best first
+    """
+    if method not in ("rrf", "max"):
+        raise ValueError(f"Unknown fusion method: {method}")
+
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for hits in per_query_hits:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.get(hit["_id"])
+            if entry is None:
+                entry = fused[hit["_id"]] = {**hit, "fused_score": 0.0}
+            entry["score"] = max(entry["score"], hit["score"])
+            if method == "rrf":
+                entry["fused_score"] += 1.0 / (rrf_k + rank)
+            else:
+                entry["fused_score"] = max(entry["fused_score"], hit["score"])
+
+    return sorted(fused.values(), key=lambda entry: entry["fused_score"], reverse=True)
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """
+    64-bit SimHash of the word shingles of ``text``.
+
+    Each bit is the majority vote of that bit over the shingle hashes, so
+    texts sharing most shingles get signatures with a small Hamming distance.
+    """
+    tokens = normalize_text(text).split()
+    if not tokens:
+        return 0
+    shingles = [" ".join(tokens[i:i + shingle_size]) for i in range(max(len(tokens) - shingle_size + 1, 1))]
+
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles],
+        dtype=np.uint64,
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int(np.packbits(votes, bitorder="little").view(np.uint64)[0])
+
+
+def _bands(max_distance: int) -> List[Tuple[int, int]]:
+    # Two signatures within max_distance bits agree exactly on at least one of
+    # max_distance + 1 bands (pigeonhole), so band buckets find every candidate
+    n_bands = min(max_distance + 1, SIMHASH_BITS)
+    edges = np.linspace(0, SIMHASH_BITS, n_bands + 1).astype(int)
+    return [(int(start), (1 << int(end - start)) - 1) for start, end in zip(edges[:-1], edges[1:])]
+
+
+def remove_near_duplicates(
+    docs: List[Dict[str, Any]],
+    threshold: float = 0.9,
+    top_k: Optional[int] = None,
+    text_key: str = "text",
+) -> List[Dict[str, Any]]:
+    """
+    Drop empty chunks and chunks whose SimHash is too close to a better-ranked one.
+
+    Signatures are bucketed by band, so each doc is only compared with the
+    kept docs sharing a band and the pass stays linear in ``len(docs)``.
+
+    :param docs: Candidates, best first
+    :param threshold: Minimum similarity ``1 - hamming / 64`` for two chunks to count as duplicates
+    :param top_k: Stop once this many docs are kept
+    :return: The kept docs, in their original order
+    """
+    max_distance = max(int((1.0 - threshold) * SIMHASH_BITS), 0)
+    bands = _bands(max_distance)
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    kept = []
+
+    for doc in docs:
+        if top_k and len(kept) >= top_k:
+            break
+        text = (doc.get(text_key) or "").strip()
+        if not text:
+            continue
+
+        signature = simhash(text)
+        keys = [(band, (signature >> shift) & mask) for band, (shift, mask) in enumerate(bands)]
+        if any(
+            bin(signature ^ other).count("1") <= max_distance
+            for key in keys
+            for other in buckets.get(key, ())
+        ):
+            continue
+
+        kept.append(doc)
+        for key in keys:
+            buckets.setdefault(key, []).append(signature)
+
+    return kept
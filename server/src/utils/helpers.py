@@ -1,10 +1,66 @@
 import json
+from dataclasses import dataclass, field
 from typing import List, Tuple
 from typing import Dict, Any, Set, List
 
+from src.core.resilience import UpstreamUnavailable
 from src.llm.azure_openai import OpenAILLM
+from src.utils.logging import get_logger
+from src.utils.tracing import span
+
+logger = get_logger(__name__)
+
 _encoding = None
 
+# Rough characters-per-token ratio for English text, used when the tiktoken encoding can't be loaded
+_CHARS_PER_TOKEN = 4
+
+
+def get_encoding():
+    """
+    Return the tiktoken encoding used by the chat model, loading it once.
+
+    The first call that can't load it (tiktoken missing, or its encoding file
+    not downloadable or cached) logs a warning, since prompt budgets are then
+    only estimated.
+
+    :return: The encoding, or ``False`` when token counts fall back to a
+        character-based estimate
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(
+                f"Couldn't load the o200k_base tiktoken encoding, estimating token counts as "
+                f"{_CHARS_PER_TOKEN} characters per token; prompts may overrun or under-fill token_limit: {e}"
+            )
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of ``text`` for the chat model."""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return -(-len(text) // _CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut ``text`` down to at most ``max_tokens`` tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * _CHARS_PER_TOKEN]
 
 
 
@@ -71,66 +127,92 @@ def flatten(nested_list: list) -> list:
 
     return [item for sublist in nested_list for item in sublist]
 
-def is_follow_up(user_message: str) -> bool:
-    question = f"""
-            Classify the following user message as either 'follow-up' or 'standalone':\n\n"
-            User message: \{user_message}\n\n"
-            Answer with just 'follow-up' or 'standalone'.
+@dataclass
+class QueryPlan:
     """
-    llm = OpenAILLM()
+    Structured output of the query planner.
 
-    messages_combine = [{
-        "role": "system",
-        "content": """
-            You're a helpful assistant that classifies whether a user message in a conversation 
-            is a follow-up question that refers to previous context, or a standalone question.
+    ``degraded`` marks a plan the planner didn't produce (its reply wasn't
+    valid JSON, or it was unavailable): the question is searched as asked and
+    ``is_follow_up`` is only a default, not a label to learn from.
     """
-}]
-    messages_combine.append({"role": "user", "content": question})
-    
-    completion = llm.gen(model="chat", messages=messages_combine)
-    
-    return completion.strip().lower() == "follow-up"
-    
-    
 
-def query_expansion(question: str,
-                    to_expand_to_n: int,
-                    is_follow_up: bool = False,
-                    questions_history: List[str]= None,
-                    target_language: str = "English") -> list[str]:
-    
+    is_follow_up: bool
+    standalone_query: str
+    expanded_queries: List[str] = field(default_factory=list)
+    degraded: bool = False
+
+    @property
+    def queries(self) -> List[str]:
+        """The standalone query followed by its expansions, without duplicates."""
+        return list(dict.fromkeys(q for q in [self.standalone_query, *self.expanded_queries] if q))
+
+
+@span("query_planner", upstream="azure_openai")
+async def plan_query(question: str,
+                     to_expand_to_n: int,
+                     questions_history: List[str] = None) -> QueryPlan:
+    """
+    Detect follow-ups, rewrite and expand the question with a single JSON-mode LLM call.
+
+    Args:
+        question (str): The user's question.
+        to_expand_to_n (int): Number of alternative queries to generate.
+        questions_history (List[str]): Previous questions of the conversation, most recent last.
+
+    Returns:
+        QueryPlan: The follow-up flag, a standalone rewrite and the expanded queries.
+    """
     llm = OpenAILLM()
-    
-    # Build context for follow-up questions
-    context_prompt = ""
-    if is_follow_up and questions_history:
-        history_text = "\n".join([f"- {q}" for q in questions_history])
-        context_prompt = f"""
-        
-        IMPORTANT: This is a follow-up question in an ongoing conversation. 
-        Previous questions in this conversation:
-        {history_text}
-        
-        When generating the expanded queries, consider the context from previous questions to ensure the keywords and terminology used will help retrieve relevant chunks that build upon the conversation history.
-        """
-    
-    messages_combine = [{"role": "system", 
+
+    history_text = "\n".join([f"- {q}" for q in questions_history or []]) or "(none)"
+    messages_combine = [{"role": "system",
                          "content": f"""You are a Professional Astronomie expert like Joni Patry.
-                         You will receive a user query and you will generate {to_expand_to_n} different versions  of the received query .
-                         In the generated queries, you should use different words and phrases to express the same meaning as the original query.
-                        You should not change the meaning of the original query.
-                        You should not add any new information or change the context of the original query.
-                         
-                        YOU MUST PROVIDE THE GENERATED QUERIES IN ENGLIHSH.
-                        
-                        Provide these alternative questions seperated by |||.
+                        You plan searches over a knowledge base for a chatbot.
+
+                        Given the previous questions of a conversation and a new user message:
+                        1. Decide whether the new message is a follow-up that refers to the previous questions, or a standalone question.
+                        2. Rewrite the message as a self-contained search query. For a follow-up, resolve pronouns and
+                           missing context from the previous questions. For a standalone question, keep its meaning unchanged.
+                        3. Generate {to_expand_to_n} different versions of the rewritten query using different words and phrases
+                           with the same meaning. Do not add new information.
+
+                        ALL QUERIES MUST BE IN ENGLISH.
+
+                        Respond with a JSON object of the form:
+                        {{"is_follow_up": true or false, "standalone_query": "...", "expanded_queries": ["...", "..."]}}
                                     """}]
-    messages_combine.append({"role": "user", "content": question})
-    
-    completion = llm.gen(model="chat", messages=messages_combine)
-    list_output = completion.split('|||')
-    return list_output
+    messages_combine.append({"role": "user",
+                             "content": f"Previous questions:\n{history_text}\n\nNew message: {question}"})
+
+    try:
+        completion = await llm.agen(model="chat", messages=messages_combine,
+                                    response_format={"type": "json_object"}, idempotent=True)
+    except UpstreamUnavailable as e:
+        # Shed to the raw question: no rewrite, no expansions
+        logger.warning(f"Query planner unavailable, searching the question as asked: {e}")
+        return QueryPlan(is_follow_up=False, standalone_query=question, expanded_queries=[], degraded=True)
+
+    try:
+        data = json.loads(completion)
+        if not isinstance(data, dict) or not isinstance(data.get("is_follow_up"), bool):
+            raise ValueError(f"unexpected plan {completion[:200]!r}")
+        expanded = data.get("expanded_queries") or []
+        if isinstance(expanded, str):
+            # A single query instead of a list; don't iterate over its characters
+            expanded = [expanded]
+        elif not isinstance(expanded, list):
+            logger.warning(f"Ignoring expanded_queries of type {type(expanded).__name__}")
+            expanded = []
+        expanded = [str(q).strip() for q in expanded if str(q).strip()]
+        return QueryPlan(
+            is_follow_up=data["is_follow_up"],
+            standalone_query=str(data.get("standalone_query") or question).strip(),
+            expanded_queries=expanded[:to_expand_to_n],
+        )
+    except ValueError as e:  # json.JSONDecodeError is a ValueError
+        logger.warning(f"Error decoding query plan, searching the question as asked: {e}")
+        return QueryPlan(is_follow_up=False, standalone_query=question, expanded_queries=[], degraded=True)
 
 
 
@@ -0,0 +1,56 @@
+import bisect
+import threading
+from typing import Dict, Sequence
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus style.
+
+    ``buckets`` are upper bounds; an implicit ``+Inf`` bucket catches the rest.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip([*map(str, self.buckets), "+Inf"], counts):
+            running += bucket_count
+            cumulative[bound] = running
+        return {
+            "buckets": cumulative,
+            "count": count,
+            "sum": round(total, 4),
+            "mean": round(total / count, 4) if count else 0.0,
+        }
+
+
+class Gauge:
+    """Current value of a quantity, with the highest value seen."""
+
+    def __init__(self):
+        self.value = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+            self.max = max(self.max, value)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {"value": self.value, "max": self.max}
@@ -0,0 +1,122 @@
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+
+from src.utils.helpers import count_tokens, truncate_to_tokens
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Tokens that prime the assistant reply
+REPLY_PRIMING_TOKENS = 3
+CONTEXT_SEPARATOR = "\n\n\n"
+
+
+@dataclass
+class PromptBudget:
+    """Token counts of an assembled prompt, reported with the answer."""
+
+    limit: int
+    system: int = 0
+    context: int = 0
+    history: int = 0
+    question: int = 0
+    docs_used: int = 0
+    docs_truncated: int = 0
+    docs_dropped: int = 0
+    history_turns_used: int = 0
+    history_turns_dropped: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.system + self.context + self.history + self.question + REPLY_PRIMING_TOKENS
+
+    def as_dict(self) -> Dict[str, int]:
+        return {**asdict(self), "total": self.total}
+
+
+def assemble_prompt(
+    prompt: str,
+    docs: List[Dict[str, Any]],
+    history: Sequence[Tuple[str, str]],
+    question: str,
+    token_limit: int,
+    context_share: float = 0.7,
+    min_chunk_tokens: int = 64,
+) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]], PromptBudget]:
+    """
+    Build the chat messages within ``token_limit`` prompt tokens.
+
+    The system prompt and the question are always sent. The rest of the
+    budget goes to the retrieved chunks (best first, up to ``context_share``
+    of it when history competes for room) and to the most recent history
+    turns; whatever one side doesn't use is left to the other. The last chunk
+    that fits partially is truncated, everything after it is dropped, and
+    history turns older than the first one that doesn't fit are dropped.
+
+    :param prompt: System prompt template with a ``{summaries}`` placeholder
+    :param docs: Retrieved docs with a ``text`` key, best first
+    :param history: ``(user, bot)`` turns, oldest first
+    :return: ``(messages, docs_used, budget)``
+    """
+    budget = PromptBudget(limit=token_limit)
+    budget.system = count_tokens(prompt.replace("{summaries}", "")) + MESSAGE_OVERHEAD_TOKENS
+    budget.question = count_tokens(question) + MESSAGE_OVERHEAD_TOKENS
+
+    remaining = token_limit - budget.system - budget.question - REPLY_PRIMING_TOKENS
+    if remaining < 0:
+        logger.warning("System prompt and question alone exceed the token limit", token_limit=token_limit, needed=token_limit - remaining)
+        remaining = 0
+
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    doc_costs = [count_tokens(doc.get("text", "")) + separator_tokens for doc in docs]
+    context_target = min(sum(doc_costs), int(remaining * context_share))
+
+    # Most recent turns first, within what the chunks leave over
+    history_left = remaining - context_target
+    turns: List[Tuple[str, str]] = []
+    for user_msg, bot_msg in reversed(list(history)):
+        cost = count_tokens(user_msg) + count_tokens(bot_msg) + 2 * MESSAGE_OVERHEAD_TOKENS
+        if cost > history_left:
+            break
+        turns.append((user_msg, bot_msg))
+        history_left -= cost
+        budget.history += cost
+    turns.reverse()
+    budget.history_turns_used = len(turns)
+    budget.history_turns_dropped = len(history) - len(turns)
+
+    # Chunks take everything history didn't use
+    context_left = remaining - budget.history
+    texts: List[str] = []
+    docs_used: List[Dict[str, Any]] = []
+    for doc, cost in zip(docs, doc_costs):
+        text = doc.get("text", "")
+        if cost > context_left:
+            room = context_left - separator_tokens
+            if room >= min_chunk_tokens:
+                text = truncate_to_tokens(text, room)
+                cost = count_tokens(text) + separator_tokens
+                budget.docs_truncated += 1
+            else:
+                break
+        texts.append(text)
+        docs_used.append(doc)
+        context_left -= cost
+        budget.context += cost
+        if context_left <= separator_tokens:
+            break
+    budget.docs_used = len(docs_used)
+    budget.docs_dropped = len(docs) - len(docs_used)
+
+    messages = [{"role": "system", "content": prompt.replace("{summaries}", CONTEXT_SEPARATOR.join(texts))}]
+    for user_msg, bot_msg in turns:
+        messages.extend([
+            {"role": "user", "content": user_msg},
+            {"role": "system", "content": bot_msg},
+        ])
+    messages.append({"role": "user", "content": question})
+
+    logger.info("Prompt assembled", **budget.as_dict())
+    return messages, docs_used, budget
@@ -0,0 +1,170 @@
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.utils.metrics import Histogram
+
+# Seconds; covers local work (sub-millisecond) up to slow LLM completions
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_stage_histograms: Dict[Tuple[str, str], Histogram] = {}
+_registry_lock = threading.Lock()
+
+
+class Trace:
+    """Spans recorded while serving one request, for the Server-Timing header."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+
+    def summary(self) -> Dict[str, float]:
+        """Milliseconds per stage, summed over repeated spans, in first-seen order."""
+        totals: Dict[str, float] = {}
+        for stage, duration in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + duration * 1000
+        return {stage: round(ms, 1) for stage, ms in totals.items()}
+
+    def server_timing(self) -> str:
+        entries = [f"{stage};dur={ms}" for stage, ms in self.summary().items()]
+        entries.append(f"total;dur={round((time.perf_counter() - self.started) * 1000, 1)}")
+        return ", ".join(entries)
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def start_trace() -> Tuple[Trace, contextvars.Token]:
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: contextvars.Token) -> None:
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def _histogram(stage: str, upstream: str) -> Histogram:
+    key = (stage, upstream)
+    histogram = _stage_histograms.get(key)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _stage_histograms.setdefault(key, Histogram(LATENCY_BUCKETS))
+    return histogram
+
+
+class span:
+    """
+    Time a pipeline stage.
+
+    Usable as ``with span("retrieve"):`` (also inside coroutines) or as a
+    decorator on sync and async functions. The duration goes to the
+    per-stage, per-upstream histogram and, inside a request, to its trace.
+    Tasks created during a request inherit its trace through the context.
+    """
+
+    def __init__(self, stage: str, upstream: str = "none"):
+        self.stage = stage
+        self.upstream = upstream
+        self._started = 0.0
+
+    def __enter__(self) -> "span":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        duration = time.perf_counter() - self._started
+        _histogram(self.stage, self.upstream).observe(duration)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((self.stage, duration))
+
+    def __call__(self, func):
+        stage, upstream = self.stage, self.upstream
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage, upstream):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage, upstream):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def _labels(**labels: str) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def render_histogram(name: str, help_text: str, series: Iterable[Tuple[Dict[str, str], Histogram]]) -> List[str]:
+    """Render histograms in the Prometheus text exposition format."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        snapshot = histogram.snapshot()
+        for bound, count in snapshot["buckets"].items():
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {snapshot['sum']}")
+        lines.append(f"{name}_count{_labels(**labels)} {snapshot['count']}")
+    return lines
+
+
+def render_samples(name: str, help_text: str, metric_type: str, series: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Render counters or gauges in the Prometheus text exposition format."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in series:
+        lines.append(f"{name}{_labels(**labels)} {value}")
+    return lines
+
+
+def stage_metrics() -> List[str]:
+    with _registry_lock:
+        series = sorted(_stage_histograms.items())
+    return render_histogram(
+        "rag_stage_duration_seconds",
+        "Latency of each answer pipeline stage and upstream call.",
+        [({"stage": stage, "upstream": upstream}, histogram) for (stage, upstream), histogram in series],
+    )
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that traces each request under ``path_prefix`` and adds a
+    ``Server-Timing`` header with the stages recorded before the headers went out.
+
+    Streaming responses send their headers first, so their header only holds
+    ``total``; the stream's ``end`` event carries the full stage breakdown.
+    """
+
+    def __init__(self, app, path_prefix: str = "/api/answer"):
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = start_trace()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_trace(token)
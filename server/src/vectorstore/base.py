@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+
 
 class BaseVectorStore(ABC):
     def __init__(self):
@@ -7,3 +9,24 @@ class BaseVectorStore(ABC):
     @abstractmethod
     def search(self, *args, **kwargs):
         pass
+
+
+def group_hits_by_id(per_query_hits: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Merge per-query hit lists into one entry per document, the shape
+    ``MongoVectorRetriever.asearch_many`` gets back from its ``$group`` stage.
+
+    :param per_query_hits: Hit dicts with ``_id``, ``chunk_content`` and ``score``, one list per query
+    :return: ``{_id, chunk_content, score, hits}`` dicts sorted by best score, where ``hits``
+        lists ``{query_index, score}`` for every query that matched the document
+    """
+    grouped: Dict[Any, Dict[str, Any]] = {}
+    for query_index, hits in enumerate(per_query_hits):
+        for hit in hits:
+            entry = grouped.setdefault(
+                hit["_id"],
+                {"_id": hit["_id"], "chunk_content": hit.get("chunk_content", ""), "score": hit["score"], "hits": []},
+            )
+            entry["score"] = max(entry["score"], hit["score"])
+            entry["hits"].append({"query_index": query_index, "score": hit["score"]})
+    return sorted(grouped.values(), key=lambda entry: entry["score"], reverse=True)
@@ -0,0 +1,51 @@
+from typing import Dict
+
+from src.core.config import vector_store_settings
+from src.vectorstore.base import BaseVectorStore
+from src.vectorstore.local_index import LocalVectorIndex
+from src.vectorstore.mongo_vectordb import MongoVectorRetriever, collection_name_for
+from src.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+_local_indexes: Dict[str, LocalVectorIndex] = {}
+_overrides: Dict[str, BaseVectorStore] = {}
+
+
+def override_vector_store(law_type: str, store: BaseVectorStore) -> None:
+    """Serve ``law_type`` from ``store`` whatever the backend, e.g. an in-memory store in benchmarks."""
+    _overrides[law_type] = store
+
+
+def get_local_index(law_type: str = "youtube_data") -> LocalVectorIndex:
+    """Return the process-wide local index for a law type, mapping its snapshot if one exists."""
+    index = _local_indexes.get(law_type)
+    if index is None:
+        index = LocalVectorIndex(collection_name_for(law_type))
+        index.load()
+        _local_indexes[law_type] = index
+    return index
+
+
+def get_vector_store(law_type: str = "youtube_data") -> BaseVectorStore:
+    """
+    Return the vector store selected by ``VECTOR_STORE_BACKEND`` for a law type.
+
+    With the local backend, searches go to Atlas until the first snapshot
+    has been taken.
+    """
+    if law_type in _overrides:
+        return _overrides[law_type]
+
+    backend = vector_store_settings.VECTOR_STORE_BACKEND
+
+    if backend == "local":
+        index = get_local_index(law_type)
+        if index.ready:
+            return index
+        logger.warning("Local vector index has no snapshot yet, using MongoDB", law_type=law_type)
+    elif backend != "mongo":
+        raise ValueError(f"Unknown vector store backend: {backend}")
+
+    return MongoVectorRetriever(law_type=law_type)
@@ -0,0 +1,729 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows; a single process is assumed there
+    fcntl = None
+
+from src.core.config import azure_embeddings_settings, monogo_vector_settings, vector_store_settings
+from src.core.mongo_client import get_async_connection
+from src.vectorstore.base import BaseVectorStore, group_hits_by_id
+from src.vectorstore.quantization import PrefixProjector, load_quantizer, save_quantizer, shortlist_search
+from src.utils.embeddings import aget_embedding_3_large_simple, get_embedding_3_large_simple
+from src.utils.logging import get_logger
+from src.utils.tracing import span
+
+
+logger = get_logger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "offsets.npy"
+IDS_FILE = "ids.json"
+DELETED_FILE = "deleted.npy"
+MANIFEST_FILE = "manifest.json"
+QUANTIZER_FILE = "quantizer.npz"
+CODES_FILE = "codes.bin"
+PREFIX_CODES_FILE = "prefix{}.bin"
+
+
+@dataclass
+class _IndexState:
+    """An immutable view of the snapshot; syncs build a new one and swap it in."""
+
+    vectors: np.ndarray  # (count, dim) float32 memmap of L2-normalized rows
+    chunks: np.ndarray  # uint8 memmap of concatenated UTF-8 chunk texts
+    offsets: np.ndarray  # (count + 1,) int64 byte offsets into chunks
+    ids: List[str]
+    deleted: np.ndarray  # (count,) bool tombstones for replaced or removed rows
+    row_by_id: Dict[str, int]
+    manifest: Dict[str, Any]
+    quantizer: Any = None  # ScalarQuantizer, ProductQuantizer or PrefixProjector for the coarse stage
+    codes: Optional[np.ndarray] = None  # (count, ...) in-memory codes matching ``vectors``
+    codes_key: Optional[tuple] = None  # identifies the coarse stage the codes were encoded with
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    def text(self, row: int) -> str:
+        return bytes(self.chunks[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _open_memmap(path: str, dtype, shape: Tuple[int, ...]) -> np.ndarray:
+    if not shape[0]:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _replace_file(path: str, write: Callable[[Any], None], mode: str = "wb") -> None:
+    # Readers in other processes never see a half-written file
+    with open(path + ".tmp", mode) as file:
+        write(file)
+    os.replace(path + ".tmp", path)
+
+
+class _WriterLock:
+    """
+    Exclusive ``flock`` that elects the one process allowed to write a snapshot.
+
+    With several workers each running the sync loop, only the holder appends,
+    compacts and rebuilds; the others reload what it writes. The lock lives
+    next to the snapshot directory, which is swapped on rebuilds, and is
+    released by the OS when the holder exits.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None or fcntl is None
+
+    def acquire(self) -> bool:
+        """Take the lock without waiting; True when this process holds it."""
+        if self.held:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        file = open(self.path, "a")
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        self._file = file
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class LocalVectorIndex(BaseVectorStore):
+    """
+    Memory-mapped snapshot of a Mongo vector collection searched in-process.
+
+    The snapshot lives in a directory with a float32 vector matrix, the chunk
+    texts with a side-car offset table, the document ids and a tombstone mask.
+    A top-k query is one matrix product over the mapped matrix followed by
+    ``argpartition``, so there is no network round trip per query.
+
+    The snapshot is kept fresh incrementally: changed documents are appended and
+    their previous rows tombstoned, either by polling an ``updated_at``-style
+    watermark or by following a change stream. It is compacted once the stale
+    share exceeds ``LOCAL_INDEX_COMPACT_RATIO``. Only the process holding the
+    writer lock changes the files; other processes ``reload`` them.
+
+    File I/O and whole-matrix work are synchronous; the async methods run
+    them in worker threads so the event loop keeps serving requests.
+    """
+
+    def __init__(self, collection_name: str, directory: Optional[str] = None) -> None:
+        self.collection_name = collection_name
+        self.directory = directory or os.path.join(vector_store_settings.LOCAL_INDEX_DIR, collection_name)
+        self._state: Optional[_IndexState] = None
+        self._write_lock = asyncio.Lock()
+        self._writer_lock = _WriterLock(self.directory + ".lock")
+        self._manifest_version: Optional[Tuple[int, int]] = None
+
+    # ------------------------------------------------------------------ loading
+
+    def load(self) -> bool:
+        """Map the snapshot on disk, returning False when none exists yet."""
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        try:
+            version = self._stat_manifest()
+            with open(manifest_path, "r") as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            logger.info("No local vector snapshot found", directory=self.directory)
+            return False
+        with open(os.path.join(self.directory, IDS_FILE), "r") as file:
+            ids = json.load(file)
+
+        count, dim = manifest["count"], manifest["dim"]
+        offsets = np.load(os.path.join(self.directory, OFFSETS_FILE))
+        deleted = np.load(os.path.join(self.directory, DELETED_FILE))
+        if len(ids) < count or len(offsets) < count + 1 or len(deleted) < count:
+            raise RuntimeError(f"Local vector snapshot in {self.directory} changed while loading")
+        # A writer appends the side files before the manifest; rows past its count aren't complete yet
+        ids, offsets, deleted = ids[:count], offsets[:count + 1], deleted[:count]
+        state = _IndexState(
+            vectors=_open_memmap(os.path.join(self.directory, VECTORS_FILE), np.float32, (count, dim)),
+            chunks=_open_memmap(os.path.join(self.directory, CHUNKS_FILE), np.uint8, (int(offsets[-1]),)),
+            offsets=offsets,
+            ids=ids,
+            deleted=deleted,
+            row_by_id={doc_id: row for row, doc_id in enumerate(ids) if not deleted[row]},
+            manifest=manifest,
+        )
+        self._load_codes(state, self._state)
+        # Published complete, so concurrent searches never see a state without its codes
+        self._manifest_version = version
+        self._state = state
+        logger.info("Local vector snapshot loaded", directory=self.directory, count=count, dim=dim)
+        return True
+
+    def _stat_manifest(self) -> Tuple[int, int]:
+        stat = os.stat(os.path.join(self.directory, MANIFEST_FILE))
+        return stat.st_ino, stat.st_mtime_ns
+
+    def reload(self) -> bool:
+        """Load the snapshot again if another process has rewritten its manifest since the last load."""
+        try:
+            version = self._stat_manifest()
+        except FileNotFoundError:
+            return False
+        if version == self._manifest_version:
+            return False
+        return self.load()
+
+    def acquire_writer(self) -> bool:
+        """Become the process that writes this snapshot, unless another one already is."""
+        return self._writer_lock.acquire()
+
+    def _require_writer(self) -> None:
+        if not self._writer_lock.acquire():
+            raise RuntimeError(f"Another process is writing the local vector snapshot in {self.directory}")
+
+    def _coarse_stage(self, state: _IndexState, previous: Optional[_IndexState]) -> Tuple[Any, Optional[tuple]]:
+        """
+        Pick the coarse stage of a two-stage search.
+
+        A trained quantizer takes precedence; otherwise LOCAL_INDEX_COARSE_DIMENSIONS
+        selects a Matryoshka prefix of the vectors.
+
+        :return: ``(quantizer, key)``, or ``(None, None)`` for exact search
+        """
+        quantizer_path = os.path.join(self.directory, QUANTIZER_FILE)
+        coarse_dimensions = vector_store_settings.LOCAL_INDEX_COARSE_DIMENSIONS
+        if vector_store_settings.LOCAL_INDEX_USE_QUANTIZATION and os.path.exists(quantizer_path):
+            stat = os.stat(quantizer_path)
+            key = ("trained", stat.st_mtime_ns, stat.st_size)
+        elif 0 < coarse_dimensions < state.vectors.shape[1]:
+            key = ("prefix", coarse_dimensions)
+        else:
+            return None, None
+
+        if previous is not None and previous.codes_key == key:
+            return previous.quantizer, key
+        if key[0] == "trained":
+            return load_quantizer(quantizer_path), key
+        return PrefixProjector(coarse_dimensions), key
+
+    def _codes_path(self, quantizer) -> str:
+        if isinstance(quantizer, PrefixProjector):
+            return os.path.join(self.directory, PREFIX_CODES_FILE.format(quantizer.dimensions))
+        return os.path.join(self.directory, CODES_FILE)
+
+    def _load_codes(self, state: _IndexState, previous: Optional[_IndexState] = None) -> None:
+        """
+        Set up the coarse stage and its codes, encoding only rows that have none yet.
+
+        Rows are append-only within a snapshot generation, so the codes of the
+        previously loaded state are reused, then those in the append-only codes
+        file; only the rows after them are encoded, and the writer appends those
+        to the file. Rewritten snapshots start a new generation and file.
+        """
+        quantizer, key = self._coarse_stage(state, previous)
+        if quantizer is None:
+            return
+
+        empty = quantizer.encode(state.vectors[:0])
+        codes = empty
+        if (
+            previous is not None
+            and previous.codes_key == key
+            and previous.manifest.get("generation") == state.manifest.get("generation")
+            and len(previous.codes) <= state.count
+        ):
+            codes = previous.codes
+
+        codes_path = self._codes_path(quantizer)
+        row_size = empty.dtype.itemsize * int(np.prod(empty.shape[1:]))
+        stored = os.path.getsize(codes_path) // row_size if os.path.exists(codes_path) else 0
+        if len(codes) < min(stored, state.count):
+            # Read only the rows the writer appended since
+            tail = np.fromfile(
+                codes_path,
+                dtype=empty.dtype,
+                count=(min(stored, state.count) - len(codes)) * row_size // empty.dtype.itemsize,
+                offset=len(codes) * row_size,
+            )
+            codes = np.concatenate([codes, tail.reshape(-1, *empty.shape[1:])])
+
+        if len(codes) < state.count:
+            fresh = quantizer.encode(state.vectors[len(codes):])
+            if stored == len(codes) and self._writer_lock.held:
+                with open(codes_path, "ab") as file:
+                    file.write(np.ascontiguousarray(fresh).tobytes())
+            codes = np.concatenate([codes, fresh])
+
+        state.quantizer = quantizer
+        state.codes = codes
+        state.codes_key = key
+
+    def set_quantizer(self, quantizer) -> None:
+        """Install a trained quantizer and re-encode every row with it."""
+        self._require_writer()
+        save_quantizer(quantizer, os.path.join(self.directory, QUANTIZER_FILE))
+        codes_path = os.path.join(self.directory, CODES_FILE)
+        if os.path.exists(codes_path):
+            os.remove(codes_path)
+        self.load()
+
+    def _carry_quantizer(self, target_dir: str) -> None:
+        # Rewritten snapshots keep the trained quantizer; codes are re-encoded on load
+        quantizer_path = os.path.join(self.directory, QUANTIZER_FILE)
+        if os.path.exists(quantizer_path):
+            shutil.copyfile(quantizer_path, os.path.join(target_dir, QUANTIZER_FILE))
+
+    def live_vectors(self) -> np.ndarray:
+        state = self._state
+        if state is None:
+            raise RuntimeError(f"Local vector index for {self.collection_name} is not loaded")
+        return state.vectors[~state.deleted]
+
+    @property
+    def ready(self) -> bool:
+        return self._state is not None
+
+    @property
+    def watermark(self) -> Any:
+        return self._state.manifest.get("watermark") if self._state else None
+
+    # ------------------------------------------------------------------ search
+
+    @span("vector_search", upstream="local_index")
+    def search_vectors(self, query_vectors: np.ndarray, k: int) -> List[List[Dict[str, Any]]]:
+        """
+        Exact top-k for one or more query vectors with a single matrix product.
+
+        :param query_vectors: (dim,) or (n_queries, dim) array
+        :return: One list of ``{_id, chunk_content, score}`` dicts per query, best first
+        """
+        state = self._state
+        if state is None:
+            raise RuntimeError(f"Local vector index for {self.collection_name} is not loaded")
+
+        queries = _normalize_rows(np.atleast_2d(query_vectors))
+        if state.count == 0 or k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        if state.codes is not None:
+            # Shortlist on the compact codes or prefix, rescore exactly from the memmap
+            hits = shortlist_search(
+                state.quantizer,
+                state.codes,
+                state.vectors,
+                queries,
+                k,
+                rescore_factor=vector_store_settings.LOCAL_INDEX_RESCORE_FACTOR,
+                excluded=state.deleted,
+            )
+        else:
+            hits = self._exact_search(state, queries, k)
+
+        return [
+            [
+                {
+                    "_id": state.ids[row],
+                    "chunk_content": state.text(row),
+                    # Same scale as $vectorSearch cosine scores: (1 + cos) / 2
+                    "score": float((1.0 + score) / 2.0),
+                }
+                for row, score in zip(rows, scores)
+            ]
+            for rows, scores in hits
+        ]
+
+    @staticmethod
+    def _exact_search(state: _IndexState, queries: np.ndarray, k: int) -> List[tuple]:
+        # (count, n_queries) cosine similarities
+        scores = state.vectors @ queries.T
+        scores[state.deleted] = -np.inf
+        k = min(k, state.count - int(state.deleted.sum()))
+        if k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        hits = []
+        for column in range(queries.shape[0]):
+            rows = top[:, column]
+            rows = rows[np.argsort(-scores[rows, column])]
+            hits.append((rows, scores[rows, column]))
+        return hits
+
+    def search(self, query: str, k: int) -> list:
+        return self.search_vectors(get_embedding_3_large_simple(query), k)[0]
+
+    async def asearch(self, query: str, k: int, query_vector: np.ndarray | None = None) -> list:
+        if query_vector is None:
+            query_vector = await aget_embedding_3_large_simple(query)
+        # NumPy releases the GIL during the matmul, so run it off the event loop
+        results = await asyncio.to_thread(self.search_vectors, query_vector, k)
+        logger.info("All documents retrieved successfully from local index.", num_documents=len(results[0]))
+        return results[0]
+
+    async def asearch_many(self, query_vectors: np.ndarray, k: int, **kwargs) -> list:
+        """
+        Search every query vector with one matrix product, grouped by document.
+
+        Same result shape as ``MongoVectorRetriever.asearch_many``.
+        """
+        if len(query_vectors) == 0:
+            return []
+        results = await asyncio.to_thread(self.search_vectors, np.asarray(query_vectors), k)
+        grouped = group_hits_by_id(results)
+        logger.info("All documents retrieved successfully from local index.", queries=len(results), num_documents=len(grouped))
+        return grouped
+
+    # ------------------------------------------------------------------ writing
+
+    def _write_files(
+        self,
+        directory: str,
+        vectors: Iterable[np.ndarray],
+        texts: Iterable[bytes],
+        ids: List[str],
+        deleted: np.ndarray,
+        manifest: Dict[str, Any],
+        append: bool = False,
+        offsets: Optional[np.ndarray] = None,
+    ) -> None:
+        mode = "ab" if append else "wb"
+        offsets_list = [int(offsets[-1])] if append and offsets is not None else [0]
+        with open(os.path.join(directory, VECTORS_FILE), mode) as vector_file, \
+                open(os.path.join(directory, CHUNKS_FILE), mode) as chunk_file:
+            for vector, text in zip(vectors, texts):
+                vector_file.write(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+                chunk_file.write(text)
+                offsets_list.append(offsets_list[-1] + len(text))
+
+        if append and offsets is not None:
+            new_offsets = np.concatenate([offsets, np.asarray(offsets_list[1:], dtype=np.int64)])
+        else:
+            new_offsets = np.asarray(offsets_list, dtype=np.int64)
+
+        _replace_file(os.path.join(directory, OFFSETS_FILE), lambda file: np.save(file, new_offsets))
+        _replace_file(os.path.join(directory, DELETED_FILE), lambda file: np.save(file, deleted))
+        _replace_file(os.path.join(directory, IDS_FILE), lambda file: json.dump(ids, file), mode="w")
+        manifest = dict(manifest, count=len(ids), updated=time.time())
+        # The manifest is written last, so a crash mid-write leaves the old count in place
+        _replace_file(os.path.join(directory, MANIFEST_FILE), lambda file: json.dump(manifest, file), mode="w")
+
+    @staticmethod
+    def _parse(doc: Dict[str, Any]) -> Optional[Tuple[str, np.ndarray, bytes]]:
+        embedding = doc.get("embedding")
+        if not embedding:
+            return None
+        # Keep the configured Matryoshka prefix so stored and query vectors match
+        embedding = embedding[:azure_embeddings_settings.EMBEDDING_DIMENSIONS]
+        vector = _normalize_rows(np.asarray(embedding, dtype=np.float32))
+        return str(doc["_id"]), vector, (doc.get("chunk_content") or "").encode("utf-8")
+
+    async def snapshot(self, collection, batch_size: int = 1000) -> int:
+        """
+        Rebuild the snapshot from scratch by streaming the whole collection.
+
+        The new files are written to a temporary directory and swapped in
+        with a rename, so searches keep using the old snapshot meanwhile.
+        """
+        self._require_writer()
+        field = vector_store_settings.LOCAL_INDEX_WATERMARK_FIELD
+        tmp_dir = self.directory + ".tmp"
+
+        async with self._write_lock:
+            await asyncio.to_thread(self._fresh_dir, tmp_dir)
+            ids: List[str] = []
+            dim = None
+            watermark = None
+            generation = uuid.uuid4().hex
+            offsets = np.zeros(1, dtype=np.int64)
+            first = True
+
+            cursor = collection.find({}, {"_id": 1, "chunk_content": 1, "embedding": 1, field: 1})
+            batch: List[Tuple[str, np.ndarray, bytes]] = []
+
+            def write_batch():
+                self._write_files(
+                    tmp_dir,
+                    (vector for _, vector, _ in batch),
+                    (text for _, _, text in batch),
+                    ids,
+                    np.zeros(len(ids), dtype=bool),
+                    {
+                        "collection": self.collection_name,
+                        "dim": dim,
+                        "watermark": _encode_watermark(watermark),
+                        "generation": generation,
+                    },
+                    append=not first,
+                    offsets=offsets,
+                )
+                return np.load(os.path.join(tmp_dir, OFFSETS_FILE))
+
+            async def flush():
+                nonlocal offsets, first
+                if not batch and not first:
+                    return
+                offsets = await asyncio.to_thread(write_batch)
+                first = False
+                batch.clear()
+
+            async for doc in cursor:
+                parsed = self._parse(doc)
+                if parsed is None:
+                    continue
+                if dim is None:
+                    dim = int(parsed[1].shape[0])
+                elif parsed[1].shape[0] != dim:
+                    logger.error("Skipping document with unexpected embedding size", _id=parsed[0])
+                    continue
+                if doc.get(field) is not None and (watermark is None or doc[field] > watermark):
+                    watermark = doc[field]
+                ids.append(parsed[0])
+                batch.append(parsed)
+                if len(batch) >= batch_size:
+                    await flush()
+            await flush()
+
+            def finish():
+                self._rewrite_manifest(tmp_dir, dim=dim or 0)
+                self._carry_quantizer(tmp_dir)
+                self._swap_in(tmp_dir)
+
+            await asyncio.to_thread(finish)
+
+        logger.info("Local vector snapshot rebuilt", collection=self.collection_name, count=len(ids))
+        return len(ids)
+
+    @staticmethod
+    def _rewrite_manifest(directory: str, **updates) -> None:
+        path = os.path.join(directory, MANIFEST_FILE)
+        with open(path, "r") as file:
+            manifest = json.load(file)
+        manifest.update(updates)
+        _replace_file(path, lambda file: json.dump(manifest, file), mode="w")
+
+    @staticmethod
+    def _fresh_dir(directory: str) -> None:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+    def _swap_in(self, tmp_dir: str) -> None:
+        # Readers with the old files mapped keep them until they reload
+        old_dir = self.directory + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(self.directory):
+            os.replace(self.directory, old_dir)
+        os.replace(tmp_dir, self.directory)
+        self.load()
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    async def apply_changes(self, upserts: List[Dict[str, Any]], deleted_ids: List[str], watermark: Any = None) -> None:
+        """
+        Append changed documents and tombstone their previous rows.
+
+        :param upserts: Full documents with ``_id``, ``chunk_content`` and ``embedding``
+        :param deleted_ids: Ids of documents removed from the collection
+        :param watermark: New watermark to record, if any
+        """
+        self._require_writer()
+        async with self._write_lock:
+            await asyncio.to_thread(self._apply_changes, upserts, deleted_ids, watermark)
+
+    def _apply_changes(self, upserts: List[Dict[str, Any]], deleted_ids: List[str], watermark: Any) -> None:
+        state = self._state
+        if state is None:
+            raise RuntimeError("Take a snapshot before applying incremental changes")
+
+        deleted = state.deleted.copy()
+        ids = list(state.ids)
+        row_by_id = dict(state.row_by_id)
+        parsed = []
+        for doc in upserts:
+            item = self._parse(doc)
+            if item is None or item[1].shape[0] != state.manifest["dim"]:
+                continue
+            parsed.append(item)
+        # Only the latest version of a document changed twice in one batch is kept
+        parsed = list({item[0]: item for item in parsed}.values())
+
+        for doc_id in [*deleted_ids, *(item[0] for item in parsed)]:
+            row = row_by_id.pop(str(doc_id), None)
+            if row is not None:
+                deleted[row] = True
+
+        deleted = np.concatenate([deleted, np.zeros(len(parsed), dtype=bool)])
+        ids.extend(item[0] for item in parsed)
+
+        manifest = dict(state.manifest)
+        if watermark is not None:
+            manifest["watermark"] = _encode_watermark(watermark)
+        self._write_files(
+            self.directory,
+            (item[1] for item in parsed),
+            (item[2] for item in parsed),
+            ids,
+            deleted,
+            manifest,
+            append=True,
+            offsets=state.offsets,
+        )
+        self.load()
+
+        if deleted.size and deleted.mean() > vector_store_settings.LOCAL_INDEX_COMPACT_RATIO:
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the snapshot without tombstoned rows."""
+        self._require_writer()
+        state = self._state
+        if state is None:
+            return
+        live = np.flatnonzero(~state.deleted)
+        tmp_dir = self.directory + ".tmp"
+        self._fresh_dir(tmp_dir)
+        self._write_files(
+            tmp_dir,
+            (state.vectors[row] for row in live),
+            (state.text(row).encode("utf-8") for row in live),
+            [state.ids[row] for row in live],
+            np.zeros(len(live), dtype=bool),
+            # New row numbers, so codes of the previous generation don't apply
+            dict(state.manifest, generation=uuid.uuid4().hex),
+        )
+        self._carry_quantizer(tmp_dir)
+        self._swap_in(tmp_dir)
+        logger.info("Local vector snapshot compacted", count=len(live), dropped=int(state.deleted.sum()))
+
+    async def sync(self, collection) -> int:
+        """
+        Pull documents changed since the stored watermark.
+
+        Deletions are invisible to a watermark query; use the change stream
+        mode or a periodic snapshot if documents are removed.
+
+        :return: Number of documents applied
+        """
+        if self._state is None and not await asyncio.to_thread(self.load):
+            return await self.snapshot(collection)
+
+        field = vector_store_settings.LOCAL_INDEX_WATERMARK_FIELD
+        watermark = _decode_watermark(self.watermark)
+        query = {field: {"$gt": watermark}} if watermark is not None else {field: {"$exists": True}}
+        docs = await collection.find(
+            query, {"_id": 1, "chunk_content": 1, "embedding": 1, field: 1}
+        ).sort(field, 1).to_list(length=None)
+        if not docs:
+            return 0
+
+        await self.apply_changes(docs, [], watermark=docs[-1].get(field))
+        logger.info("Local vector snapshot synced", collection=self.collection_name, changed=len(docs))
+        return len(docs)
+
+    async def follow_change_stream(self, collection) -> None:
+        """Apply inserts, updates and deletes from a change stream until cancelled."""
+        if self._state is None and not await asyncio.to_thread(self.load):
+            await self.snapshot(collection)
+
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        async with collection.watch(pipeline, full_document="updateLookup") as stream:
+            logger.info("Following change stream for local vector index", collection=self.collection_name)
+            while stream.alive:
+                change = await stream.next()
+                changes = [change]
+                # Drain whatever else is already buffered and apply it as one batch
+                while (change := await stream.try_next()) is not None:
+                    changes.append(change)
+
+                upserts, deletes = [], []
+                for change in changes:
+                    if change["operationType"] == "delete":
+                        deletes.append(str(change["documentKey"]["_id"]))
+                    elif change.get("fullDocument"):
+                        upserts.append(change["fullDocument"])
+                await self.apply_changes(upserts, deletes)
+
+
+def _encode_watermark(value: Any) -> Any:
+    # Watermarks are usually datetimes; keep them JSON friendly
+    if hasattr(value, "isoformat"):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_watermark(value: Any) -> Any:
+    if isinstance(value, dict) and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+
+def _source_collection(collection_name: str):
+    return get_async_connection().get_database(monogo_vector_settings.MONGO_VECTORDATABASE_NAME)[collection_name]
+
+
+async def run_sync_loop(index: LocalVectorIndex) -> None:
+    """
+    Keep ``index`` fresh until cancelled.
+
+    The process holding the writer lock follows the collection, by change
+    stream or watermark polling; every other process reloads the files it
+    writes. A follower takes over once the writer exits.
+    """
+    collection = _source_collection(index.collection_name)
+    while True:
+        interval = vector_store_settings.LOCAL_INDEX_SYNC_INTERVAL_SECONDS
+        try:
+            if index.acquire_writer():
+                if vector_store_settings.LOCAL_INDEX_USE_CHANGE_STREAM:
+                    await index.follow_change_stream(collection)
+                else:
+                    await index.sync(collection)
+            else:
+                interval = vector_store_settings.LOCAL_INDEX_RELOAD_INTERVAL_SECONDS
+                if await asyncio.to_thread(index.reload):
+                    logger.info("Reloaded local vector snapshot written by another process", directory=index.directory)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Local vector index sync failed: {e}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.vectorstore.local_index [snapshot|sync] [collection_name]
+    command = sys.argv[1] if len(sys.argv) > 1 else "snapshot"
+    name = sys.argv[2] if len(sys.argv) > 2 else monogo_vector_settings.LABOR_LAW_COLLECTION_NAME
+    local_index = LocalVectorIndex(name)
+    if not local_index.acquire_writer():
+        print(f"Another process (e.g. the running app) is writing {local_index.directory}; stop it first")
+        sys.exit(1)
+
+    if command == "snapshot":
+        count = asyncio.run(local_index.snapshot(_source_collection(name)))
+    else:
+        count = asyncio.run(local_index.sync(_source_collection(name)))
+    print(f"{command}: {count} documents written to {local_index.directory}")
@@ -1,76 +1,374 @@
+import argparse
+import asyncio
+import json
 import sys
 sys.path.insert(0, "/home/mohamed-ayari/projects/youtube-chatbot/server")  # Adjust the path to import from app.llm.base
  
-from pymongo.operations import SearchIndexModel
+import numpy as np
+from pymongo.operations import SearchIndexModel, UpdateOne
 import time
 
-from src.core.config import monogo_vector_settings
-from src.core.mongo_client import connection
+from src.core.config import azure_embeddings_settings, monogo_vector_settings, vector_store_settings
+from src.core.mongo_client import get_async_connection, get_connection
 
 from src.vectorstore.base import BaseVectorStore
-from src.utils.embeddings import get_embedding_3_large_simple
+from src.utils.embeddings import aget_embedding_3_large_simple, aget_embeddings_3_large, get_embedding_3_large_simple
 from src.utils.logging import get_logger
+from src.utils.tracing import span
 
 
 logger = get_logger(__name__)
 
-_database = connection.get_database(monogo_vector_settings.MONGO_VECTORDATABASE_NAME)
-collection = _database[monogo_vector_settings.LABOR_LAW_COLLECTION_NAME]
+# Atlas rejects numCandidates above this
+MAX_NUM_CANDIDATES = 10000
+SEARCH_MODES = ("ann", "exact", "adaptive")
+
+
+def collection_name_for(law_type: str) -> str:
+    """Map a retriever law type to its vector collection name."""
+    if law_type == "youtube_data":
+        return monogo_vector_settings.LABOR_LAW_COLLECTION_NAME
+    elif law_type == "immigration_law":
+        return monogo_vector_settings.IMMIGRATION_LAW_COLLECTION_NAME
+    raise ValueError(f"Unknown law type: {law_type}")
+
 
 class MongoVectorRetriever(BaseVectorStore):
 
     def __init__(self, law_type) -> None:
-        self._client = connection.get_database(monogo_vector_settings.MONGO_VECTORDATABASE_NAME)
         self.law_type = law_type
+
+    # Resolved on use, so the request path never opens the sync client
+    @property
+    def _client(self):
+        return get_connection().get_database(monogo_vector_settings.MONGO_VECTORDATABASE_NAME)
+
+    @property
+    def _async_client(self):
+        return get_async_connection().get_database(monogo_vector_settings.MONGO_VECTORDATABASE_NAME)
+
+    def _collection_name(self) -> str:
+        collection_name = collection_name_for(self.law_type)
+        logger.info(f"Similarity Search on {collection_name} collection")
+        return collection_name
         
-    def search(self, query: str, k: int) -> list:
-        if self.law_type == "youtube_data":
-            logger.info("Similarity Search on  labor law collection")
-            collection = self._client[monogo_vector_settings.LABOR_LAW_COLLECTION_NAME]
-            
-        
-        elif self.law_type == "immigration_law":
-            logger.info("Similarity Search on  immigration law collection")
-            collection = self._client[monogo_vector_settings.IMMIGRATION_LAW_COLLECTION_NAME]
-            
-        return self._search_single_query(query, k, collection)
-        
-    
-    def _search_single_query(self, question, k=2, collection=None):
-            query_vector = get_embedding_3_large_simple(question)
-            
-
-            pipeline = [
-                {
-                    "$vectorSearch": {
-                        "index": "vector_index",
-                        "queryVector": query_vector,
-                        "path": "embedding",
-                        "exact": True,
-                        "limit": k,
-                    }
-                }, {
-            "$project": {
-              "_id": 1,
-              "chunk_content": 1,
-              "score": { "$meta": "vectorSearchScore" }
-         }
-      }
-            ]
+    def search(self, query: str, k: int, num_candidates: int | None = None, mode: str | None = None) -> list:
+        collection = self._client[self._collection_name()]
+        return self._search_single_query(query, k, collection, num_candidates=num_candidates, mode=mode)
+
+    async def asearch(
+        self,
+        query: str,
+        k: int,
+        query_vector: np.ndarray | None = None,
+        num_candidates: int | None = None,
+        mode: str | None = None,
+    ) -> list:
+        """
+        Async similarity search backed by the shared motor client.
+
+        Neither the embedding call nor the aggregate blocks the event loop,
+        so several queries can be awaited concurrently with asyncio.gather.
+        Pass ``query_vector`` when the query was already embedded as part of a batch.
+
+        :param num_candidates: ANN candidate pool, defaults to the collection setting or ``k * MONGO_NUM_CANDIDATES_FACTOR``
+        :param mode: "ann", "exact" or "adaptive", defaults to MONGO_SEARCH_MODE
+        """
+        collection = self._async_client[self._collection_name()]
+        return await self._asearch_single_query(
+            query, k, collection, query_vector=query_vector, num_candidates=num_candidates, mode=mode
+        )
+
+    @span("vector_search", upstream="mongodb")
+    async def asearch_many(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        num_candidates: int | None = None,
+        mode: str | None = None,
+    ) -> list:
+        """
+        Search several query vectors in a single aggregate (one round trip).
+
+        The first query runs as the main ``$vectorSearch``, the others as
+        ``$unionWith`` branches; hits are tagged with their query index and
+        grouped by ``_id`` on the server.
+
+        :param query_vectors: One embedding per query
+        :return: ``{_id, chunk_content, score, hits}`` dicts sorted by best score, where ``hits``
+            lists ``{query_index, score}`` for every query that matched the document
+        """
+        if len(query_vectors) == 0:
+            return []
+        collection_name = self._collection_name()
+        collection = self._async_client[collection_name]
+        mode = self._search_mode(mode)
+        candidates = None if mode == "exact" else self._num_candidates(k, num_candidates)
+
+        pipeline = self._build_union_pipeline(collection_name, query_vectors, k, candidates)
+        results = await collection.aggregate(pipeline).to_list(length=None)
+        if mode == "adaptive" and self._any_needs_widening(results, len(query_vectors), k, candidates):
+            candidates = min(candidates * vector_store_settings.MONGO_ADAPTIVE_WIDEN_FACTOR, MAX_NUM_CANDIDATES)
+            pipeline = self._build_union_pipeline(collection_name, query_vectors, k, candidates)
+            results = await collection.aggregate(pipeline).to_list(length=None)
+        logger.info(
+            "All documents retrieved successfully from MongoVectorDB.",
+            queries=len(query_vectors), num_documents=len(results), mode=mode, num_candidates=candidates,
+        )
+
+        return results
+
+    def _num_candidates(self, k: int, num_candidates: int | None = None) -> int:
+        if num_candidates is None:
+            num_candidates = vector_store_settings.MONGO_NUM_CANDIDATES_BY_COLLECTION.get(
+                collection_name_for(self.law_type), k * vector_store_settings.MONGO_NUM_CANDIDATES_FACTOR
+            )
+        return min(max(num_candidates, k), MAX_NUM_CANDIDATES)
+
+    @staticmethod
+    def _search_mode(mode: str | None) -> str:
+        mode = mode or vector_store_settings.MONGO_SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown vector search mode: {mode}")
+        return mode
+
+    @staticmethod
+    def _needs_widening(results: list, k: int, num_candidates: int) -> bool:
+        """Adaptive mode: widen when the best match is weak or the top-k scores are flat."""
+        if num_candidates >= MAX_NUM_CANDIDATES:
+            return False
+        if len(results) < k:
+            return True
+        top, last = results[0]["score"], results[-1]["score"]
+        return (
+            top < vector_store_settings.MONGO_ADAPTIVE_MIN_TOP_SCORE
+            or top - last < vector_store_settings.MONGO_ADAPTIVE_MIN_SCORE_SPREAD
+        )
 
-            cursor = collection.aggregate(pipeline)
+    @classmethod
+    def _any_needs_widening(cls, grouped: list, n_queries: int, k: int, num_candidates: int) -> bool:
+        per_query = [[] for _ in range(n_queries)]
+        for doc in grouped:
+            for hit in doc["hits"]:
+                per_query[hit["query_index"]].append(hit)
+        return any(
+            cls._needs_widening(sorted(hits, key=lambda hit: hit["score"], reverse=True), k, num_candidates)
+            for hits in per_query
+        )
 
-            results = []
-            for doc in cursor:
+    @staticmethod
+    def _build_pipeline(query_vector, k: int, num_candidates: int | None = None) -> list:
+        """
+        :param num_candidates: ANN candidate pool; ``None`` runs an exact (ENN) scan
+        """
+        vector_search = {
+            "index": vector_store_settings.MONGO_VECTOR_INDEX_NAME,
+            # BSON has no float32 array type, so convert at the boundary
+            "queryVector": np.asarray(query_vector, dtype=np.float32).tolist(),
+            "path": vector_store_settings.MONGO_EMBEDDING_PATH,
+            "limit": k,
+        }
+        if num_candidates is None:
+            vector_search["exact"] = True
+        else:
+            vector_search["numCandidates"] = num_candidates
 
-                results.append(doc)
-            logger.info("All documents retrieved successfully from MongoVectorDB.", num_documents=len(results))
+        return [
+            {"$vectorSearch": vector_search},
+            {
+                "$project": {
+                    "_id": 1,
+                    "chunk_content": 1,
+                    "score": {"$meta": "vectorSearchScore"},
+                }
+            },
+        ]
+
+    @classmethod
+    def _build_union_pipeline(cls, collection_name: str, query_vectors, k: int, num_candidates: int | None = None) -> list:
+        def branch(query_index, query_vector):
+            stages = cls._build_pipeline(query_vector, k, num_candidates)
+            stages[-1]["$project"]["query_index"] = {"$literal": query_index}
+            return stages
+
+        pipeline = branch(0, query_vectors[0])
+        for query_index in range(1, len(query_vectors)):
+            pipeline.append({"$unionWith": {"coll": collection_name, "pipeline": branch(query_index, query_vectors[query_index])}})
+        pipeline.extend([
+            {
+                "$group": {
+                    "_id": "$_id",
+                    "chunk_content": {"$first": "$chunk_content"},
+                    "score": {"$max": "$score"},
+                    "hits": {"$push": {"query_index": "$query_index", "score": "$score"}},
+                }
+            },
+            {"$sort": {"score": -1}},
+        ])
+        return pipeline
+
+    def _search_single_query(self, question, k=2, collection=None, num_candidates=None, mode=None):
+            query_vector = get_embedding_3_large_simple(question)
+            mode = self._search_mode(mode)
+            candidates = None if mode == "exact" else self._num_candidates(k, num_candidates)
+
+            with span("vector_search", upstream="mongodb"):
+                results = list(collection.aggregate(self._build_pipeline(query_vector, k, candidates)))
+                if mode == "adaptive" and self._needs_widening(results, k, candidates):
+                    candidates = min(candidates * vector_store_settings.MONGO_ADAPTIVE_WIDEN_FACTOR, MAX_NUM_CANDIDATES)
+                    results = list(collection.aggregate(self._build_pipeline(query_vector, k, candidates)))
+            logger.info(
+                "All documents retrieved successfully from MongoVectorDB.",
+                num_documents=len(results), mode=mode, num_candidates=candidates,
+            )
 
             return results
+
+    async def _asearch_single_query(self, question, k=2, collection=None, query_vector=None, num_candidates=None, mode=None):
+        if query_vector is None:
+            query_vector = await aget_embedding_3_large_simple(question)
+        mode = self._search_mode(mode)
+        candidates = None if mode == "exact" else self._num_candidates(k, num_candidates)
+
+        with span("vector_search", upstream="mongodb"):
+            results = await collection.aggregate(self._build_pipeline(query_vector, k, candidates)).to_list(length=None)
+            if mode == "adaptive" and self._needs_widening(results, k, candidates):
+                candidates = min(candidates * vector_store_settings.MONGO_ADAPTIVE_WIDEN_FACTOR, MAX_NUM_CANDIDATES)
+                results = await collection.aggregate(self._build_pipeline(query_vector, k, candidates)).to_list(length=None)
+        logger.info(
+            "All documents retrieved successfully from MongoVectorDB.",
+            num_documents=len(results), mode=mode, num_candidates=candidates,
+        )
+
+        return results
+
+    def create_vector_index(self, dimensions: int | None = None, path: str | None = None, name: str | None = None):
+        """
+        Create the Atlas vector search index for the configured embedding size.
+
+        :param dimensions: Vector size, defaults to EMBEDDING_DIMENSIONS
+        :param path: Field holding the vectors, defaults to MONGO_EMBEDDING_PATH
+        :param name: Index name, defaults to MONGO_VECTOR_INDEX_NAME
+        """
+        collection = self._client[self._collection_name()]
+        model = SearchIndexModel(
+            definition={
+                "fields": [
+                    {
+                        "type": "vector",
+                        "path": path or vector_store_settings.MONGO_EMBEDDING_PATH,
+                        "numDimensions": dimensions or azure_embeddings_settings.EMBEDDING_DIMENSIONS,
+                        "similarity": "cosine",
+                    }
+                ]
+            },
+            name=name or vector_store_settings.MONGO_VECTOR_INDEX_NAME,
+            type="vectorSearch",
+        )
+        result = collection.create_search_index(model=model)
+        logger.info("Vector search index created", index=result, dimensions=dimensions, path=path)
+        return result
+
+    def backfill_reduced_embeddings(self, dimensions: int, batch_size: int = 500) -> int:
+        """
+        Store the renormalized ``dimensions``-long prefix of every full embedding
+        in ``embedding_<dimensions>``, so Atlas can index the reduced vectors.
+
+        :return: Number of documents updated
+        """
+        collection = self._client[self._collection_name()]
+        field = f"embedding_{dimensions}"
+        updated = 0
+        batch = []
+        cursor = collection.find({field: {"$exists": False}, "embedding": {"$exists": True}}, {"embedding": 1})
+        for doc in cursor:
+            prefix = np.asarray(doc["embedding"][:dimensions], dtype=np.float32)
+            prefix /= max(float(np.linalg.norm(prefix)), 1e-12)
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field: prefix.tolist()}}))
+            if len(batch) >= batch_size:
+                updated += collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+        logger.info("Reduced embeddings backfilled", field=field, updated=updated)
+        return updated
         
+def ann_recall_report(
+    retriever: MongoVectorRetriever,
+    query_vectors: np.ndarray,
+    k: int = 10,
+    candidate_pools: list = (50, 100, 200, 400, 800),
+) -> list:
+    """
+    Compare ANN recall@k and latency against an exact scan for several numCandidates.
+
+    :param query_vectors: Sample of query embeddings, one per row
+    :return: One row per operating point, exact first
+    """
+    collection = retriever._client[collection_name_for(retriever.law_type)]
+
+    def run(num_candidates):
+        ids, started = [], time.perf_counter()
+        for vector in query_vectors:
+            ids.append({doc["_id"] for doc in collection.aggregate(retriever._build_pipeline(vector, k, num_candidates))})
+        return ids, (time.perf_counter() - started) * 1000 / len(query_vectors)
+
+    exact_ids, exact_ms = run(None)
+    rows = [{"num_candidates": "exact", "recall_at_k": 1.0, "ms_per_query": round(exact_ms, 2)}]
+    for num_candidates in candidate_pools:
+        ann_ids, ann_ms = run(min(max(num_candidates, k), MAX_NUM_CANDIDATES))
+        hits = sum(len(a & e) for a, e in zip(ann_ids, exact_ids))
+        total = sum(len(e) for e in exact_ids)
+        rows.append({
+            "num_candidates": num_candidates,
+            "recall_at_k": round(hits / total, 4) if total else 0.0,
+            "ms_per_query": round(ann_ms, 2),
+        })
+    return rows
+
+
+def _sample_query_vectors(retriever: MongoVectorRetriever, questions_path: str | None, n: int) -> np.ndarray:
+    """Embed questions from a file (one per line), or sample stored chunk embeddings."""
+    if questions_path:
+        with open(questions_path, "r") as file:
+            questions = [line.strip() for line in file if line.strip()][:n]
+        return asyncio.run(aget_embeddings_3_large(questions))
+
+    collection = retriever._client[collection_name_for(retriever.law_type)]
+    path = vector_store_settings.MONGO_EMBEDDING_PATH
+    docs = collection.aggregate([{"$sample": {"size": n}}, {"$project": {path: 1}}])
+    return np.asarray([doc[path] for doc in docs if doc.get(path)], dtype=np.float32)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Atlas vector search maintenance and tuning")
+    subcommands = parser.add_subparsers(dest="command")
+    backfill = subcommands.add_parser("backfill", help="Store reduced-dimension prefixes of the embeddings")
+    backfill.add_argument("dimensions", type=int)
+    create_index = subcommands.add_parser("create-index", help="Create a vectorSearch index")
+    create_index.add_argument("dimensions", type=int)
+    create_index.add_argument("path")
+    create_index.add_argument("name")
+    recall = subcommands.add_parser("recall", help="Report ANN recall@k against exact search")
+    recall.add_argument("--questions", help="File with one sample question per line; defaults to sampled chunks")
+    recall.add_argument("--queries", type=int, default=50)
+    recall.add_argument("--k", type=int, default=10)
+    recall.add_argument("--candidates", default="50,100,200,400,800", help="Comma-separated numCandidates values")
+    args = parser.parse_args()
 
     retriever = MongoVectorRetriever("youtube_data")
+    if args.command == "backfill":
+        print(retriever.backfill_reduced_embeddings(args.dimensions))
+        sys.exit(0)
+    if args.command == "create-index":
+        print(retriever.create_vector_index(args.dimensions, args.path, args.name))
+        sys.exit(0)
+    if args.command == "recall":
+        vectors = _sample_query_vectors(retriever, args.questions, args.queries)
+        pools = [int(value) for value in args.candidates.split(",")]
+        print(json.dumps(ann_recall_report(retriever, vectors, k=args.k, candidate_pools=pools), indent=2))
+        sys.exit(0)
+
     collection = retriever._client[monogo_vector_settings.LABOR_LAW_COLLECTION_NAME]
     doc_count = collection.count_documents({})
     print(f"Number of documents in labor_law_vectors collection: {doc_count}")
@@ -1,4 +1,6 @@
 
+import asyncio
+
 # from qdrant_client import models
 # from sentence_transformers.SentenceTransformer import SentenceTransformer
 
@@ -6,17 +8,17 @@ from qdrant_client import QdrantClient, models
 from qdrant_client.http.exceptions import UnexpectedResponse
 from qdrant_client.http.models import Batch, Distance, VectorParams
 
-from app.vectorstore.base import BaseVectorStore
+from src.vectorstore.base import BaseVectorStore, group_hits_by_id
 
-from app.utils.embeddings import get_embedding_3_large_simple
+from src.utils.embeddings import get_embedding_3_large_simple
 
-from app.utils.helpers import flatten
+from src.utils.helpers import flatten
 
-from app.utils.logging import get_logger
+from src.utils.logging import get_logger
 
 logger = get_logger(__name__)
 
-from app.core.config import qdrant_settings
+from src.core.config import azure_embeddings_settings, qdrant_settings
 
 
 
@@ -67,7 +69,8 @@ class QdrantDatabaseConnector:
         self._instance.create_collection(
             collection_name=collection_name,
             vectors_config=VectorParams(
-                size=qdrant_settings.EMBEDDING_SIZE, distance=Distance.COSINE
+                size=qdrant_settings.EMBEDDING_SIZE or azure_embeddings_settings.EMBEDDING_DIMENSIONS,
+                distance=Distance.COSINE,
             ),
         )
 
@@ -93,6 +96,22 @@ class QdrantDatabaseConnector:
             limit=limit,
         )
 
+    def search_batch(
+        self,
+        collection_name: str,
+        query_vectors: list,
+        query_filter: models.Filter | None = None,
+        limit: int = 3,
+    ) -> list:
+        """Search several vectors in one request; returns one hit list per vector."""
+        return self._instance.search_batch(
+            collection_name=collection_name,
+            requests=[
+                models.SearchRequest(vector=list(vector), filter=query_filter, limit=limit, with_payload=True)
+                for vector in query_vectors
+            ],
+        )
+
     def scroll(self, collection_name: str, limit: int):
         return self._instance.scroll(collection_name=collection_name, limit=limit)
 
@@ -122,26 +141,48 @@ class VectorRetriever(BaseVectorStore):
         
         query_vector = get_embedding_3_large_simple(query)
 
+        vectors = [
+            self._client.search(
+                collection_name=self._collection_name(),
+                query_vector=query_vector,
+                limit=k // 3,
+            )
+        ]
+
+        return flatten(vectors)
+
+    def _collection_name(self) -> str:
         if self.law_type == "labor_law":
-            vectors = [
-                self._client.search(
-                    collection_name="vector_labor_law_collection",
-                    query_vector=query_vector,
-                    limit=k // 3,
-                )
-            ]
+            return "vector_labor_law_collection"
         elif self.law_type == "immigration_law":
-            logger.info("This is immigration law collection") 
-            vectors = [
-                self._client.search(
-                    collection_name="vector_immigration_law_collection",
-                    query_vector=query_vector,
-                    limit=k // 3,
-                )
+            return "vector_immigration_law_collection"
+        raise ValueError(f"Unknown law type: {self.law_type}")
+
+    def search_many(self, query_vectors: list, k: int) -> list:
+        """
+        Search several query vectors with one batch request, grouped by point id.
+
+        Same result shape as ``MongoVectorRetriever.asearch_many``.
+        """
+        if len(query_vectors) == 0:
+            return []
+        batches = self._client.search_batch(
+            collection_name=self._collection_name(),
+            query_vectors=[[float(x) for x in vector] for vector in query_vectors],
+            limit=k,
+        )
+        grouped = group_hits_by_id([
+            [
+                {"_id": point.id, "chunk_content": (point.payload or {}).get("chunk_content", ""), "score": point.score}
+                for point in points
             ]
-        
+            for points in batches
+        ])
+        logger.info("All documents retrieved successfully.", queries=len(batches), num_documents=len(grouped))
+        return grouped
 
-        return flatten(vectors)
+    async def asearch_many(self, query_vectors: list, k: int, **kwargs) -> list:
+        return await asyncio.to_thread(self.search_many, query_vectors, k)
 
     def search(self, query: str, k: int) -> list:
         hits = self._search_single_query(query, k)
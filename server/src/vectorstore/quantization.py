@@ -0,0 +1,333 @@
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Rows scored per block, bounding the float32 temporaries created while scoring codes
+_BLOCK_ROWS = 16384
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension int8 scalar quantization.
+
+    Each dimension is mapped linearly from its trained ``[low, high]`` range
+    onto ``[-127, 127]``. Queries stay in float32 (asymmetric distance), so a
+    score is ``codes @ (q * scale) + offset @ q``.
+    """
+
+    method = "int8"
+
+    def __init__(self, low: Optional[np.ndarray] = None, high: Optional[np.ndarray] = None):
+        self.low = low
+        self.high = high
+
+    @property
+    def scale(self) -> np.ndarray:
+        return (self.high - self.low) / 254.0
+
+    @property
+    def offset(self) -> np.ndarray:
+        return (self.high + self.low) / 2.0
+
+    def fit(self, vectors: np.ndarray, clip_percentile: float = 0.1) -> "ScalarQuantizer":
+        self.low = np.percentile(vectors, clip_percentile, axis=0).astype(np.float32)
+        self.high = np.percentile(vectors, 100 - clip_percentile, axis=0).astype(np.float32)
+        self.high = np.maximum(self.high, self.low + 1e-6)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.offset) / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale + self.offset
+
+    def scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Approximate dot products, shape (n_codes, n_queries)."""
+        queries = np.atleast_2d(queries).astype(np.float32)
+        weights = (queries * self.scale).T
+        bias = queries @ self.offset
+        out = np.empty((codes.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], _BLOCK_ROWS):
+            block = codes[start:start + _BLOCK_ROWS]
+            out[start:start + len(block)] = block.astype(np.float32) @ weights + bias
+        return out
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return dim
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"low": self.low, "high": self.high}
+
+
+class ProductQuantizer:
+    """
+    Product quantization with ``m`` sub-spaces of 256 centroids each.
+
+    A vector is stored as ``m`` uint8 centroid ids. Search builds a per-query
+    lookup table of sub-space dot products and sums table entries per code
+    (asymmetric distance computation).
+    """
+
+    method = "pq"
+
+    def __init__(self, m: int = 96, centroids: Optional[np.ndarray] = None):
+        self.m = m
+        self.centroids = centroids  # (m, 256, dim // m)
+
+    def fit(self, vectors: np.ndarray, iterations: int = 20, sample: int = 50000, seed: int = 0) -> "ProductQuantizer":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        if dim % self.m:
+            raise ValueError(f"Dimension {dim} is not divisible by m={self.m}")
+        rng = np.random.default_rng(seed)
+        if n > sample:
+            vectors = vectors[rng.choice(n, sample, replace=False)]
+        sub = dim // self.m
+        centroids = np.empty((self.m, 256, sub), dtype=np.float32)
+        for j in range(self.m):
+            centroids[j] = _kmeans(vectors[:, j * sub:(j + 1) * sub], 256, iterations, rng)
+        self.centroids = centroids
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        sub = self.centroids.shape[2]
+        codes = np.empty((vectors.shape[0], self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _nearest(vectors[:, j * sub:(j + 1) * sub], self.centroids[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.centroids[j][codes[:, j]] for j in range(self.m)]
+        return np.concatenate(parts, axis=1)
+
+    def scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Approximate dot products via per-query lookup tables, shape (n_codes, n_queries)."""
+        queries = np.atleast_2d(queries).astype(np.float32)
+        sub = self.centroids.shape[2]
+        # (n_queries, m, 256) sub-space dot products
+        tables = np.einsum("qms,mks->qmk", queries.reshape(len(queries), self.m, sub), self.centroids)
+        out = np.empty((codes.shape[0], queries.shape[0]), dtype=np.float32)
+        subspaces = np.arange(self.m)
+        for start in range(0, codes.shape[0], _BLOCK_ROWS):
+            block = codes[start:start + _BLOCK_ROWS]
+            for column, table in enumerate(tables):
+                out[start:start + len(block), column] = table[subspaces, block].sum(axis=1)
+        return out
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return self.m
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids}
+
+
+class PrefixProjector:
+    """
+    Coarse stage over a Matryoshka prefix of the embedding.
+
+    text-embedding-3 vectors keep most of their ranking quality when truncated
+    to their first dimensions and renormalized, so the prefix serves as a cheap
+    float32 "code" for shortlisting before exact rescoring on full vectors.
+    """
+
+    method = "prefix"
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def fit(self, vectors: np.ndarray) -> "PrefixProjector":
+        return self
+
+    def _project(self, vectors: np.ndarray) -> np.ndarray:
+        prefix = np.asarray(vectors[:, :self.dimensions], dtype=np.float32)
+        norms = np.linalg.norm(prefix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return prefix / norms
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(self._project(np.atleast_2d(vectors)))
+
+    def scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        return codes @ self._project(np.atleast_2d(queries)).T
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return self.dimensions * 4
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"dimensions": np.array(self.dimensions)}
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # argmin ||v - c||^2 == argmin (||c||^2 - 2 v.c)
+    distances = (centroids ** 2).sum(axis=1) - 2.0 * vectors @ centroids.T
+    return np.argmin(distances, axis=1)
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    if len(vectors) < k:
+        # Not enough points: pad with jittered copies so every centroid id is valid
+        extra = vectors[rng.integers(0, len(vectors), k - len(vectors))]
+        vectors = np.vstack([vectors, extra + rng.normal(scale=1e-4, size=extra.shape).astype(np.float32)])
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest(vectors, centroids)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters from random points
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def save_quantizer(quantizer, path: str) -> None:
+    with open(path, "wb") as file:
+        np.savez(file, method=np.array(quantizer.method), m=np.array(getattr(quantizer, "m", 0)), **quantizer.state())
+
+
+def load_quantizer(path: str):
+    data = np.load(path)
+    method = str(data["method"])
+    if method == "int8":
+        return ScalarQuantizer(low=data["low"], high=data["high"])
+    if method == "pq":
+        return ProductQuantizer(m=int(data["m"]), centroids=data["centroids"])
+    if method == "prefix":
+        return PrefixProjector(int(data["dimensions"]))
+    raise ValueError(f"Unknown quantizer method in {path}: {method}")
+
+
+def shortlist_search(
+    quantizer,
+    codes: np.ndarray,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    rescore_factor: int = 10,
+    excluded: Optional[np.ndarray] = None,
+) -> List[tuple]:
+    """
+    Approximate search on codes, then exact rescoring of a shortlist.
+
+    :param vectors: Full-precision rows (typically a memmap); only shortlisted rows are read
+    :param excluded: Optional boolean mask of rows that must not be returned
+    :return: Per query, ``(rows, exact_scores)`` sorted best first
+    """
+    queries = np.atleast_2d(queries).astype(np.float32)
+    approx = quantizer.scores(codes, queries)
+    if excluded is not None:
+        approx[excluded] = -np.inf
+    available = len(codes) - (int(excluded.sum()) if excluded is not None else 0)
+    size = min(max(k * rescore_factor, k), available)
+    if size <= 0:
+        return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+
+    shortlist = np.argpartition(-approx, size - 1, axis=0)[:size]
+    results = []
+    for column, query in enumerate(queries):
+        rows = np.sort(shortlist[:, column])  # sorted rows read the memmap sequentially
+        exact = np.asarray(vectors[rows], dtype=np.float32) @ query
+        best = np.argsort(-exact)[:k]
+        results.append((rows[best], exact[best]))
+    return results
+
+
+def recall_memory_report(
+    vectors: np.ndarray,
+    k: int = 10,
+    n_queries: int = 200,
+    rescore_factor: int = 10,
+    pq_m: List[int] = (48, 96, 192),
+    prefix_dimensions: List[int] = (256, 512),
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Compare recall@k and memory of the quantizers against exact search.
+
+    Queries are rows sampled from ``vectors`` with a little noise added, so
+    they behave like paraphrases of indexed chunks.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    queries = vectors[rng.choice(n, min(n_queries, n), replace=False)]
+    queries = queries + rng.normal(scale=0.01, size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact_top = np.argsort(-(vectors @ queries.T), axis=0)[:k].T
+    candidates = [("float32", None)]
+    candidates.append(("int8", ScalarQuantizer().fit(vectors)))
+    for m in pq_m:
+        if dim % m == 0:
+            candidates.append((f"pq{m}", ProductQuantizer(m=m).fit(vectors)))
+    for dimensions in prefix_dimensions:
+        if dimensions < dim:
+            candidates.append((f"prefix{dimensions}", PrefixProjector(dimensions)))
+
+    rows = []
+    for name, quantizer in candidates:
+        if quantizer is None:
+            rows.append({"method": name, "bytes_per_vector": dim * 4, "compression": 1.0,
+                         "recall_at_k_adc": 1.0, "recall_at_k_rescored": 1.0, "ms_per_query": None})
+            continue
+
+        codes = quantizer.encode(vectors)
+        approx_top = np.argsort(-quantizer.scores(codes, queries), axis=0)[:k].T
+        started = time.perf_counter()
+        rescored = shortlist_search(quantizer, codes, vectors, queries, k, rescore_factor)
+        elapsed = (time.perf_counter() - started) * 1000 / len(queries)
+
+        rows.append({
+            "method": name,
+            "bytes_per_vector": quantizer.bytes_per_vector(dim),
+            "compression": round(dim * 4 / quantizer.bytes_per_vector(dim), 1),
+            "recall_at_k_adc": _recall(exact_top, approx_top),
+            "recall_at_k_rescored": _recall(exact_top, [r for r, _ in rescored]),
+            "ms_per_query": round(elapsed, 3),
+        })
+    return rows
+
+
+def _recall(expected, found) -> float:
+    hits = sum(len(set(e.tolist()) & set(np.asarray(f).tolist())) for e, f in zip(expected, found))
+    return round(hits / sum(len(e) for e in expected), 4)
+
+
+if __name__ == "__main__":
+    from src.core.config import monogo_vector_settings
+    from src.vectorstore.local_index import LocalVectorIndex, QUANTIZER_FILE
+
+    parser = argparse.ArgumentParser(description="Train quantizers for the local vector index or report recall vs memory")
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("--collection", default=monogo_vector_settings.LABOR_LAW_COLLECTION_NAME)
+    parser.add_argument("--method", choices=["int8", "pq"], default="pq")
+    parser.add_argument("--m", type=int, default=96, help="PQ sub-spaces")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    index = LocalVectorIndex(args.collection)
+    if not index.load():
+        print("No local snapshot; run `python -m src.vectorstore.local_index snapshot` first")
+        sys.exit(1)
+    live = np.asarray(index.live_vectors())
+
+    if args.command == "train":
+        trained = ScalarQuantizer().fit(live) if args.method == "int8" else ProductQuantizer(m=args.m).fit(live)
+        index.set_quantizer(trained)
+        print(f"Trained {args.method} quantizer on {len(live)} vectors, saved to {index.directory}/{QUANTIZER_FILE}")
+    else:
+        print(json.dumps(recall_memory_report(live, k=args.k, n_queries=args.queries), indent=2))
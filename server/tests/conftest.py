@@ -0,0 +1,89 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.corpus import HashingEmbedder, make_chunks
+from benchmarks.fake_openai import LatencyDistribution, UpstreamProfile, create_app
+from benchmarks.memory_store import InMemoryVectorStore
+from benchmarks.transport import StreamingASGITransport
+
+FAKE_UPSTREAM_URL = "http://fake-openai.local"
+
+
+class AnswerApi:
+    """The app wired to the benchmark stand-ins: a fake Azure OpenAI and an in-memory vector store."""
+
+    def __init__(self, app, upstream):
+        self.app = app
+        self.upstream = upstream
+
+    def run(self, scenario):
+        """Run ``scenario(client)`` against the app in a fresh event loop."""
+        from src.core.clients import clients
+        from src.utils.embeddings import embedding_batcher
+
+        async def main():
+            try:
+                async with httpx.AsyncClient(
+                    transport=StreamingASGITransport(self.app), base_url="http://app.local", timeout=10
+                ) as client:
+                    return await scenario(client)
+            finally:
+                # The pooled clients are bound to this loop
+                if embedding_batcher is not None:
+                    await embedding_batcher.close()
+                await clients.aclose()
+
+        return asyncio.run(main())
+
+
+@pytest.fixture
+def answer_api(monkeypatch):
+    """
+    Build an ``AnswerApi`` whose upstream behaves as the given ``UpstreamProfile`` fields say.
+
+    The conversation store, embedding cache and answer cache are switched
+    off, so nothing leaves the process and requests don't share state.
+    """
+    from src.core import resilience
+    from src.core.clients import AZURE_EMBEDDINGS, AZURE_OPENAI, clients
+    from src.core.config import azure_embeddings_settings, llm_settings
+    from src.main import app
+    from src.routers import answer
+    from src.services import naive_rag
+    from src.utils import embeddings
+    from src.vectorstore import factory
+
+    monkeypatch.setattr(llm_settings, "AZURE_OPENAI_ENDPOINT", FAKE_UPSTREAM_URL)
+    monkeypatch.setattr(azure_embeddings_settings, "AZURE_EMBDEDDINGS_ENDPOINT", FAKE_UPSTREAM_URL)
+    monkeypatch.setattr(answer, "conversation_store", None)
+    monkeypatch.setattr(answer, "token_quota", None)
+    monkeypatch.setattr(naive_rag, "answer_cache", None)
+    monkeypatch.setattr(embeddings, "embedding_cache", None)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    # Constructing an OpenAILLM elsewhere opens the shared clients; they must be closed to mount transports
+    asyncio.run(clients.aclose())
+    monkeypatch.setattr(clients, "_transports", {})
+
+    def build(**profile):
+        dimensions = azure_embeddings_settings.EMBEDDING_DIMENSIONS
+        upstream = create_app(UpstreamProfile(**{
+            "chat_ttft": LatencyDistribution(5, 10),
+            "tokens_per_second": 2000,
+            "answer_tokens": 20,
+            "embedding_latency": LatencyDistribution(1, 2),
+            "dimensions": dimensions,
+            **profile,
+        }))
+        transport = StreamingASGITransport(upstream)
+        clients.mount(AZURE_OPENAI, transport)
+        clients.mount(AZURE_EMBEDDINGS, transport)
+
+        chunks = make_chunks(50, seed=1)
+        monkeypatch.setitem(
+            factory._overrides, "youtube_data", InMemoryVectorStore(chunks, HashingEmbedder(dimensions).embed(chunks))
+        )
+        return AnswerApi(app, upstream)
+
+    return build
@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from src.routers import answer
+from src.services.naive_rag import NaiveRAG
+
+QUESTION = {"question": "What is the main topic of the video?", "chunks": "2", "token_limit": 4000}
+
+
+def _events(body):
+    """Parse a Server-Sent Events body into ``(event, data)`` pairs."""
+    events = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_answers_come_with_sources_usage_and_timing(answer_api):
+    api = answer_api()
+    response = api.run(lambda client: client.post("/api/answer", json=QUESTION))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["answer"].split()) == 20
+    assert body["sources"] and {"title", "text", "source"} <= set(body["sources"][0])
+    assert body["usage"]["completion_tokens"] > 0 and body["usage"]["llm_calls"] == 2
+    assert "llm;dur=" in response.headers["server-timing"]
+    # One planner call and one answer
+    assert api.upstream.state.stats["chat"] == 2
+
+
+def test_streamed_answers_send_sources_tokens_then_the_end(answer_api):
+    api = answer_api()
+
+    async def scenario(client):
+        async with client.stream("POST", "/api/answer/stream", json=QUESTION) as response:
+            return response.status_code, await response.aread()
+
+    status, body = api.run(scenario)
+    events = _events(body.decode())
+    names = [name for name, _ in events]
+
+    assert status == 200
+    assert names[0] == "sources" and names[-1] == "end" and set(names[1:-1]) == {"token"}
+    assert len("".join(data["content"] for name, data in events if name == "token").split()) == 20
+    end = events[-1][1]
+    assert end["request_usage"]["completion_tokens"] > 0
+    assert "llm" in end["timing"]["stages_ms"]
+
+
+class RecordingQuota:
+    def __init__(self):
+        self.admitted, self.charged = [], []
+
+    def admit(self, user_id):
+        self.admitted.append(user_id)
+
+    def charge(self, user_id, input_tokens, output_tokens):
+        self.charged.append((user_id, input_tokens, output_tokens))
+
+
+def test_coalesced_requests_share_one_answer_and_one_charge(answer_api, monkeypatch):
+    quota = RecordingQuota()
+    monkeypatch.setattr(answer, "token_quota", quota)
+    api = answer_api()
+
+    async def scenario(client):
+        return await asyncio.gather(*[client.post("/api/answer", json=QUESTION) for _ in range(5)])
+
+    responses = api.run(scenario)
+    assert [response.status_code for response in responses] == [200] * 5
+    assert len({response.json()["answer"] for response in responses}) == 1
+    assert api.upstream.state.stats["chat"] == 2
+    assert len(quota.admitted) == 5 and len(quota.charged) == 1
+
+
+def test_coalesced_streams_are_charged_once(answer_api, monkeypatch):
+    quota = RecordingQuota()
+    monkeypatch.setattr(answer, "token_quota", quota)
+    api = answer_api()
+
+    async def listen(client):
+        async with client.stream("POST", "/api/answer/stream", json=QUESTION) as response:
+            return _events((await response.aread()).decode())[-1][0]
+
+    async def scenario(client):
+        return await asyncio.gather(*[listen(client) for _ in range(4)])
+
+    assert api.run(scenario) == ["end"] * 4
+    assert api.upstream.state.stats["chat_stream"] == 1
+    assert len(quota.charged) == 1 and quota.charged[0][2] > 0
+
+
+def test_sse_frames_carry_an_event_name_and_json_data():
+    assert answer._sse_event("token", {"content": "héllo"}) == 'event: token\ndata: {"content": "héllo"}\n\n'
+
+
+def test_a_failing_stream_ends_with_an_error_event(answer_api, monkeypatch):
+    async def astream(self):
+        yield {"type": "sources", "sources": []}
+        yield {"type": "token", "content": "Partial"}
+        raise RuntimeError("vector store went away")
+
+    monkeypatch.setattr(NaiveRAG, "astream", astream)
+    api = answer_api()
+
+    async def scenario(client):
+        async with client.stream("POST", "/api/answer/stream", json=QUESTION) as response:
+            return _events((await response.aread()).decode())
+
+    events = api.run(scenario)
+    assert [name for name, _ in events] == ["sources", "token", "error"]
+    assert events[-1][1] == {"error": "Internal server error", "message": "vector store went away"}
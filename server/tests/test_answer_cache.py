@@ -0,0 +1,68 @@
+import numpy as np
+
+from src.services import answer_cache as answer_cache_module
+from src.services.answer_cache import SemanticAnswerCache
+
+
+def _unit(*components):
+    vector = np.asarray(components, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hit_on_a_close_question_and_miss_on_a_different_one():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store(_unit(1, 0, 0), "What is Mars?", "A planet.", [{"source": "a"}])
+
+    assert cache.lookup(_unit(1, 0.1, 0)) == ("A planet.", [{"source": "a"}])
+    assert cache.lookup(_unit(0, 1, 0)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_cached_docs_cannot_be_mutated_by_callers():
+    cache = SemanticAnswerCache()
+    docs = [{"source": "a"}]
+    cache.store(_unit(1, 0), "q", "answer", docs)
+    docs[0]["source"] = "changed"
+
+    _, cached_docs = cache.lookup(_unit(1, 0))
+    cached_docs[0]["source"] = "changed again"
+    assert cache.lookup(_unit(1, 0))[1] == [{"source": "a"}]
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(answer_cache_module.time, "monotonic", clock)
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    cache.store(_unit(1, 0), "q", "answer", [])
+
+    clock.now += 59
+    assert cache.lookup(_unit(1, 0)) is not None
+    clock.now += 2
+    assert cache.lookup(_unit(1, 0)) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_full_cache_overwrites_the_least_recently_used_entry(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(answer_cache_module.time, "monotonic", clock)
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store(_unit(1, 0, 0), "x", "x", [])
+    clock.now += 1
+    cache.store(_unit(0, 1, 0), "y", "y", [])
+    clock.now += 1
+    cache.lookup(_unit(1, 0, 0))  # "x" is now more recent than "y"
+    clock.now += 1
+    cache.store(_unit(0, 0, 1), "z", "z", [])
+
+    assert cache.lookup(_unit(1, 0, 0))[0] == "x"
+    assert cache.lookup(_unit(0, 1, 0)) is None
+    assert cache.lookup(_unit(0, 0, 1))[0] == "z"
+    assert cache.stats()["evictions"] == 1
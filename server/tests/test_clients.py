@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.core.clients import AZURE_EMBEDDINGS, AZURE_OPENAI, ClientRegistry
+
+
+def test_clients_are_built_once_per_upstream():
+    registry = ClientRegistry()
+
+    assert registry.http(AZURE_OPENAI) is registry.http(AZURE_OPENAI)
+    assert registry.http(AZURE_OPENAI) is not registry.http(AZURE_EMBEDDINGS)
+    assert registry.async_openai() is registry.async_openai()
+    assert registry.async_embeddings("small") is not registry.async_embeddings("large")
+    asyncio.run(registry.aclose())
+
+
+def test_sdk_clients_share_the_pooled_connections():
+    registry = ClientRegistry()
+
+    assert registry.async_openai()._client is registry.http(AZURE_OPENAI)
+    assert registry.async_embeddings()._client is registry.http(AZURE_EMBEDDINGS)
+    assert registry.embeddings()._client is registry.sync_http(AZURE_EMBEDDINGS)
+    # Retries are left to the resilience layer
+    assert registry.async_openai().max_retries == 0
+    asyncio.run(registry.aclose())
+
+
+def test_mounted_transports_carry_the_traffic_and_count_it():
+    registry = ClientRegistry()
+    registry.mount(AZURE_OPENAI, httpx.MockTransport(lambda request: httpx.Response(200, json={"ok": True})))
+
+    async def scenario():
+        client = registry.http(AZURE_OPENAI)
+        responses = [await client.get("https://upstream.test/ping") for _ in range(3)]
+        await registry.aclose()
+        return responses
+
+    assert [response.json() for response in asyncio.run(scenario())] == [{"ok": True}] * 3
+    stats = registry.stats()[AZURE_OPENAI]
+    assert stats["requests"] == 3 and stats["http2_requests"] == 0
+
+
+def test_transports_cannot_be_swapped_under_an_open_client():
+    registry = ClientRegistry()
+    registry.http(AZURE_OPENAI)
+    with pytest.raises(RuntimeError, match="already open"):
+        registry.mount(AZURE_OPENAI, httpx.MockTransport(lambda request: httpx.Response(200)))
+    asyncio.run(registry.aclose())
+
+
+def test_closing_forgets_every_client():
+    registry = ClientRegistry()
+    first = registry.http(AZURE_OPENAI)
+    registry.async_openai()
+    asyncio.run(registry.aclose())
+
+    assert first.is_closed
+    assert registry.http(AZURE_OPENAI) is not first
+    asyncio.run(registry.aclose())
+
+
+def test_connection_stats_are_exported_for_prometheus():
+    registry = ClientRegistry()
+    registry.mount(AZURE_OPENAI, httpx.MockTransport(lambda request: httpx.Response(200)))
+
+    async def scenario():
+        client = registry.http(AZURE_OPENAI)
+        for _ in range(2):
+            await client.get("https://upstream.test/ping")
+        await registry.aclose()
+
+    asyncio.run(scenario())
+    lines = registry.metrics()
+
+    assert "# TYPE http_client_requests_total counter" in lines
+    assert 'http_client_requests_total{upstream="azure_openai"} 2' in lines
+    assert 'http_client_connections_opened_total{upstream="azure_openai"} 0' in lines
+    assert "# TYPE http_client_connection_reuse_ratio gauge" in lines
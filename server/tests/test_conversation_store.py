@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+from pymongo.errors import PyMongoError
+from starlette.requests import Request
+
+from src.core.config import token_settings
+from src.routers import answer
+from src.schemas.answer import AnswerRequest
+from src.services.conversation_store import ConversationStore
+
+
+class FakeConversations:
+    """Applies the store's ``$push``/``$set`` upserts to in-memory documents."""
+
+    def __init__(self):
+        self.docs = {}
+        self.bulk_writes = 0
+        self.fail = False
+
+    async def find_one(self, query, projection=None):
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            return None
+        return {**doc, "turns": doc["turns"][projection["turns"]["$slice"]:]}
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.fail:
+            raise PyMongoError("connection reset")
+        self.bulk_writes += 1
+        for operation in operations:
+            update = operation._doc
+            doc = self.docs.setdefault(operation._filter["_id"], {"turns": [], **update["$setOnInsert"]})
+            push = update["$push"]["turns"]
+            doc["turns"] = (doc["turns"] + push["$each"])[push["$slice"]:]
+            doc.update(update["$set"])
+
+
+@pytest.fixture
+def conversations(monkeypatch):
+    collection = FakeConversations()
+    monkeypatch.setattr(ConversationStore, "_collection", staticmethod(lambda: collection))
+    return collection
+
+
+def _turns(collection, conversation_id):
+    return [(turn["prompt"], turn["response"]) for turn in collection.docs[conversation_id]["turns"]]
+
+
+def test_turns_are_served_from_memory_and_written_behind(conversations):
+    store = ConversationStore()
+    assert asyncio.run(store.get_history("c1")) == []
+    store.append_turn("c1", "hi", "hello")
+    store.append_turn("c1", "why?", "because")
+    store.append_turn("c2", "q", "a")
+
+    assert asyncio.run(store.get_history("c1")) == [("hi", "hello"), ("why?", "because")]
+    assert store.stats()["memory_hits"] == 1 and store.stats()["loads"] == 1
+    assert conversations.docs == {} and store.stats()["pending_turns"] == 3
+
+    assert asyncio.run(store.flush()) == 3
+    assert conversations.bulk_writes == 1
+    assert _turns(conversations, "c1") == [("hi", "hello"), ("why?", "because")]
+    assert store.stats()["pending_turns"] == 0 and store.stats()["turns_written"] == 3
+    assert asyncio.run(store.flush()) == 0
+
+
+def test_evicted_conversations_are_loaded_back_with_their_queued_turns(conversations):
+    store = ConversationStore(max_conversations=1, history_turns=3)
+    asyncio.run(store.get_history("c1"))
+    for i in range(4):
+        store.append_turn("c1", f"q{i}", f"a{i}")
+    asyncio.run(store.flush())
+    store.append_turn("c1", "q4", "a4")
+    asyncio.run(store.get_history("c2"))  # evicts c1
+
+    assert store.stats()["evictions"] == 1
+    # The last stored turns, followed by the one not flushed yet
+    assert asyncio.run(store.get_history("c1")) == [("q2", "a2"), ("q3", "a3"), ("q4", "a4")]
+    assert store.stats()["loads"] == 3
+
+
+def test_appending_to_an_uncached_conversation_keeps_its_stored_turns(conversations):
+    store = ConversationStore(max_conversations=1)
+    asyncio.run(store.get_history("c1"))
+    store.append_turn("c1", "q0", "a0")
+    store.append_turn("c1", "q1", "a1")
+    asyncio.run(store.flush())
+    asyncio.run(store.get_history("c2"))  # evicts c1
+
+    store.append_turn("c1", "q2", "a2")
+
+    assert store.stats()["conversations"] == 1
+    assert asyncio.run(store.get_history("c1")) == [("q0", "a0"), ("q1", "a1"), ("q2", "a2")]
+
+
+def test_unknown_conversations_have_no_history(conversations):
+    assert asyncio.run(ConversationStore().get_history("missing")) == []
+
+
+def test_stored_turns_are_capped(conversations):
+    store = ConversationStore(max_stored_turns=2)
+    for i in range(3):
+        store.append_turn("c1", f"q{i}", f"a{i}")
+    asyncio.run(store.flush())
+    assert _turns(conversations, "c1") == [("q1", "a1"), ("q2", "a2")]
+
+
+def test_failed_writes_are_retried_in_order(conversations):
+    store = ConversationStore()
+    store.append_turn("c1", "q0", "a0")
+    conversations.fail = True
+    assert asyncio.run(store.flush()) == 0
+    assert store.stats()["flush_errors"] == 1 and store.stats()["pending_turns"] == 1
+
+    store.append_turn("c1", "q1", "a1")
+    conversations.fail = False
+    assert asyncio.run(store.flush()) == 2
+    assert _turns(conversations, "c1") == [("q0", "a0"), ("q1", "a1")]
+
+
+def test_a_full_batch_wakes_the_flush_loop(conversations):
+    store = ConversationStore(flush_interval=60, flush_batch_size=2)
+
+    async def scenario():
+        loop = asyncio.create_task(store.run_flush_loop())
+        await asyncio.sleep(0)
+        store.append_turn("c1", "q0", "a0")
+        store.append_turn("c1", "q1", "a1")
+        for _ in range(10):
+            await asyncio.sleep(0)
+        loop.cancel()
+
+    asyncio.run(scenario())
+    assert _turns(conversations, "c1") == [("q0", "a0"), ("q1", "a1")]
+
+
+def _request(**headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "POST", "path": "/api/answer", "headers": raw, "client": ("203.0.113.9", 1234)})
+
+
+def test_stored_conversations_are_only_visible_to_their_owner(conversations, monkeypatch):
+    monkeypatch.setattr(answer, "conversation_store", ConversationStore())
+    monkeypatch.setattr(token_settings, "TOKEN_QUOTA_API_KEYS", {"key-1": "alice", "key-2": "bob"})
+    alice = answer._conversation_owner(_request(authorization="Bearer key-1"))
+    bob = answer._conversation_owner(_request(x_api_key="key-2"))
+    anonymous = answer._conversation_owner(_request())
+    follow_up = AnswerRequest(question="and then?", conversation_id="c1", chunks="3", token_limit=2000)
+
+    answer._remember_turn(alice, "c1", "who?", "the north")
+
+    assert asyncio.run(answer._resolve_history(follow_up, alice)) == ("c1", [("who?", "the north")])
+    assert asyncio.run(answer._resolve_history(follow_up, bob)) == ("c1", [])
+    assert asyncio.run(answer._resolve_history(follow_up, anonymous)) == ("c1", [])
+
+    answer._remember_turn(bob, "c1", "hijack", "attempt")
+    asyncio.run(answer.conversation_store.flush())
+    assert [turn["prompt"] for turn in conversations.docs["alice/c1"]["turns"]] == ["who?"]
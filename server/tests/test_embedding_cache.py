@@ -0,0 +1,104 @@
+import asyncio
+import os
+
+import numpy as np
+
+from src.utils import embeddings
+from src.utils.embedding_cache import EmbeddingCache, make_key, normalize_text
+
+
+def _vectors(n, dim=4):
+    return np.arange(n * dim, dtype=np.float32).reshape(n, dim)
+
+
+def test_keys_ignore_case_spacing_and_unicode_width():
+    assert normalize_text("  What IS\tthe  Sun? ") == "what is the sun?"
+    assert make_key("ＡＢＣ", "model") == make_key("abc", "model")
+    assert make_key("abc", "model", 256) != make_key("abc", "model")
+    assert make_key("abc", "model") != make_key("abc", "other-model")
+
+
+def test_memory_tier_is_a_bounded_lru():
+    cache = EmbeddingCache(max_memory_items=2)
+    cache.put_many(["a", "b"], "m", None, _vectors(2))
+    cache.get_many(["a"], "m")  # "a" is now the most recently used
+    cache.put_many(["c"], "m", None, _vectors(1))
+
+    a, b, c = cache.get_many(["a", "b", "c"], "m")
+    assert a is not None and b is None and c is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache" / "embeddings.sqlite3")
+    cache = EmbeddingCache(path=path)
+    cache.put_many(["a", "b"], "m", None, _vectors(2))
+    cache.close()
+
+    reopened = EmbeddingCache(path=path)
+    a, missing = reopened.get_many(["A ", "z"], "m")
+    np.testing.assert_array_equal(a, _vectors(2)[0])
+    assert missing is None
+    assert reopened.stats()["disk_hits"] == 1
+    # Promoted into memory on the way out
+    reopened.get_many(["a"], "m")
+    assert reopened.stats()["memory_hits"] == 1
+
+
+def test_database_is_opened_on_first_use(tmp_path):
+    path = tmp_path / "lazy" / "embeddings.sqlite3"
+    cache = EmbeddingCache(path=str(path))
+    assert not os.path.exists(path.parent)
+
+    cache.get_many(["a"], "m")
+    assert path.exists()
+
+
+def test_a_closed_cache_reopens_its_disk_tier_on_next_use(tmp_path):
+    cache = EmbeddingCache(max_memory_items=1, path=str(tmp_path / "embeddings.sqlite3"))
+    cache.put_many(["a"], "m", None, _vectors(1))
+    cache.close()
+
+    cache.put_many(["b"], "m", None, _vectors(1))  # evicts "a" from memory
+    a, b = cache.get_many(["a", "b"], "m")
+    assert a is not None and b is not None
+    assert cache.stats()["disk_hits"] == 1
+    cache.close()
+
+
+def test_async_tier_writes_behind_and_reads_back(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+
+    async def scenario():
+        cache = EmbeddingCache(path=path)
+        assert await cache.aget_many(["a"], "m") == [None]
+        cache.aput_many(["a"], "m", None, _vectors(1))
+        # Served from memory while the disk write is still pending
+        assert (await cache.aget_many(["a"], "m"))[0] is not None
+        await cache.aclose()
+        assert cache.stats()["writes"] == 1
+
+        reopened = EmbeddingCache(path=path)
+        return await reopened.aget_many(["a"], "m")
+
+    (vector,) = asyncio.run(scenario())
+    np.testing.assert_array_equal(vector, _vectors(1)[0])
+
+
+def test_cached_texts_are_not_embedded_again(monkeypatch):
+    calls = []
+
+    def embed_batch(texts):
+        calls.append(list(texts))
+        return _vectors(len(texts))
+
+    monkeypatch.setattr(embeddings, "_embed_batch", embed_batch)
+    monkeypatch.setattr(embeddings, "embedding_cache", EmbeddingCache())
+
+    first = embeddings.get_embeddings_3_large(["Sun", "moon", "sun "])
+    second = embeddings.get_embeddings_3_large(["moon", "stars"])
+
+    # Spellings that normalize alike are embedded once, cached texts never again
+    assert calls == [["Sun", "moon"], ["stars"]]
+    np.testing.assert_array_equal(first[0], first[2])
+    np.testing.assert_array_equal(second[0], first[1])
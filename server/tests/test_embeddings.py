@@ -0,0 +1,123 @@
+import asyncio
+import base64
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.utils import embeddings
+
+
+def _response(rows):
+    # Azure may return the items out of order; ``index`` ties them to the inputs
+    data = [
+        SimpleNamespace(index=index, embedding=base64.b64encode(np.asarray(row, dtype=np.float32).tobytes()).decode())
+        for index, row in rows
+    ]
+    return SimpleNamespace(data=data)
+
+
+def test_to_matrix_decodes_base64_rows_in_input_order():
+    matrix = embeddings._to_matrix(_response([(1, [3.0, 4.0]), (0, [1.0, 2.0])]))
+
+    assert matrix.dtype == np.float32
+    assert matrix.flags["C_CONTIGUOUS"]
+    np.testing.assert_array_equal(matrix, [[1.0, 2.0], [3.0, 4.0]])
+
+
+def test_to_matrix_of_empty_response():
+    assert embeddings._to_matrix(_response([])).shape == (0, 0)
+
+
+def test_empty_input_never_calls_the_api(monkeypatch):
+    def fail(texts):
+        raise AssertionError("embeddings API called for an empty batch")
+
+    monkeypatch.setattr(embeddings, "_embed_batch", fail)
+    assert embeddings.get_embeddings_3_large([]).shape == (0, 0)
+
+
+def test_one_request_for_the_whole_batch(monkeypatch):
+    calls = []
+
+    def embed_batch(texts):
+        calls.append(list(texts))
+        return np.arange(len(texts) * 2, dtype=np.float32).reshape(len(texts), 2)
+
+    monkeypatch.setattr(embeddings, "_embed_batch", embed_batch)
+    monkeypatch.setattr(embeddings, "embedding_cache", None)
+
+    matrix = embeddings.get_embeddings_3_large(["first", "second", "third"])
+
+    assert calls == [["first", "second", "third"]]
+    assert matrix.shape == (3, 2) and matrix.dtype == np.float32
+    np.testing.assert_array_equal(embeddings.get_embedding_3_large_simple("first"), [0.0, 1.0])
+
+
+@pytest.fixture
+def batched_calls(monkeypatch):
+    """Record every batched embeddings call; a text's vector is its length."""
+    calls = []
+
+    async def aembed_batch(texts):
+        calls.append(list(texts))
+        await asyncio.sleep(0.001)
+        if "boom" in texts:
+            raise RuntimeError("embeddings unavailable")
+        return np.array([[len(text)] for text in texts], dtype=np.float32)
+
+    monkeypatch.setattr(embeddings, "_aembed_batch", aembed_batch)
+    return calls
+
+
+def test_concurrent_calls_share_one_batch(batched_calls):
+    batcher = embeddings.EmbeddingBatcher(max_batch_size=16, max_wait_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(batcher.embed(["a", "bb"]), batcher.embed(["ccc"]), batcher.embed(["bb"]))
+
+    first, second, third = asyncio.run(scenario())
+    # Duplicates across callers are sent once
+    assert batched_calls == [["a", "bb", "ccc"]]
+    np.testing.assert_array_equal(first, [[1.0], [2.0]])
+    np.testing.assert_array_equal(second, [[3.0]])
+    np.testing.assert_array_equal(third, [[2.0]])
+    assert batcher.stats()["calls"] == 3 and batcher.stats()["batches"] == 1
+
+
+def test_a_full_queue_is_sent_without_waiting(batched_calls):
+    batcher = embeddings.EmbeddingBatcher(max_batch_size=2, max_wait_ms=10_000)
+
+    async def scenario():
+        return await asyncio.wait_for(batcher.embed(["a", "bb", "ccc"]), timeout=1)
+
+    np.testing.assert_array_equal(asyncio.run(scenario()), [[1.0], [2.0], [3.0]])
+    # Split into requests of at most max_batch_size texts
+    assert batched_calls == [["a", "bb"], ["ccc"]]
+
+
+def test_a_failed_batch_fails_only_its_callers(batched_calls):
+    batcher = embeddings.EmbeddingBatcher(max_batch_size=2, max_wait_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(
+            batcher.embed(["boom", "x"]), batcher.embed(["fine"]), return_exceptions=True
+        )
+
+    failed, fine = asyncio.run(scenario())
+    assert isinstance(failed, RuntimeError)
+    np.testing.assert_array_equal(fine, [[4.0]])
+    assert batcher.stats()["errors"] == 1
+
+
+def test_close_sends_what_is_still_queued(batched_calls):
+    batcher = embeddings.EmbeddingBatcher(max_batch_size=16, max_wait_ms=10_000)
+
+    async def scenario():
+        pending = asyncio.ensure_future(batcher.embed(["queued"]))
+        await asyncio.sleep(0)
+        await batcher.close()
+        return await pending
+
+    np.testing.assert_array_equal(asyncio.run(scenario()), [[6.0]])
+    assert batcher._tasks == set()
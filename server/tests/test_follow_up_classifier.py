@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import pytest
+
+from src.core.config import follow_up_classifier_settings
+from src.utils import follow_up_classifier
+from src.utils.follow_up_classifier import FEATURES, FollowUpClassifier, LabelLog, log_label, predict_follow_up
+
+HISTORY = ["What are the phases of the Moon?"]
+
+
+def test_anaphora_and_continuations_lean_follow_up():
+    model = FollowUpClassifier()
+    follow_up = model.predict_proba("And what about it?", HISTORY)
+    standalone = model.predict_proba("How long does Jupiter take to orbit the Sun in Earth years?", HISTORY)
+    assert follow_up > 0.5 > standalone
+
+
+def test_empty_history_is_always_standalone():
+    assert predict_follow_up("And what about it?", []) == (False, 0.0)
+
+
+def test_unsure_questions_are_left_to_the_planner(monkeypatch):
+    monkeypatch.setattr(follow_up_classifier_settings, "FOLLOW_UP_CONFIDENCE", 1.0)
+    follow_up, probability = predict_follow_up("And what about it?", HISTORY)
+    assert follow_up is None
+    # The probability comes along so callers don't predict again
+    assert probability == FollowUpClassifier().predict_proba("And what about it?", HISTORY)
+
+
+def test_fit_learns_logged_labels():
+    samples = [
+        {"question": "tell me more", "history": HISTORY, "label": True},
+        {"question": "and the next one?", "history": HISTORY, "label": True},
+        {"question": "what about that?", "history": HISTORY, "label": True},
+        {"question": "Which planets have rings in the Solar System?", "history": HISTORY, "label": False},
+        {"question": "How hot is the surface of Venus during the day?", "history": HISTORY, "label": False},
+        {"question": "Who discovered Neptune and in which year?", "history": HISTORY, "label": False},
+    ]
+    model = FollowUpClassifier.fit(samples)
+    for sample in samples:
+        assert (model.predict_proba(sample["question"], sample["history"]) >= 0.5) == sample["label"]
+
+
+def test_weights_round_trip_and_reject_other_feature_sets(tmp_path):
+    path = tmp_path / "weights.json"
+    model = FollowUpClassifier([0.1 * i for i in range(len(FEATURES))])
+    model.save(str(path))
+    assert FollowUpClassifier.load(str(path)).weights.tolist() == model.weights.tolist()
+
+    path.write_text(json.dumps({"features": FEATURES[:-1], "weights": [0.0] * (len(FEATURES) - 1)}))
+    with pytest.raises(ValueError):
+        FollowUpClassifier.load(str(path))
+
+
+def test_labels_are_buffered_and_appended_as_jsonl(tmp_path, monkeypatch):
+    path = tmp_path / "labels.jsonl"
+    monkeypatch.setattr(follow_up_classifier, "label_log", LabelLog(str(path)))
+    log_label("and then?", HISTORY, True, 0.61234)
+    log_label("Where is Mars?", HISTORY, False, 0.2)
+
+    assert not path.exists()
+    assert asyncio.run(follow_up_classifier.label_log.flush()) == 2
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert rows[0] == {"question": "and then?", "history": HISTORY, "label": True, "local_probability": 0.6123}
+    assert rows[1]["label"] is False
+
+
+def test_labels_are_kept_when_the_append_fails(tmp_path):
+    labels = LabelLog(str(tmp_path / "missing" / "labels.jsonl"))
+    labels.record("and then?", HISTORY, True, 0.6)
+
+    assert asyncio.run(labels.flush()) == 0
+    labels.path = str(tmp_path / "labels.jsonl")
+    assert asyncio.run(labels.flush()) == 1
+
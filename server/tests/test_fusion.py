@@ -0,0 +1,76 @@
+import pytest
+
+from src.utils.fusion import fuse_hits, remove_near_duplicates, simhash
+
+
+def _hits(*ids_and_scores):
+    return [{"_id": doc_id, "chunk_content": doc_id, "score": score} for doc_id, score in ids_and_scores]
+
+
+def test_rrf_favours_chunks_found_by_several_queries():
+    fused = fuse_hits([
+        _hits(("a", 0.99), ("b", 0.80)),
+        _hits(("b", 0.85), ("c", 0.84)),
+        _hits(("c", 0.83), ("b", 0.82)),
+    ], rrf_k=60)
+
+    assert [hit["_id"] for hit in fused] == ["b", "c", "a"]
+    assert fused[0]["fused_score"] == pytest.approx(2 / 62 + 1 / 61)
+    # The best vector score is kept for display and thresholds
+    assert fused[0]["score"] == 0.85
+
+
+def test_rrf_ignores_score_scales():
+    # The same ranks give the same order whatever the raw scores are
+    low = fuse_hits([_hits(("a", 0.2), ("b", 0.1)), _hits(("b", 0.3))])
+    high = fuse_hits([_hits(("a", 0.9), ("b", 0.8)), _hits(("b", 0.99))])
+    assert [hit["_id"] for hit in low] == [hit["_id"] for hit in high] == ["b", "a"]
+
+
+def test_max_fusion_keeps_the_best_vector_score():
+    fused = fuse_hits([_hits(("a", 0.99), ("b", 0.80)), _hits(("b", 0.85))], method="max")
+    assert [(hit["_id"], hit["fused_score"]) for hit in fused] == [("a", 0.99), ("b", 0.85)]
+
+
+def test_unknown_fusion_methods_are_rejected():
+    with pytest.raises(ValueError):
+        fuse_hits([], method="borda")
+
+
+TEXT = (
+    "The James Webb telescope observes the early universe in infrared light, "
+    "looking for the first galaxies that formed after the big bang."
+)
+
+
+def test_simhash_is_stable_under_case_and_spacing():
+    assert simhash(TEXT) == simhash("  " + TEXT.upper().replace(" ", "   "))
+    assert simhash("") == 0
+
+
+def test_near_duplicates_keep_the_better_ranked_chunk():
+    docs = [
+        {"id": 1, "text": TEXT},
+        {"id": 2, "text": TEXT + " Amazing."},
+        {"id": 3, "text": "Volcanoes on Io are driven by tidal heating from Jupiter and its other moons."},
+        {"id": 4, "text": "   "},
+    ]
+    assert [doc["id"] for doc in remove_near_duplicates(docs, threshold=0.8)] == [1, 3]
+
+
+def test_distinct_chunks_are_all_kept_up_to_top_k():
+    docs = [{"text": f"chunk number {i} about topic {i * 7} and nothing else {i * 13}"} for i in range(20)]
+    assert len(remove_near_duplicates(docs, threshold=0.95)) == 20
+    assert remove_near_duplicates(docs, threshold=0.95, top_k=5) == docs[:5]
+
+
+def test_band_lookup_matches_pairwise_comparison():
+    docs = [{"text": f"{TEXT} variant {i % 4}"} for i in range(12)] + [{"text": f"unrelated text {i} " * 5} for i in range(6)]
+    threshold = 0.85
+    max_distance = int((1 - threshold) * 64)
+
+    kept = []
+    for doc in docs:
+        if all(bin(simhash(doc["text"]) ^ simhash(other["text"])).count("1") > max_distance for other in kept):
+            kept.append(doc)
+    assert remove_near_duplicates(docs, threshold=threshold) == kept
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+from src.llm.azure_openai import OpenAILLM
+from src.llm.base import BaseLLM
+from src.llm.usage import current_request_usage, start_request_usage
+
+
+class BlockingLLM(BaseLLM):
+    """A provider with only a blocking client."""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def _raw_gen(self, messages, **kwargs):
+        self.threads.append(threading.current_thread())
+        self._record_usage({"prompt_tokens": 7, "completion_tokens": 3, "total_tokens": 10})
+        return f"echo: {messages[-1]['content']}"
+
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def test_blocking_providers_run_off_the_event_loop():
+    llm = BlockingLLM()
+
+    async def scenario():
+        usage = start_request_usage()
+        answers = await asyncio.gather(llm.agen(MESSAGES), llm.agen(MESSAGES))
+        return answers, usage.as_dict()
+
+    answers, usage = asyncio.run(scenario())
+    assert answers == ["echo: hello"] * 2
+    assert threading.main_thread() not in llm.threads
+    # Usage recorded in the worker threads still reaches the request
+    assert usage == {"prompt_tokens": 14, "completion_tokens": 6, "total_tokens": 20, "llm_calls": 2}
+    assert llm.token_usage == {"prompt_tokens": 14, "generated_tokens": 6}
+
+
+def test_blocking_providers_stream_their_whole_answer_at_once():
+    async def scenario():
+        return [chunk async for chunk in BlockingLLM().astream(MESSAGES)]
+
+    assert asyncio.run(scenario()) == ["echo: hello"]
+
+
+def test_usage_is_only_counted_inside_a_request():
+    BlockingLLM().gen(MESSAGES)
+    assert current_request_usage() is None
+
+
+def test_azure_completions_and_streams_report_usage(answer_api):
+    api = answer_api(answer_tokens=12, tokens_per_second=200)
+
+    async def scenario(client):
+        llm = OpenAILLM()
+        usage = start_request_usage()
+        answer = await llm.agen(messages=MESSAGES, model="chat")
+        chunks = [chunk async for chunk in llm.astream(messages=MESSAGES, model="chat")]
+        return answer, chunks, usage.as_dict()
+
+    answer, chunks, usage = api.run(scenario)
+    assert len(answer.split()) == 12
+    assert len(chunks) > 1 and len("".join(chunks).split()) == 12
+    assert usage["completion_tokens"] == 24 and usage["llm_calls"] == 2
+    assert api.upstream.state.stats["chat"] == 1 and api.upstream.state.stats["chat_stream"] == 1
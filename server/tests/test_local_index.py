@@ -0,0 +1,181 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.core.config import azure_embeddings_settings, vector_store_settings
+from src.vectorstore.local_index import LocalVectorIndex
+from src.vectorstore.quantization import PrefixProjector
+
+DIM = 16
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[field])
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.docs)
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        bound = query.get("updated_at", {}).get("$gt")
+        return FakeCursor([doc for doc in self.docs if bound is None or doc["updated_at"] > bound])
+
+
+def _doc(i, vector=None, updated_at=None):
+    if vector is None:
+        vector = np.random.default_rng(i).normal(size=DIM)
+    return {
+        "_id": f"doc{i}",
+        "chunk_content": f"chunk {i}",
+        "embedding": list(map(float, vector)),
+        "updated_at": i if updated_at is None else updated_at,
+    }
+
+
+def _axis(i):
+    vector = np.zeros(DIM)
+    vector[i] = 1.0
+    return vector
+
+
+@pytest.fixture(autouse=True)
+def exact_search(monkeypatch):
+    monkeypatch.setattr(vector_store_settings, "LOCAL_INDEX_COARSE_DIMENSIONS", 0)
+    monkeypatch.setattr(vector_store_settings, "LOCAL_INDEX_COMPACT_RATIO", 0.5)
+
+
+@pytest.fixture
+def writer(tmp_path):
+    index = LocalVectorIndex("chunks", str(tmp_path / "chunks"))
+    yield index
+    index._writer_lock.release()
+
+
+def _top(index, vector, k=1):
+    return [hit["_id"] for hit in index.search_vectors(vector, k)[0]]
+
+
+def test_snapshot_is_searchable_and_survives_a_reload(writer, tmp_path):
+    docs = [_doc(i, _axis(i)) for i in range(DIM)]
+    assert asyncio.run(writer.snapshot(FakeCollection(docs), batch_size=5)) == DIM
+
+    hit = writer.search_vectors(_axis(3) * 7, 1)[0][0]
+    assert hit == {"_id": "doc3", "chunk_content": "chunk 3", "score": pytest.approx(1.0)}
+    assert writer.watermark == DIM - 1
+
+    reader = LocalVectorIndex("chunks", str(tmp_path / "chunks"))
+    assert reader.load()
+    hits = reader.search_vectors(np.stack([_axis(1), _axis(2)]), 1)
+    assert [[hit["_id"] for hit in query_hits] for query_hits in hits] == [["doc1"], ["doc2"]]
+
+
+def test_changes_replace_and_tombstone_rows(writer):
+    asyncio.run(writer.snapshot(FakeCollection([_doc(i, _axis(i)) for i in range(10)])))
+
+    # doc2 now points along axis 12; doc4 is removed
+    asyncio.run(writer.apply_changes([_doc(2, _axis(12), updated_at=20)], ["doc4"], watermark=20))
+
+    assert _top(writer, _axis(12)) == ["doc2"]
+    assert "doc4" not in _top(writer, _axis(4), k=10)
+    assert len(_top(writer, _axis(0), k=20)) == 9
+    assert int(writer._state.deleted.sum()) == 2 and writer.watermark == 20
+
+
+def test_stale_rows_are_compacted_away(writer):
+    asyncio.run(writer.snapshot(FakeCollection([_doc(i) for i in range(4)])))
+    asyncio.run(writer.apply_changes([], ["doc0", "doc1", "doc2"]))
+
+    assert writer._state.count == 1 and not writer._state.deleted.any()
+    assert _top(writer, _axis(0), k=5) == ["doc3"]
+
+
+def test_sync_pulls_documents_past_the_watermark(writer):
+    docs = [_doc(i) for i in range(5)]
+    collection = FakeCollection(docs)
+    assert asyncio.run(writer.sync(collection)) == 5  # no snapshot yet, so it takes one
+    assert asyncio.run(writer.sync(collection)) == 0
+
+    docs.append(_doc(9, _axis(5)))
+    assert asyncio.run(writer.sync(collection)) == 1
+    assert writer.watermark == 9 and _top(writer, _axis(5)) == ["doc9"]
+
+
+def test_only_one_process_writes_and_readers_reload(writer, tmp_path):
+    reader = LocalVectorIndex("chunks", str(tmp_path / "chunks"))
+    assert writer.acquire_writer()
+    assert not reader.acquire_writer()
+
+    asyncio.run(writer.snapshot(FakeCollection([_doc(i) for i in range(4)])))
+    with pytest.raises(RuntimeError, match="Another process"):
+        asyncio.run(reader.apply_changes([_doc(8)], []))
+
+    assert reader.reload() and reader._state.count == 4
+    assert not reader.reload()  # unchanged since the last load
+
+    asyncio.run(writer.apply_changes([_doc(8, _axis(8))], []))
+    assert reader.reload() and _top(reader, _axis(8)) == ["doc8"]
+
+
+@pytest.fixture
+def encoded_rows(monkeypatch):
+    """Use an 8-dimension prefix as the coarse stage and record how many rows each encode call gets."""
+    monkeypatch.setattr(vector_store_settings, "LOCAL_INDEX_COARSE_DIMENSIONS", 8)
+    calls = []
+    encode = PrefixProjector.encode
+
+    def counting_encode(self, vectors):
+        calls.append(len(vectors))
+        return encode(self, vectors)
+
+    monkeypatch.setattr(PrefixProjector, "encode", counting_encode)
+    return calls
+
+
+def test_prefix_shortlists_are_rescored_exactly(writer, encoded_rows):
+    asyncio.run(writer.snapshot(FakeCollection([_doc(i) for i in range(200)])))
+    state = writer._state
+    assert isinstance(state.quantizer, PrefixProjector) and state.codes.shape == (200, 8)
+
+    query = np.random.default_rng(7).normal(size=DIM)
+    exact = [state.ids[row] for row in writer._exact_search(state, np.atleast_2d(query / np.linalg.norm(query)), 3)[0][0]]
+    assert _top(writer, query, k=3) == exact
+
+
+def test_codes_are_encoded_once_per_row(writer, encoded_rows, tmp_path):
+    reader = LocalVectorIndex("chunks", str(tmp_path / "chunks"))
+    asyncio.run(writer.snapshot(FakeCollection([_doc(i) for i in range(50)])))
+    assert [rows for rows in encoded_rows if rows] == [50]
+
+    # The reader reads the writer's codes file instead of encoding
+    encoded_rows.clear()
+    assert reader.reload() and len(reader._state.codes) == 50
+    assert not any(encoded_rows)
+
+    asyncio.run(writer.apply_changes([_doc(i) for i in range(50, 60)], []))
+    assert [rows for rows in encoded_rows if rows] == [10]
+
+    encoded_rows.clear()
+    assert reader.reload() and not any(encoded_rows)
+    np.testing.assert_array_equal(reader._state.codes, writer._state.codes)
+
+
+def test_stored_vectors_keep_the_configured_prefix(writer, monkeypatch):
+    monkeypatch.setattr(azure_embeddings_settings, "EMBEDDING_DIMENSIONS", 4)
+    asyncio.run(writer.snapshot(FakeCollection([_doc(i, _axis(i)) for i in range(4)])))
+
+    assert writer._state.vectors.shape == (4, 4)
+    assert _top(writer, _axis(2)[:4]) == ["doc2"]
@@ -0,0 +1,203 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.core.config import monogo_vector_settings, vector_store_settings
+from src.vectorstore import mongo_vectordb
+from src.vectorstore.mongo_vectordb import MAX_NUM_CANDIDATES, MongoVectorRetriever
+
+
+class FakeAggregate:
+    def __init__(self, results):
+        self.results = results
+
+    async def to_list(self, length=None):
+        return self.results
+
+
+class FakeCollection:
+    """Answers each aggregate with the next scripted result list, recording the pipelines."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return FakeAggregate(self.results.pop(0))
+
+
+@pytest.fixture
+def retriever(monkeypatch):
+    monkeypatch.setattr(vector_store_settings, "MONGO_SEARCH_MODE", "ann")
+    monkeypatch.setattr(vector_store_settings, "MONGO_NUM_CANDIDATES_FACTOR", 20)
+    monkeypatch.setattr(vector_store_settings, "MONGO_NUM_CANDIDATES_BY_COLLECTION", {})
+    monkeypatch.setattr(vector_store_settings, "MONGO_ADAPTIVE_MIN_TOP_SCORE", 0.8)
+    monkeypatch.setattr(vector_store_settings, "MONGO_ADAPTIVE_MIN_SCORE_SPREAD", 0.01)
+    monkeypatch.setattr(vector_store_settings, "MONGO_ADAPTIVE_WIDEN_FACTOR", 4)
+    return MongoVectorRetriever("youtube_data")
+
+
+def _search(retriever, collection, **kwargs):
+    return asyncio.run(retriever._asearch_single_query("q", 2, collection, query_vector=np.ones(3), **kwargs))
+
+
+def _vector_search(pipeline):
+    return pipeline[0]["$vectorSearch"]
+
+
+def _hits(*scores):
+    return [{"_id": f"doc{i}", "chunk_content": "", "score": score} for i, score in enumerate(scores)]
+
+
+def test_ann_is_the_default_with_candidates_scaled_by_k(retriever):
+    collection = FakeCollection(_hits(0.9, 0.85))
+    _search(retriever, collection)
+
+    stage = _vector_search(collection.pipelines[0])
+    assert stage["numCandidates"] == 40 and stage["limit"] == 2
+    assert "exact" not in stage
+    assert stage["queryVector"] == [1.0, 1.0, 1.0]
+
+
+def test_exact_mode_scans_without_a_candidate_pool(retriever):
+    collection = FakeCollection(_hits(0.9, 0.85))
+    _search(retriever, collection, mode="exact")
+
+    stage = _vector_search(collection.pipelines[0])
+    assert stage["exact"] is True and "numCandidates" not in stage
+
+
+def test_unknown_modes_are_rejected(retriever):
+    with pytest.raises(ValueError, match="Unknown vector search mode"):
+        _search(retriever, FakeCollection([]), mode="fuzzy")
+
+
+def test_candidate_pools_per_collection_and_bounds(retriever, monkeypatch):
+    monkeypatch.setattr(
+        vector_store_settings,
+        "MONGO_NUM_CANDIDATES_BY_COLLECTION",
+        {monogo_vector_settings.LABOR_LAW_COLLECTION_NAME: 300},
+    )
+    assert retriever._num_candidates(10) == 300
+    assert retriever._num_candidates(10, num_candidates=3) == 10  # never below k
+    assert retriever._num_candidates(10, num_candidates=10 ** 6) == MAX_NUM_CANDIDATES
+
+
+@pytest.mark.parametrize(
+    "first, widened",
+    [
+        (_hits(0.95, 0.9), False),  # strong and spread out
+        (_hits(0.7, 0.6), True),  # weak best match
+        (_hits(0.9, 0.895), True),  # flat top-k
+        (_hits(0.95), True),  # fewer than k hits
+    ],
+)
+def test_adaptive_mode_widens_only_weak_results(retriever, first, widened):
+    collection = FakeCollection(first, _hits(0.97, 0.9))
+    results = _search(retriever, collection, mode="adaptive")
+
+    assert len(collection.pipelines) == (2 if widened else 1)
+    if widened:
+        assert _vector_search(collection.pipelines[1])["numCandidates"] == 160
+        assert results[0]["score"] == 0.97
+
+
+def test_adaptive_mode_stops_at_the_atlas_limit(retriever):
+    collection = FakeCollection(_hits(0.5))
+    _search(retriever, collection, mode="adaptive", num_candidates=MAX_NUM_CANDIDATES)
+    assert len(collection.pipelines) == 1
+
+
+def _grouped(*per_query_scores):
+    """The ``$group`` output for one document per query with the given scores."""
+    return [
+        {"_id": f"doc{i}", "chunk_content": "", "score": score, "hits": [{"query_index": i, "score": score}]}
+        for i, score in enumerate(per_query_scores)
+    ]
+
+
+@pytest.fixture
+def batch_collection(monkeypatch):
+    holder = {}
+    name = monogo_vector_settings.LABOR_LAW_COLLECTION_NAME
+    monkeypatch.setattr(MongoVectorRetriever, "_async_client", property(lambda self: {name: holder["collection"]}))
+
+    def install(*results):
+        holder["collection"] = FakeCollection(*results)
+        return holder["collection"]
+
+    return install
+
+
+def test_all_queries_go_out_in_one_aggregate(retriever, batch_collection):
+    collection = batch_collection(_grouped(0.95, 0.9))
+    results = asyncio.run(retriever.asearch_many(np.eye(3), 1))
+
+    assert len(collection.pipelines) == 1 and results == _grouped(0.95, 0.9)
+    pipeline = collection.pipelines[0]
+    assert _vector_search(pipeline)["queryVector"] == [1.0, 0.0, 0.0]
+    assert pipeline[1]["$project"]["query_index"] == {"$literal": 0}
+
+    unions = [stage["$unionWith"] for stage in pipeline if "$unionWith" in stage]
+    assert [union["coll"] for union in unions] == [monogo_vector_settings.LABOR_LAW_COLLECTION_NAME] * 2
+    assert [union["pipeline"][1]["$project"]["query_index"] for union in unions] == [{"$literal": 1}, {"$literal": 2}]
+    assert unions[1]["pipeline"][0]["$vectorSearch"]["queryVector"] == [0.0, 0.0, 1.0]
+    assert pipeline[-2]["$group"]["_id"] == "$_id" and pipeline[-1] == {"$sort": {"score": -1}}
+
+
+def test_no_queries_means_no_round_trip(retriever, batch_collection):
+    collection = batch_collection()
+    assert asyncio.run(retriever.asearch_many(np.empty((0, 3)), 5)) == []
+    assert collection.pipelines == []
+
+
+def test_one_weak_query_widens_the_whole_batch_once(retriever, batch_collection):
+    collection = batch_collection(_grouped(0.95, 0.5), _grouped(0.95, 0.9))
+    results = asyncio.run(retriever.asearch_many(np.eye(2), 1, mode="adaptive"))
+
+    assert [_vector_search(pipeline)["numCandidates"] for pipeline in collection.pipelines] == [20, 80]
+    assert results == _grouped(0.95, 0.9)
+
+
+class SlowCollection:
+    """Answers every aggregate after a delay, tracking how many are awaited at the same time."""
+
+    def __init__(self, results):
+        self.results = results
+        self.running = 0
+        self.peak = 0
+
+    def aggregate(self, pipeline):
+        collection = self
+
+        class Aggregate:
+            async def to_list(self, length=None):
+                collection.running += 1
+                collection.peak = max(collection.peak, collection.running)
+                await asyncio.sleep(0.01)
+                collection.running -= 1
+                return collection.results
+
+        return Aggregate()
+
+
+def test_async_searches_embed_the_question_and_run_concurrently(retriever, monkeypatch):
+    embedded = []
+
+    async def embed(question):
+        embedded.append(question)
+        return np.ones(3)
+
+    collection = SlowCollection(_hits(0.9, 0.8))
+    name = monogo_vector_settings.LABOR_LAW_COLLECTION_NAME
+    monkeypatch.setattr(mongo_vectordb, "aget_embedding_3_large_simple", embed)
+    monkeypatch.setattr(MongoVectorRetriever, "_async_client", property(lambda self: {name: collection}))
+
+    async def scenario():
+        return await asyncio.gather(*[retriever.asearch(f"question {i}", 2) for i in range(3)])
+
+    assert asyncio.run(scenario()) == [_hits(0.9, 0.8)] * 3
+    assert embedded == ["question 0", "question 1", "question 2"]
+    assert collection.peak == 3
@@ -0,0 +1,57 @@
+import asyncio
+
+import numpy as np
+
+from src.services import naive_rag
+from src.services.naive_rag import NaiveRAG
+from src.vectorstore.base import group_hits_by_id
+
+
+def _hit(doc_id, score):
+    return {"_id": doc_id, "chunk_content": f"text of {doc_id}", "score": score}
+
+
+PER_QUERY = [
+    [_hit("a", 0.9), _hit("b", 0.8)],
+    [_hit("b", 0.95), _hit("c", 0.7)],
+    [],
+]
+
+
+def test_hits_are_grouped_by_document_with_their_best_score():
+    grouped = group_hits_by_id(PER_QUERY)
+
+    assert [(doc["_id"], doc["score"]) for doc in grouped] == [("b", 0.95), ("a", 0.9), ("c", 0.7)]
+    assert grouped[0]["hits"] == [{"query_index": 0, "score": 0.8}, {"query_index": 1, "score": 0.95}]
+    assert grouped[0]["chunk_content"] == "text of b"
+    assert group_hits_by_id([[], []]) == []
+
+
+class GroupingStore:
+    """A vector store answering asearch_many from fixed per-query hits."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def asearch_many(self, query_vectors, k, **kwargs):
+        self.calls += 1
+        return group_hits_by_id(PER_QUERY[:len(query_vectors)])
+
+
+def test_the_pipeline_splits_one_round_trip_back_into_rankings(monkeypatch):
+    store = GroupingStore()
+    monkeypatch.setattr(naive_rag, "get_vector_store", lambda law_type: store)
+    rag = NaiveRAG("question", [], "prompt")
+
+    per_query = asyncio.run(rag._get_data_many(["q0", "q1", "q2"], np.zeros((3, 4))))
+
+    assert store.calls == 1
+    assert per_query == PER_QUERY
+
+
+def test_no_queries_skip_the_vector_store(monkeypatch):
+    store = GroupingStore()
+    monkeypatch.setattr(naive_rag, "get_vector_store", lambda law_type: store)
+
+    assert asyncio.run(NaiveRAG("question", [], "prompt")._get_data_many([], np.zeros((0, 4)))) == []
+    assert store.calls == 0
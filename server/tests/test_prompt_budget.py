@@ -0,0 +1,106 @@
+import sys
+
+from src.utils import helpers
+from src.utils.helpers import count_tokens, truncate_to_tokens
+from src.utils.prompt_budget import assemble_prompt
+
+PROMPT = "Answer from these transcript excerpts:\n{summaries}"
+QUESTION = "How far away is the Andromeda galaxy?"
+
+
+def _doc(i, words=100):
+    return {"_id": f"doc{i}", "text": " ".join(f"galaxy{i} word{j}" for j in range(words))}
+
+
+def _history(turns):
+    return [(f"question {i} " * 10, f"answer {i} " * 30) for i in range(turns)]
+
+
+def _prompt_tokens(messages):
+    return sum(count_tokens(message["content"]) for message in messages)
+
+
+def test_everything_fits_under_a_generous_limit():
+    docs, history = [_doc(0), _doc(1)], _history(2)
+    messages, used, budget = assemble_prompt(PROMPT, docs, history, QUESTION, token_limit=100_000)
+
+    assert used == docs
+    assert budget.docs_dropped == budget.docs_truncated == budget.history_turns_dropped == 0
+    assert [message["role"] for message in messages] == ["system", "user", "system", "user", "system", "user"]
+    assert messages[-1] == {"role": "user", "content": QUESTION}
+    assert docs[1]["text"] in messages[0]["content"]
+
+
+def test_the_prompt_stays_within_the_limit():
+    docs = [_doc(i) for i in range(10)]
+    for limit in (300, 800, 2000):
+        messages, used, budget = assemble_prompt(PROMPT, docs, _history(10), QUESTION, token_limit=limit)
+
+        assert budget.total <= limit
+        assert _prompt_tokens(messages) <= budget.total
+        assert budget.docs_used + budget.docs_dropped == 10
+        assert used == docs[:budget.docs_used]
+
+
+def test_the_last_chunk_that_partly_fits_is_truncated():
+    docs = [_doc(0), _doc(1)]
+    full = assemble_prompt(PROMPT, docs[:1], [], QUESTION, token_limit=100_000)[2]
+    limit = full.total + count_tokens(docs[1]["text"]) // 2
+
+    messages, used, budget = assemble_prompt(PROMPT, docs, [], QUESTION, token_limit=limit, min_chunk_tokens=16)
+
+    assert used == docs and budget.docs_truncated == 1
+    assert docs[1]["text"] not in messages[0]["content"]
+    assert docs[1]["text"][:40] in messages[0]["content"]
+    assert budget.total <= limit
+
+
+def test_chunks_too_small_to_be_useful_are_dropped_instead():
+    docs = [_doc(0), _doc(1)]
+    full = assemble_prompt(PROMPT, docs[:1], [], QUESTION, token_limit=100_000)[2]
+
+    _, used, budget = assemble_prompt(PROMPT, docs, [], QUESTION, token_limit=full.total + 20, min_chunk_tokens=64)
+    assert used == docs[:1] and budget.docs_dropped == 1 and budget.docs_truncated == 0
+
+
+def test_history_keeps_the_most_recent_turns_within_its_share():
+    history = _history(20)
+    messages, _, budget = assemble_prompt(PROMPT, [_doc(i) for i in range(10)], history, QUESTION, token_limit=2000)
+
+    assert 0 < budget.history_turns_used < 20
+    assert budget.history_turns_used + budget.history_turns_dropped == 20
+    # Chunks get at least their share of what the system prompt and question leave
+    assert budget.context >= 0.7 * (2000 - budget.system - budget.question - 3) - count_tokens(_doc(0)["text"])
+    assert messages[-3]["content"] == history[-1][0] and messages[-2]["content"] == history[-1][1]
+
+
+def test_history_gets_the_room_chunks_do_not_need():
+    history = _history(5)
+    _, _, budget = assemble_prompt(PROMPT, [], history, QUESTION, token_limit=5000)
+    assert budget.history_turns_used == 5 and budget.context == 0
+
+
+def test_system_prompt_and_question_are_always_sent():
+    messages, used, budget = assemble_prompt(PROMPT, [_doc(0)], _history(3), QUESTION, token_limit=10)
+
+    assert used == [] and budget.history_turns_used == 0
+    assert messages == [{"role": "system", "content": PROMPT.replace("{summaries}", "")}, {"role": "user", "content": QUESTION}]
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, message):
+        self.warnings.append(message)
+
+
+def test_the_character_estimate_is_announced_once(monkeypatch):
+    logger = RecordingLogger()
+    monkeypatch.setattr(helpers, "logger", logger)
+    monkeypatch.setattr(helpers, "_encoding", None)
+    monkeypatch.setitem(sys.modules, "tiktoken", None)  # makes the import fail
+
+    assert count_tokens("a" * 10) == 3
+    assert truncate_to_tokens("a" * 10, 1) == "aaaa"
+    assert len(logger.warnings) == 1 and "characters per token" in logger.warnings[0]
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("qdrant_client")
+
+from src.vectorstore import qdrant  # noqa: E402
+
+
+def _point(point_id, score):
+    return SimpleNamespace(id=point_id, payload={"chunk_content": f"text of {point_id}"}, score=score)
+
+
+class FakeConnector:
+    """Answers searches from fixed points, recording the collections and vectors asked for."""
+
+    def __init__(self):
+        self.searches = []
+        self.batches = []
+
+    def search(self, collection_name, query_vector, query_filter=None, limit=3):
+        self.searches.append(collection_name)
+        return [_point("a", 0.9)][:limit]
+
+    def search_batch(self, collection_name, query_vectors, query_filter=None, limit=3):
+        self.batches.append((collection_name, query_vectors))
+        return [[_point("a", 0.9), _point("b", 0.8)], [_point("b", 0.95)]][:len(query_vectors)]
+
+
+@pytest.fixture
+def connector(monkeypatch):
+    fake = FakeConnector()
+    monkeypatch.setattr(qdrant, "QdrantDatabaseConnector", lambda: fake)
+    monkeypatch.setattr(qdrant, "get_embedding_3_large_simple", lambda text: np.zeros(4, dtype=np.float32))
+    return fake
+
+
+def test_batched_searches_are_grouped_by_point(connector):
+    grouped = asyncio.run(qdrant.VectorRetriever("labor_law").asearch_many(np.ones((2, 4), dtype=np.float32), k=5))
+
+    assert [(doc["_id"], doc["score"]) for doc in grouped] == [("b", 0.95), ("a", 0.9)]
+    assert grouped[0]["hits"] == [{"query_index": 0, "score": 0.8}, {"query_index": 1, "score": 0.95}]
+    collection, vectors = connector.batches[0]
+    assert collection == "vector_labor_law_collection" and vectors == [[1.0] * 4] * 2
+
+
+def test_single_and_batched_searches_use_the_same_collection(connector):
+    retriever = qdrant.VectorRetriever("immigration_law")
+    retriever.search("question", k=6)
+    retriever.search_many(np.ones((1, 4)), k=6)
+
+    assert connector.searches == [connector.batches[0][0]] == ["vector_immigration_law_collection"]
+
+
+def test_unknown_law_types_are_rejected(connector):
+    with pytest.raises(ValueError, match="Unknown law type"):
+        qdrant.VectorRetriever("tax_law").search("question", k=6)
+    assert qdrant.VectorRetriever("tax_law").search_many([], k=6) == []
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from src.vectorstore.quantization import (
+    ProductQuantizer,
+    ScalarQuantizer,
+    load_quantizer,
+    recall_memory_report,
+    save_quantizer,
+    shortlist_search,
+)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    """Clustered unit vectors, which is how chunk embeddings of related videos look."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 32))
+    vectors = centers[rng.integers(0, 20, 2000)] + rng.normal(scale=0.4, size=(2000, 32))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(2000, 50, replace=False)] + rng.normal(scale=0.05, size=(50, 32))
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+def _recall(quantizer, vectors, queries, k=10):
+    exact = np.argsort(-(vectors @ queries.T), axis=0)[:k].T
+    found = shortlist_search(quantizer, quantizer.encode(vectors), vectors, queries, k, rescore_factor=10)
+    return np.mean([len(set(e) & set(rows)) / k for e, (rows, _) in zip(exact, found)])
+
+
+def test_int8_codes_round_trip_closely(corpus):
+    vectors, _ = corpus
+    quantizer = ScalarQuantizer().fit(vectors)
+    codes = quantizer.encode(vectors)
+
+    assert codes.dtype == np.int8 and codes.shape == vectors.shape
+    # Within half a step, except for the clipped outliers
+    error = np.abs(quantizer.decode(codes) - vectors)
+    assert np.mean(error <= quantizer.scale / 2 + 1e-6) > 0.99
+
+
+@pytest.mark.parametrize("quantizer", [ScalarQuantizer(), ProductQuantizer(m=8)], ids=["int8", "pq8"])
+def test_rescored_shortlists_recover_the_exact_top_k(corpus, quantizer):
+    vectors, queries = corpus
+    if isinstance(quantizer, ProductQuantizer):
+        quantizer.fit(vectors, iterations=8)
+    else:
+        quantizer.fit(vectors)
+    assert _recall(quantizer, vectors, queries) >= 0.95
+
+
+def test_rescored_scores_are_exact_and_sorted(corpus):
+    vectors, queries = corpus
+    quantizer = ScalarQuantizer().fit(vectors)
+    (rows, scores), = shortlist_search(quantizer, quantizer.encode(vectors), vectors, queries[:1], 5)
+
+    np.testing.assert_allclose(scores, vectors[rows] @ queries[0], rtol=1e-5)
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_excluded_rows_are_never_returned(corpus):
+    vectors, queries = corpus
+    quantizer = ScalarQuantizer().fit(vectors)
+    codes = quantizer.encode(vectors)
+    best = shortlist_search(quantizer, codes, vectors, queries[:1], 1)[0][0][0]
+
+    excluded = np.zeros(len(vectors), dtype=bool)
+    excluded[best] = True
+    rows, _ = shortlist_search(quantizer, codes, vectors, queries[:1], 10, excluded=excluded)[0]
+    assert best not in rows
+
+    excluded[:] = True
+    rows, _ = shortlist_search(quantizer, codes, vectors, queries[:1], 10, excluded=excluded)[0]
+    assert len(rows) == 0
+
+
+def test_pq_rejects_dimensions_it_cannot_split(corpus):
+    with pytest.raises(ValueError, match="not divisible"):
+        ProductQuantizer(m=5).fit(corpus[0])
+
+
+def test_trained_quantizers_survive_save_and_load(corpus, tmp_path):
+    vectors, _ = corpus
+    for quantizer in (ScalarQuantizer().fit(vectors), ProductQuantizer(m=4).fit(vectors, iterations=2)):
+        path = str(tmp_path / f"{quantizer.method}.npz")
+        save_quantizer(quantizer, path)
+        loaded = load_quantizer(path)
+        assert type(loaded) is type(quantizer)
+        np.testing.assert_array_equal(loaded.encode(vectors[:10]), quantizer.encode(vectors[:10]))
+
+
+def test_report_compares_recall_against_bytes(corpus):
+    rows = {row["method"]: row for row in recall_memory_report(corpus[0], n_queries=20, pq_m=[8], prefix_dimensions=[16])}
+
+    assert set(rows) == {"float32", "int8", "pq8", "prefix16"}
+    assert rows["int8"]["bytes_per_vector"] == 32 and rows["pq8"]["bytes_per_vector"] == 8
+    assert rows["int8"]["compression"] == 4.0
+    assert rows["int8"]["recall_at_k_rescored"] >= rows["int8"]["recall_at_k_adc"] - 1e-9
@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import pytest
+
+from src.core.resilience import UpstreamUnavailable
+from src.llm.azure_openai import OpenAILLM
+from src.services import naive_rag
+from src.services.naive_rag import NaiveRAG
+from src.utils.helpers import QueryPlan, plan_query
+
+HISTORY = [("What is a solar eclipse?", "The Moon blocks the Sun.")]
+
+
+@pytest.fixture
+def planner_reply(monkeypatch):
+    """Make the planner's LLM call return the given text."""
+    replies = {}
+
+    async def agen(self, *args, **kwargs):
+        return replies["text"]
+
+    monkeypatch.setattr(OpenAILLM, "agen", agen)
+
+    def set_reply(reply):
+        replies["text"] = reply if isinstance(reply, str) else json.dumps(reply)
+
+    return set_reply
+
+
+def test_plan_is_parsed_and_expansions_capped(planner_reply):
+    planner_reply({
+        "is_follow_up": True,
+        "standalone_query": "When is the next solar eclipse?",
+        "expanded_queries": ["next solar eclipse date", " ", "upcoming eclipse of the Sun", "third"],
+    })
+    plan = asyncio.run(plan_query("when is the next one?", 2, ["What is a solar eclipse?"]))
+
+    assert plan == QueryPlan(
+        is_follow_up=True,
+        standalone_query="When is the next solar eclipse?",
+        expanded_queries=["next solar eclipse date", "upcoming eclipse of the Sun"],
+    )
+    assert plan.queries[0] == "When is the next solar eclipse?"
+
+
+def test_a_single_string_expansion_is_one_query(planner_reply):
+    planner_reply({"is_follow_up": False, "standalone_query": "Mars moons", "expanded_queries": "moons of Mars"})
+    assert asyncio.run(plan_query("Mars moons", 2)).expanded_queries == ["moons of Mars"]
+
+
+@pytest.mark.parametrize("reply", ["not json", "[1, 2]", {"standalone_query": "no flag"}])
+def test_undecodable_plans_are_degraded(planner_reply, reply):
+    planner_reply(reply)
+    plan = asyncio.run(plan_query("Where is Mars?", 2))
+
+    assert plan.degraded
+    assert plan.standalone_query == "Where is Mars?" and plan.expanded_queries == []
+
+
+def test_an_unavailable_planner_degrades_the_plan(monkeypatch):
+    async def agen(self, *args, **kwargs):
+        raise UpstreamUnavailable("llm_auxiliary: circuit open for chat")
+
+    monkeypatch.setattr(OpenAILLM, "agen", agen)
+    plan = asyncio.run(plan_query("Where is Mars?", 2))
+
+    assert plan == QueryPlan(False, "Where is Mars?", [], degraded=True)
+
+
+@pytest.fixture
+def unsure_pipeline(monkeypatch):
+    """A pipeline whose local classifier defers to the planner, recording labels and cache lookups."""
+    calls = []
+    monkeypatch.setattr(naive_rag, "predict_follow_up", lambda question, history: (None, 0.7))
+    monkeypatch.setattr(naive_rag, "log_label", lambda *args: calls.append(("log_label", args[-1])))
+
+    async def cached_answer(self):
+        calls.append("cache")
+        return None
+
+    monkeypatch.setattr(NaiveRAG, "_cached_answer", cached_answer)
+    return calls
+
+
+def _plan(question):
+    return asyncio.run(NaiveRAG(question, HISTORY, "prompt")._plan())
+
+
+def test_planner_labels_are_logged_and_standalone_questions_checked_in_the_cache(planner_reply, unsure_pipeline):
+    planner_reply({"is_follow_up": False, "standalone_query": "Where is Mars?", "expanded_queries": []})
+    plan, cached = _plan("Where is Mars?")
+
+    assert plan.is_follow_up is False and cached is None
+    # Labelled with the probability the local model already computed
+    assert unsure_pipeline == [("log_label", 0.7), "cache"]
+
+
+def test_degraded_plans_are_neither_labels_nor_cache_lookups(planner_reply, unsure_pipeline):
+    planner_reply("not json")
+    plan, cached = _plan("and what about that one?")
+
+    assert plan.degraded
+    # The local model's best guess stands in for the planner's flag
+    assert plan.is_follow_up is True and cached is None
+    assert unsure_pipeline == []
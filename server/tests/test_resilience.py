@@ -0,0 +1,245 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.core import resilience
+from src.core.config import resilience_settings
+from src.core.resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy, RetryBudget, UpstreamUnavailable
+
+
+@pytest.fixture(autouse=True)
+def fast_policies(monkeypatch):
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience_settings, "RETRY_BASE_DELAY_SECONDS", 0.001)
+    monkeypatch.setattr(resilience_settings, "RETRY_MAX_DELAY_SECONDS", 0.001)
+    monkeypatch.setattr(resilience_settings, "BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(resilience_settings, "HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(resilience_settings, "HEDGE_MIN_DELAY_SECONDS", 0.01)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("chat", failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # a success resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()["opened"] == 1 and breaker.snapshot()["rejected"] == 1
+
+
+def test_breaker_probes_once_after_the_reset_timeout(clock):
+    breaker = CircuitBreaker("chat", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+
+    clock.now += 31
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # only one probe at a time
+
+    breaker.record_failure()  # the probe failed: open for another reset_timeout
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    clock.now += 31
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_a_cancelled_probe_lets_the_next_call_probe(clock):
+    breaker = CircuitBreaker("chat", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow()
+
+    breaker.record_cancelled()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.allow()
+
+
+def test_retry_budget_allows_a_share_of_calls():
+    budget = RetryBudget(ratio=0.5, min_tokens=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+class Upstream:
+    """Attempts that fail with the queued errors, then answer with the target they were sent to."""
+
+    def __init__(self, *errors, delays=None):
+        self.errors = list(errors)
+        self.delays = dict(delays or {})
+        self.targets = []
+
+    async def __call__(self, target):
+        self.targets.append(target)
+        await asyncio.sleep(self.delays.get(target, 0))
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"answer from {target}"
+
+
+def _policy(**kwargs):
+    return ResiliencePolicy("test", "upstream", **{"timeout": 1.0, **kwargs})
+
+
+def test_transient_failures_are_retried_on_the_fallback():
+    upstream = Upstream(TimeoutError())
+    policy = _policy(fallback_target="backup")
+
+    assert asyncio.run(policy.call(upstream, "primary")) == "answer from backup"
+    assert upstream.targets == ["primary", "backup"]
+    assert policy.stats()["retries"] == 1
+
+
+def test_rejected_requests_are_not_retried():
+    upstream = Upstream(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        asyncio.run(_policy().call(upstream, "primary"))
+    assert upstream.targets == ["primary"]
+
+
+def test_slow_attempts_time_out_and_are_retried():
+    upstream = Upstream(delays={"primary": 0.2})
+    policy = _policy(timeout=0.02, fallback_target="backup")
+
+    assert asyncio.run(policy.call(upstream, "primary")) == "answer from backup"
+    assert policy.stats()["timeouts"] == 1
+
+
+def test_failed_calls_become_upstream_unavailable():
+    upstream = Upstream(*[TimeoutError()] * 5)
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(_policy().call(upstream, "primary"))
+    assert len(upstream.targets) == resilience_settings.RETRY_MAX_ATTEMPTS
+
+
+def test_retries_stop_when_the_budget_is_spent(monkeypatch):
+    monkeypatch.setattr(resilience_settings, "RETRY_BUDGET_MIN_TOKENS", 1)
+    monkeypatch.setattr(resilience_settings, "RETRY_BUDGET_RATIO", 0.0)
+    policy = _policy()
+    policy.budget.withdraw()  # spent by earlier calls
+
+    upstream = Upstream(TimeoutError(), TimeoutError())
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(policy.call(upstream, "primary"))
+    assert upstream.targets == ["primary"] and policy.stats()["budget_exhausted"] == 1
+
+
+def test_open_circuits_fail_fast():
+    policy = _policy()
+    for _ in range(3):
+        with pytest.raises(UpstreamUnavailable):
+            asyncio.run(policy.call(Upstream(*[TimeoutError()] * 3), "primary"))
+
+    upstream = Upstream()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(policy.call(upstream, "primary"))
+    assert upstream.targets == []
+
+
+def test_failures_are_charged_to_the_deployment_that_served_them(monkeypatch):
+    monkeypatch.setattr(resilience_settings, "BREAKER_RESET_SECONDS", 0.05)
+    policy = _policy(fallback_target="backup")
+    for _ in range(3):
+        resilience.breaker_for("upstream", "primary").record_failure()
+    # The primary is open, so the first attempt goes to the backup; it fails
+    # after the primary's reset timeout, so the retry probes the primary
+    upstream = Upstream(TimeoutError(), delays={"backup": 0.06})
+
+    assert asyncio.run(policy.call(upstream, "primary")) == "answer from primary"
+    assert upstream.targets == ["backup", "primary"]
+    assert resilience.breaker_for("upstream", "backup").snapshot()["consecutive_failures"] == 1
+
+
+def test_sync_calls_from_many_threads_are_all_counted():
+    policy = _policy()
+
+    def calls():
+        for _ in range(200):
+            policy.call_sync(lambda target: target, "primary")
+
+    threads = [threading.Thread(target=calls) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert policy.stats()["calls"] == 1600
+    assert policy.latency.count == 512
+
+
+def test_slow_attempts_are_hedged_once_latencies_are_known():
+    policy = _policy(hedge=True, fallback_target="backup")
+    for _ in range(5):
+        policy.latency.observe(0.005)
+
+    upstream = Upstream(delays={"primary": 0.3})
+    assert asyncio.run(policy.call(upstream, "primary")) == "answer from backup"
+    assert policy.stats()["hedges"] == 1 and policy.stats()["hedge_wins"] == 1
+
+
+def test_fast_attempts_are_not_hedged():
+    policy = _policy(hedge=True, fallback_target="backup")
+    for _ in range(5):
+        policy.latency.observe(0.05)
+
+    assert asyncio.run(policy.call(Upstream(), "primary")) == "answer from primary"
+    assert policy.stats()["hedges"] == 0
+
+
+async def _items(fail_after=None, count=3):
+    for i in range(count):
+        if i == fail_after:
+            raise TimeoutError()
+        yield i
+
+
+def test_streams_are_retried_only_before_the_first_item():
+    opened = []
+
+    def open_stream(target):
+        opened.append(target)
+        return _items(fail_after=0 if len(opened) == 1 else None)
+
+    async def collect(stream):
+        return [item async for item in stream]
+
+    policy = _policy()
+    assert asyncio.run(collect(policy.stream(open_stream, "primary", 1.0, 1.0))) == [0, 1, 2]
+    assert len(opened) == 2
+
+    broken = policy.stream(lambda target: _items(fail_after=2), "primary", 1.0, 1.0)
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(collect(broken))
+
+
+def test_an_upstream_outage_gets_a_503_with_retry_after(answer_api):
+    api = answer_api(error_rate=1.0)
+    response = api.run(lambda client: client.post("/api/answer", json={"question": "What is a nebula?", "chunks": "2", "token_limit": 2000}))
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(int(resilience_settings.BREAKER_RESET_SECONDS))
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from src.core import resilience
+from src.core.config import startup_settings
+from src.core.resources import ResourceManager, _ping_embeddings, _ping_llm
+
+
+class Checks:
+    """Dependency checks that succeed unless listed in ``failing``, counting their calls."""
+
+    def __init__(self, *names, failing=()):
+        self.calls = {name: 0 for name in names}
+        self.failing = set(failing)
+
+    def manager(self):
+        return ResourceManager({name: self._check(name) for name in self.calls})
+
+    def _check(self, name):
+        async def check():
+            self.calls[name] += 1
+            await asyncio.sleep(0.001)
+            if name in self.failing:
+                raise ConnectionError(f"{name} unreachable")
+        return check
+
+
+def test_warm_up_checks_every_dependency():
+    checks = Checks("mongodb", "llm", failing={"llm"})
+    status = asyncio.run(checks.manager().warm_up())
+
+    assert status["mongodb"].ready and status["mongodb"].latency_ms is not None
+    assert not status["llm"].ready and status["llm"].error == "ConnectionError: llm unreachable"
+
+
+def test_readiness_rechecks_only_failed_dependencies():
+    checks = Checks("mongodb", "llm", failing={"llm"})
+    manager = checks.manager()
+
+    async def scenario():
+        await manager.warm_up()
+        first = await manager.readiness()
+        checks.failing.clear()
+        second = await manager.readiness()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["ready"] is False and first["dependencies"]["llm"]["error"]
+    assert second["ready"] is True
+    assert checks.calls == {"mongodb": 1, "llm": 3}
+
+
+def test_stale_checks_are_repeated(monkeypatch):
+    checks = Checks("mongodb")
+    manager = checks.manager()
+    asyncio.run(manager.warm_up())
+
+    monkeypatch.setattr(startup_settings, "READINESS_RECHECK_SECONDS", 30)
+    manager.status["mongodb"].checked_at = time.time() - 60
+    asyncio.run(manager.readiness())
+    assert checks.calls["mongodb"] == 2
+
+
+def test_concurrent_checks_of_one_dependency_are_joined():
+    checks = Checks("mongodb")
+    manager = checks.manager()
+
+    async def scenario():
+        return await asyncio.gather(*[manager.check("mongodb") for _ in range(5)])
+
+    assert all(status.ready for status in asyncio.run(scenario()))
+    assert checks.calls["mongodb"] == 1
+
+
+def test_hanging_checks_time_out(monkeypatch):
+    monkeypatch.setattr(startup_settings, "WARM_UP_TIMEOUT_SECONDS", 0.01)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    status = asyncio.run(ResourceManager({"llm": hang}).check("llm"))
+    assert not status.ready and status.error.startswith("TimeoutError")
+
+
+def test_upstream_pings_generate_nothing(answer_api):
+    api = answer_api()
+    manager = ResourceManager({"llm": _ping_llm, "embeddings": _ping_embeddings})
+
+    status = api.run(lambda client: manager.warm_up())
+
+    assert status["llm"].ready and status["embeddings"].ready
+    stats = api.upstream.state.stats
+    assert stats["chat"] == stats["chat_stream"] == stats["embeddings"] == 0
+    # Nothing went through the resilience policies either
+    assert resilience._breakers == {}
@@ -0,0 +1,130 @@
+import asyncio
+
+from src.services.single_flight import SingleFlight, request_key
+
+
+def test_keys_ignore_formatting_but_not_history_or_parameters():
+    history = [("What is a comet?", "A ball of ice and dust.")]
+    key = request_key("Where do they come from?", history, 5, 2000)
+
+    assert request_key("  where do THEY come from? ", history, 5, 2000) == key
+    assert request_key("Where do they come from?", [], 5, 2000) != key
+    assert request_key("Where do they come from?", history, 3, 2000) != key
+
+
+def test_concurrent_callers_share_one_run():
+    flight = SingleFlight()
+    calls = []
+
+    async def answer():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"answer": "42"}
+
+    async def scenario():
+        results = await asyncio.gather(*[flight.do("key", answer) for _ in range(5)])
+        # Released once finished, so a later request runs again
+        await flight.do("key", answer)
+        return results
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert all(result == {"answer": "42"} for result in results)
+    assert flight.stats()["coalesced"] == 4 and flight.stats()["in_flight"] == 0
+    assert flight.stats()["coalescing_rate"] == round(4 / 6, 4)
+
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        return await asyncio.gather(*[flight.do("key", fail) for _ in range(3)], return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(scenario())] == ["upstream down"] * 3
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def answer():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def scenario():
+        first = asyncio.create_task(flight.do("key", answer))
+        second = asyncio.create_task(flight.do("key", answer))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+
+async def _source(events, delay=0.005, fail=None):
+    for event in events:
+        await asyncio.sleep(delay)
+        yield event
+    if fail is not None:
+        raise fail
+
+
+async def _collect(stream):
+    return [event async for event in stream]
+
+
+def test_streams_are_fanned_out_to_late_joiners():
+    flight = SingleFlight()
+    started = []
+    events = [{"event": "token", "data": str(i)} for i in range(5)]
+
+    def source():
+        started.append(1)
+        return _source(events)
+
+    async def scenario():
+        first = asyncio.create_task(_collect(flight.stream("key", source)))
+        await asyncio.sleep(0.012)  # a couple of events in
+        late = asyncio.create_task(_collect(flight.stream("key", source)))
+        return await asyncio.gather(first, late)
+
+    first, late = asyncio.run(scenario())
+    assert len(started) == 1
+    assert first == late == events
+    assert flight.stats()["stream_coalesced"] == 1 and flight.stats()["in_flight"] == 0
+
+
+def test_stream_errors_reach_every_subscriber():
+    flight = SingleFlight()
+
+    async def scenario():
+        source = lambda: _source([{"event": "token"}], fail=RuntimeError("stream broke"))
+        subscribers = [_collect(flight.stream("key", source)) for _ in range(2)]
+        return await asyncio.gather(*subscribers, return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(scenario())] == ["stream broke"] * 2
+
+
+def test_the_upstream_stream_stops_when_every_subscriber_leaves():
+    flight = SingleFlight()
+    pulled = []
+
+    async def endless():
+        while True:
+            await asyncio.sleep(0.001)
+            pulled.append(1)
+            yield {"event": "token"}
+
+    async def scenario():
+        stream = flight.stream("key", endless)
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        return len(pulled)
+
+    after_close = asyncio.run(scenario())
+    assert after_close <= 2
+    assert flight.stats()["in_flight"] == 0
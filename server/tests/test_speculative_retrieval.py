@@ -0,0 +1,174 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.core.config import rag_settings
+from src.core.resilience import UpstreamUnavailable
+from src.services import naive_rag
+from src.services.naive_rag import NaiveRAG
+from src.utils.helpers import QueryPlan
+from src.vectorstore.base import group_hits_by_id
+
+QUESTION = "Which house rules the north?"
+
+
+class RecordingStore:
+    """A vector store recording the raw-question searches and the batched planned searches."""
+
+    def __init__(self, hold=False):
+        self.searched = []
+        self.batches = []
+        self.cancelled = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        if not hold:
+            self.release.set()
+
+    async def asearch(self, query, k, query_vector=None):
+        self.searched.append(query)
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return [{"_id": "raw", "chunk_content": "the raw question's chunk", "score": 0.9}]
+
+    async def asearch_many(self, query_vectors, k, **kwargs):
+        self.batches.append(len(query_vectors))
+        return group_hits_by_id(
+            [[{"_id": f"planned-{i}", "chunk_content": f"planned chunk {i}", "score": 0.8}] for i in range(len(query_vectors))]
+        )
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    """Replace the embeddings with a fake that records every batch it is asked for."""
+    batches = []
+
+    async def embed(texts):
+        batches.append(list(texts))
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    monkeypatch.setattr(naive_rag, "aget_embeddings_3_large", embed)
+    monkeypatch.setattr(rag_settings, "SPECULATIVE_RETRIEVAL", True)
+    return batches
+
+
+def _rag(monkeypatch, store, plan=None, cached=None, chunks=3):
+    monkeypatch.setattr(naive_rag, "get_vector_store", lambda law_type: store)
+    rag = NaiveRAG(QUESTION, [], "prompt", chunks=chunks)
+
+    async def _plan():
+        # The raw question is searched while the planner is still working
+        await store.started.wait()
+        return plan, cached
+
+    rag._plan = _plan
+    return rag
+
+
+def test_the_raw_question_is_searched_while_planning_and_only_once(monkeypatch, embedded):
+    store = RecordingStore()
+    plan = QueryPlan(is_follow_up=False, standalone_query=QUESTION, expanded_queries=["northern lords", " which house rules the north? "])
+    rag = _rag(monkeypatch, store, plan)
+
+    async def scenario():
+        plan, cached, speculative = await rag._plan_with_speculation()
+        return await rag._retrieve(plan, speculative)
+
+    docs = asyncio.run(scenario())
+
+    assert store.searched == [QUESTION]
+    assert embedded == [[QUESTION], ["northern lords"]]
+    assert store.batches == [1]
+    assert {doc["_id"] for doc in docs} == {"raw", "planned-0"}
+
+
+@pytest.mark.parametrize(
+    "plan, cached",
+    [
+        (QueryPlan(is_follow_up=True, standalone_query="Which house rules the north in that book?"), None),
+        (None, ("a cached answer", [])),
+    ],
+    ids=["follow-up", "cache-hit"],
+)
+def test_unneeded_speculation_is_cancelled(monkeypatch, embedded, plan, cached):
+    store = RecordingStore(hold=True)
+    rag = _rag(monkeypatch, store, plan, cached)
+
+    async def _plan():
+        # The plan comes back while the speculative search is still running
+        await store.started.wait()
+        return plan, cached
+
+    rag._plan = _plan
+
+    async def scenario():
+        result = await rag._plan_with_speculation()
+        await asyncio.sleep(0)
+        return result
+
+    returned_plan, returned_cached, speculative = asyncio.run(scenario())
+
+    assert speculative is None
+    assert (returned_plan, returned_cached) == (plan, cached)
+    assert store.cancelled == 1
+
+
+def test_a_failed_plan_cancels_speculation(monkeypatch, embedded):
+    store = RecordingStore(hold=True)
+    rag = _rag(monkeypatch, store)
+
+    async def _plan():
+        await store.started.wait()
+        raise RuntimeError("planner broke")
+
+    rag._plan = _plan
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await rag._plan_with_speculation()
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert store.cancelled == 1
+
+
+@pytest.mark.parametrize("enabled, chunks", [(False, 3), (True, 0)], ids=["disabled", "no-chunks"])
+def test_nothing_is_speculated_when_it_cannot_be_used(monkeypatch, embedded, enabled, chunks):
+    monkeypatch.setattr(rag_settings, "SPECULATIVE_RETRIEVAL", enabled)
+    store = RecordingStore()
+    plan = QueryPlan(is_follow_up=False, standalone_query=QUESTION)
+    rag = _rag(monkeypatch, store, plan, chunks=chunks)
+    rag._plan = lambda: asyncio.sleep(0, result=(plan, None))
+
+    _, _, speculative = asyncio.run(rag._plan_with_speculation())
+
+    assert speculative is None
+    assert store.searched == []
+    assert embedded == []
+
+
+def test_the_speculative_results_are_used_when_the_planned_searches_cannot_run(monkeypatch, embedded):
+    store = RecordingStore()
+    plan = QueryPlan(is_follow_up=False, standalone_query=QUESTION, expanded_queries=["northern lords"])
+    rag = _rag(monkeypatch, store, plan)
+
+    async def embed(texts):
+        if texts != [QUESTION]:
+            raise UpstreamUnavailable("embeddings are down")
+        return np.ones((1, 4), dtype=np.float32)
+
+    monkeypatch.setattr(naive_rag, "aget_embeddings_3_large", embed)
+
+    async def scenario():
+        plan, _, speculative = await rag._plan_with_speculation()
+        return await rag._retrieve(plan, speculative)
+
+    docs = asyncio.run(scenario())
+
+    assert [doc["_id"] for doc in docs] == ["raw"]
+    assert store.batches == []
@@ -0,0 +1,199 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import PyMongoError
+from starlette.requests import Request
+
+from src.core.config import token_settings
+from src.routers import answer
+from src.services import token_quota as token_quota_module
+from src.services.token_quota import QuotaExceeded, TokenQuota
+
+
+class FakeUsers:
+    """Applies the quota's ``$inc`` upserts to in-memory user documents."""
+
+    def __init__(self, **stored):
+        self.docs = {user_id: {"user_id": user_id, "usage": usage} for user_id, usage in stored.items()}
+        self.fail = False
+
+    async def find_one(self, query, projection=None):
+        await asyncio.sleep(0)
+        return self.docs.get(query["user_id"])
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.fail:
+            raise PyMongoError("connection reset")
+        for operation in operations:
+            user_id = operation._filter["user_id"]
+            doc = self.docs.setdefault(user_id, {"user_id": user_id, "usage": {}})
+            for path, amount in operation._doc["$inc"].items():
+                _, day, counter = path.split(".")
+                usage = doc["usage"].setdefault(day, {})
+                usage[counter] = usage.get(counter, 0) + amount
+
+
+@pytest.fixture
+def today(monkeypatch):
+    day = {"value": "2026-10-18"}
+    monkeypatch.setattr(token_quota_module, "_today", lambda: day["value"])
+    return day
+
+
+@pytest.fixture
+def users(monkeypatch):
+    collection = FakeUsers()
+    monkeypatch.setattr(TokenQuota, "_collection", staticmethod(lambda: collection))
+    return collection
+
+
+def _quota(**limits):
+    limits = {"input_limit": 1000, "output_limit": 1000, "message_limit": 3, **limits}
+    return TokenQuota(**limits)
+
+
+def test_requests_are_admitted_until_a_limit_is_used_up(today, users):
+    quota = _quota(message_limit=2)
+    quota.admit("alice")
+    quota.admit("alice")
+
+    with pytest.raises(QuotaExceeded) as rejected:
+        quota.admit("alice")
+    assert rejected.value.counter == "messages" and rejected.value.limit == 2
+    assert 1 <= rejected.value.retry_after <= 86400
+    # Rejections are not counted, and other users have their own quota
+    assert quota.usage("alice")["messages"] == 2
+    quota.admit("bob")
+
+
+def test_charged_tokens_count_against_the_token_limits(today, users):
+    quota = _quota(output_limit=100)
+    quota.admit("alice")
+    quota.charge("alice", input_tokens=40, output_tokens=100)
+
+    assert quota.usage("alice") == {"input_tokens": 40, "output_tokens": 100, "messages": 1}
+    with pytest.raises(QuotaExceeded, match="output_tokens"):
+        quota.admit("alice")
+
+
+def test_counts_start_over_on_a_new_day(today, users):
+    quota = _quota(message_limit=1)
+    quota.admit("alice")
+    with pytest.raises(QuotaExceeded):
+        quota.admit("alice")
+
+    today["value"] = "2026-10-19"
+    quota.admit("alice")
+    assert quota.usage("alice")["messages"] == 1
+
+
+def test_usage_from_other_processes_is_loaded_once(today, users):
+    users.docs["alice"] = {"user_id": "alice", "usage": {"2026-10-18": {"messages": 2, "input_tokens": 500}}}
+    quota = _quota()
+
+    async def scenario():
+        quota.admit("alice")
+        await asyncio.gather(*quota._tasks)
+        return quota.usage("alice")
+
+    assert asyncio.run(scenario()) == {"input_tokens": 500, "output_tokens": 0, "messages": 3}
+    assert quota.stats()["loads"] == 1
+
+
+def test_usage_is_flushed_as_increments_and_not_double_counted(today, users):
+    quota = _quota()
+
+    async def scenario():
+        quota.admit("alice")
+        quota.charge("alice", 10, 20)
+        await asyncio.gather(*quota._tasks)
+        assert await quota.flush() == 1
+        quota.admit("alice")
+        assert await quota.flush() == 1
+        # A fresh process sees the merged total
+        other = _quota()
+        other.admit("alice")
+        await asyncio.gather(*other._tasks)
+        return other.usage("alice")
+
+    assert asyncio.run(scenario()) == {"input_tokens": 10, "output_tokens": 20, "messages": 3}
+    assert users.docs["alice"]["usage"]["2026-10-18"] == {"messages": 2, "input_tokens": 10, "output_tokens": 20}
+
+
+def test_failed_flushes_are_merged_into_the_next_one(today, users):
+    quota = _quota()
+
+    async def scenario():
+        quota.admit("alice")
+        await asyncio.gather(*quota._tasks)
+        users.fail = True
+        assert await quota.flush() == 0
+        quota.charge("alice", 5, 5)
+        users.fail = False
+        return await quota.flush()
+
+    assert asyncio.run(scenario()) == 1
+    assert users.docs["alice"]["usage"]["2026-10-18"] == {"messages": 1, "input_tokens": 5, "output_tokens": 5}
+    assert quota.stats()["flush_errors"] == 1 and quota.stats()["pending_users"] == 0
+
+
+def test_users_still_loading_are_not_flushed_yet(today, users):
+    quota = _quota()
+
+    async def scenario():
+        quota.admit("alice")
+        written = await quota.flush()
+        await asyncio.gather(*quota._tasks)
+        return written, await quota.flush()
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+
+def _request(client="203.0.113.9", forwarded=None, **headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    if forwarded:
+        raw.append((b"x-forwarded-for", forwarded.encode()))
+    return Request({"type": "http", "method": "POST", "path": "/api/answer", "headers": raw, "client": (client, 1234)})
+
+
+@pytest.fixture
+def quota_on(monkeypatch):
+    monkeypatch.setattr(answer, "token_quota", _quota())
+    monkeypatch.setattr(token_settings, "TOKEN_QUOTA_API_KEYS", {"key-1": "alice"})
+    monkeypatch.setattr(token_settings, "TRUSTED_PROXIES", ["10.0.0.0/8"])
+    # The parsed proxy list is cached for the life of the process
+    answer._trusted_proxies.cache_clear()
+    yield
+    answer._trusted_proxies.cache_clear()
+
+
+def test_api_keys_map_to_their_users(quota_on):
+    assert answer._quota_user(_request(authorization="Bearer key-1")) == "alice"
+    assert answer._quota_user(_request(x_api_key="key-1")) == "alice"
+
+    with pytest.raises(HTTPException) as rejected:
+        answer._quota_user(_request(authorization="Bearer forged"))
+    assert rejected.value.status_code == 401 and rejected.value.headers["WWW-Authenticate"] == "Bearer"
+
+
+def test_anonymous_callers_are_keyed_by_address(quota_on):
+    assert answer._quota_user(_request()) == "ip:203.0.113.9"
+
+
+@pytest.mark.parametrize(
+    "client, forwarded, expected",
+    [
+        ("203.0.113.9", "198.51.100.1", "203.0.113.9"),  # not from a proxy: the header is ignored
+        ("10.0.0.2", "198.51.100.1", "198.51.100.1"),
+        ("10.0.0.2", "1.2.3.4, 198.51.100.1, 10.0.0.3", "198.51.100.1"),  # spoofed left-most hop is skipped
+        ("10.0.0.2", None, "10.0.0.2"),
+    ],
+)
+def test_forwarded_addresses_are_only_believed_from_trusted_proxies(quota_on, client, forwarded, expected):
+    assert answer._client_address(_request(client, forwarded)) == expected
+
+
+def test_quota_users_are_not_resolved_when_quotas_are_off(monkeypatch):
+    monkeypatch.setattr(answer, "token_quota", None)
+    assert answer._quota_user(_request(authorization="Bearer forged")) is None
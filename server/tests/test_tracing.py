@@ -0,0 +1,114 @@
+import asyncio
+import re
+
+import httpx
+from fastapi import FastAPI
+
+from src.utils import tracing
+from src.utils.metrics import Histogram
+from src.utils.tracing import ServerTimingMiddleware, current_trace, end_trace, render_histogram, span, start_trace
+
+
+def _count(stage, upstream="none"):
+    return tracing._histogram(stage, upstream).snapshot()["count"]
+
+
+def test_spans_feed_the_histograms_and_the_current_trace():
+    before = _count("test_stage", "test_upstream")
+    trace, token = start_trace()
+    try:
+        with span("test_stage", upstream="test_upstream"):
+            pass
+        with span("test_stage", upstream="test_upstream"):
+            pass
+    finally:
+        end_trace(token)
+
+    assert _count("test_stage", "test_upstream") == before + 2
+    assert [stage for stage, _ in trace.spans] == ["test_stage", "test_stage"]
+    assert list(trace.summary()) == ["test_stage"]
+    assert current_trace() is None
+
+
+def test_decorated_functions_and_their_tasks_are_traced():
+    @span("test_sync")
+    def parse():
+        return "parsed"
+
+    @span("test_async", upstream="test_llm")
+    async def generate():
+        await asyncio.sleep(0.001)
+        return "generated"
+
+    async def handle():
+        trace, token = start_trace()
+        try:
+            # Tasks started during the request inherit its trace
+            results = await asyncio.gather(asyncio.create_task(generate()), asyncio.to_thread(parse))
+        finally:
+            end_trace(token)
+        return trace, results
+
+    trace, results = asyncio.run(handle())
+    assert results == ["generated", "parsed"]
+    assert set(trace.summary()) == {"test_sync", "test_async"}
+    assert trace.summary()["test_async"] >= 1.0
+    assert parse.__name__ == "parse"
+
+
+def test_server_timing_lists_stages_then_the_total():
+    trace = tracing.Trace()
+    trace.spans = [("plan", 0.0123), ("retrieve", 0.002), ("plan", 0.001)]
+
+    header = trace.server_timing()
+    assert header.startswith("plan;dur=13.3, retrieve;dur=2.0, total;dur=")
+
+
+def test_histograms_render_in_the_prometheus_text_format():
+    histogram = Histogram([0.1, 1])
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+
+    lines = render_histogram("rag_test_seconds", "Test latency.", [({"stage": "llm"}, histogram)])
+    assert lines == [
+        "# HELP rag_test_seconds Test latency.",
+        "# TYPE rag_test_seconds histogram",
+        'rag_test_seconds_bucket{stage="llm",le="0.1"} 1',
+        'rag_test_seconds_bucket{stage="llm",le="1"} 2',
+        'rag_test_seconds_bucket{stage="llm",le="+Inf"} 3',
+        'rag_test_seconds_sum{stage="llm"} 5.55',
+        'rag_test_seconds_count{stage="llm"} 3',
+    ]
+
+
+def test_stage_metrics_include_every_recorded_stage():
+    with span("test_exported", upstream="test_db"):
+        pass
+    assert any('stage="test_exported",upstream="test_db",le="+Inf"' in line for line in tracing.stage_metrics())
+
+
+def _app():
+    app = FastAPI()
+
+    @app.get("/api/answer")
+    async def answer():
+        with span("test_llm_call"):
+            await asyncio.sleep(0.001)
+        return {"answer": "ok"}
+
+    @app.get("/api/health")
+    async def health():
+        return {"status": "ok"}
+
+    app.add_middleware(ServerTimingMiddleware)
+    return app
+
+
+def test_answers_carry_a_server_timing_header():
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://test") as client:
+            return await client.get("/api/answer"), await client.get("/api/health")
+
+    answer, health = asyncio.run(scenario())
+    assert re.fullmatch(r"test_llm_call;dur=[\d.]+, total;dur=[\d.]+", answer.headers["server-timing"])
+    assert "server-timing" not in health.headers